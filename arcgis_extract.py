@@ -0,0 +1,364 @@
+# arcgis_extract.py
+# Extração completa de camadas ArcGIS REST (/query) para GeoParquet.
+#
+# Camadas como "CAR - Limite da Propriedade" e "Embargos IBAMA" passam do
+# maxRecordCount do servidor, então uma consulta só traz uma fração. Aqui:
+#   1. lê os metadados da camada (?f=json): maxRecordCount, campo OBJECTID, campos
+#   2. divide o trabalho em faixas de OBJECTID (returnIdsOnly) ou, se o servidor
+#      não listar os ids, em páginas resultOffset/resultRecordCount
+#   3. busca as páginas em paralelo (limite de threads) com nova tentativa
+#   4. grava cada página como row group num GeoParquet, na ordem das páginas
+#
+# Uso: python arcgis_extract.py URL_OU_NOME_DA_CAMADA destino.parquet [--workers 4]
+#      python arcgis_extract.py demo   (FeatureServer local, sem rede)
+
+import argparse
+import json
+import operator
+import os
+import random
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import pyarrow as pa
+import requests
+from shapely.geometry import LineString, MultiLineString, MultiPoint, Point, Polygon, MultiPolygon
+
+from geoparquet_writer import GeoParquetStreamWriter
+from host_breaker import StubServer
+from http_async import sync_session
+
+MAX_WORKERS = 4
+TENTATIVAS = 4
+TIMEOUT = 60
+SR_SAIDA = 4674  # SIRGAS 2000, o mesmo das bases locais
+
+TIPOS_ARROW = {
+    "esriFieldTypeOID": pa.int64(),
+    "esriFieldTypeInteger": pa.int64(),
+    "esriFieldTypeSmallInteger": pa.int64(),
+    "esriFieldTypeDouble": pa.float64(),
+    "esriFieldTypeSingle": pa.float64(),
+    "esriFieldTypeDate": pa.timestamp("ms"),
+}
+CAMPOS_IGNORADOS = ("esriFieldTypeGeometry", "esriFieldTypeBlob", "esriFieldTypeRaster")
+
+
+class ArcGISError(Exception):
+    """Erro devolvido pelo servidor ArcGIS (HTTP 200 com {"error": ...})."""
+
+
+# --- 1. Requisições com nova tentativa ---
+
+def _transitorio(codigo):
+    return codigo == 429 or (isinstance(codigo, int) and codigo >= 500)
+
+
+def get_json(session, url, params, tentativas=TENTATIVAS, **kwargs):
+    """
+    GET que devolve o JSON, repetindo com espera exponencial (com jitter) em falhas temporárias.
+
+    Só 429, 5xx (também como "code" do erro no JSON do ArcGIS) e falhas de conexão são
+    repetidos; um 4xx é erro do pedido e sobe na hora.
+    """
+    kwargs.setdefault("timeout", TIMEOUT)
+    for tentativa in range(tentativas):
+        try:
+            r = session.get(url, params=params, **kwargs)
+            if _transitorio(r.status_code):
+                erro = requests.exceptions.HTTPError(f"Status {r.status_code}", response=r)
+            else:
+                r.raise_for_status()
+                dados = r.json()
+                if "error" not in dados:
+                    return dados
+                erro = ArcGISError(dados["error"].get("message", dados["error"]))
+                erro.codigo = dados["error"].get("code")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            erro = e
+        temporario = not isinstance(erro, ArcGISError) or _transitorio(erro.codigo)
+        if not temporario or tentativa == tentativas - 1:
+            raise erro
+        time.sleep((2 ** tentativa) * (0.5 + random.random()))
+
+
+def layer_url(url):
+    """URL da camada (sem o /query final)."""
+    url = url.rstrip("/")
+    return url[: -len("/query")] if url.endswith("/query") else url
+
+
+def layer_info(session, url, **kwargs):
+    """Metadados da camada: maxRecordCount, campo OBJECTID, campos e suporte a paginação."""
+    info = get_json(session, layer_url(url), {"f": "json"}, **kwargs)
+    campos = info.get("fields") or []
+    oid = info.get("objectIdField") or next(
+        (c["name"] for c in campos if c.get("type") == "esriFieldTypeOID"), None
+    )
+    return {
+        "max_record_count": int(info.get("maxRecordCount") or 1000),
+        "oid_field": oid,
+        "fields": [c for c in campos if c.get("type") not in CAMPOS_IGNORADOS],
+        "supports_pagination": bool((info.get("advancedQueryCapabilities") or {}).get("supportsPagination")),
+    }
+
+
+def arrow_schema(campos):
+    """Schema pyarrow a partir dos campos ArcGIS (tipos desconhecidos viram texto)."""
+    return pa.schema([pa.field(c["name"], TIPOS_ARROW.get(c["type"], pa.string())) for c in campos])
+
+
+# --- 2. Geometria Esri JSON -> shapely ---
+
+def _anel_horario(anel):
+    # Área com sinal (shoelace): negativa = sentido horário = anel externo no padrão Esri
+    area = sum(x1 * y2 - x2 * y1 for (x1, y1, *_), (x2, y2, *_) in zip(anel, anel[1:]))
+    return area < 0
+
+
+def esri_to_shapely(geom):
+    """Converte uma geometria Esri JSON (ponto, multiponto, linha ou polígono) para shapely."""
+    if not geom:
+        return None
+    if "x" in geom:
+        return Point(geom["x"], geom["y"]) if geom["x"] is not None else None
+    if "points" in geom:
+        return MultiPoint([p[:2] for p in geom["points"]])
+    if "paths" in geom:
+        linhas = [LineString([p[:2] for p in caminho]) for caminho in geom["paths"]]
+        return linhas[0] if len(linhas) == 1 else MultiLineString(linhas)
+    if "rings" in geom:
+        # Anéis horários são cascas; anti-horários são buracos da menor casca que os contém
+        # (num multipolígono o buraco não vem necessariamente logo depois da sua casca)
+        cascas, buracos = [], []
+        for anel in geom["rings"]:
+            anel = [p[:2] for p in anel]
+            (cascas if _anel_horario(anel) else buracos).append(anel)
+        if not cascas:  # anéis todos no sentido errado: trata como cascas
+            cascas, buracos = buracos, []
+        poligonos = [Polygon(casca) for casca in cascas]
+        dos_poligonos = [[] for _ in cascas]
+        for anel in buracos:
+            buraco = Polygon(anel)
+            donos = [i for i, p in enumerate(poligonos) if p.covers(buraco)]
+            if donos:
+                dos_poligonos[min(donos, key=lambda i: poligonos[i].area)].append(anel)
+            else:  # buraco fora de toda casca: vira uma parte própria
+                cascas.append(anel)
+                dos_poligonos.append([])
+        partes = [Polygon(casca, furos) for casca, furos in zip(cascas, dos_poligonos)]
+        return partes[0] if len(partes) == 1 else MultiPolygon(partes)
+    return None
+
+
+# --- 3. Planejamento das páginas ---
+
+def plan_pages(session, url, info, where="1=1", page_size=None, **kwargs):
+    """Lista de parâmetros de consulta, uma entrada por página."""
+    tamanho = min(page_size or info["max_record_count"], info["max_record_count"])
+    oid = info["oid_field"]
+    query = layer_url(url) + "/query"
+
+    ids = None
+    if oid:
+        try:
+            ids = get_json(session, query, {"where": where, "returnIdsOnly": "true", "f": "json"}, **kwargs).get("objectIds")
+        except (requests.exceptions.RequestException, ArcGISError):
+            ids = None
+
+    if ids is not None:
+        ids = sorted(ids)
+        return [
+            {"where": f"({where}) AND {oid} >= {ids[i]} AND {oid} <= {ids[min(i + tamanho, len(ids)) - 1]}"}
+            for i in range(0, len(ids), tamanho)
+        ]
+
+    if not info["supports_pagination"]:
+        raise ArcGISError("Camada não lista OBJECTIDs nem suporta paginação (resultOffset).")
+    total = get_json(session, query, {"where": where, "returnCountOnly": "true", "f": "json"}, **kwargs)["count"]
+    ordem = {"orderByFields": oid} if oid else {}
+    return [
+        {"where": where, "resultOffset": inicio, "resultRecordCount": tamanho, **ordem}
+        for inicio in range(0, total, tamanho)
+    ]
+
+
+# --- 4. Extração ---
+
+def map_in_order(executor, funcao, itens, janela):
+    """Como executor.map, mas com no máximo `janela` tarefas adiantadas (memória limitada)."""
+    pendentes = deque()
+    for item in itens:
+        pendentes.append(executor.submit(funcao, item))
+        if len(pendentes) >= janela:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+
+def extract_layer(url, destino, max_workers=MAX_WORKERS, page_size=None, where="1=1", out_sr=SR_SAIDA,
+                  session=None, on_page=None, **kwargs):
+    """
+    Baixa a camada inteira para `destino` (GeoParquet). Retorna o número de feições.
+
+    `on_page(concluidas, total)` é chamado a cada página gravada. kwargs vão
+    para requests (headers, verify, timeout...).
+    """
+    session = session or sync_session(max_workers)
+    info = layer_info(session, url, **kwargs)
+    paginas = plan_pages(session, url, info, where=where, page_size=page_size, **kwargs)
+    query = layer_url(url) + "/query"
+    nomes = [c["name"] for c in info["fields"]]
+    base = {"outFields": ",".join(nomes) or "*", "returnGeometry": "true", "outSR": out_sr, "f": "json"}
+
+    def buscar(params):
+        return get_json(session, query, {**base, **params}, **kwargs).get("features", [])
+
+    with GeoParquetStreamWriter(destino, arrow_schema(info["fields"]), crs=f"EPSG:{out_sr}") as writer:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Resultados na ordem das páginas (saída estável); as próximas páginas
+            # continuam sendo baixadas enquanto a atual é gravada
+            for n, features in enumerate(map_in_order(executor, buscar, paginas, 2 * max_workers), start=1):
+                writer.write(
+                    [f.get("attributes") or {} for f in features],
+                    [esri_to_shapely(f.get("geometry")) for f in features],
+                )
+                if on_page:
+                    on_page(n, len(paginas))
+    return writer.linhas
+
+
+# --- 5. Servidor de teste ---
+# FeatureServer mínimo, em memória (sobre host_breaker.StubServer), para exercitar o
+# planejamento das páginas, as novas tentativas e a conversão de geometria sem rede.
+
+_COMPARACAO_OID = re.compile(r"([A-Za-z_]\w*)\s*(>=|<=|=)\s*(\d+)")
+
+
+class FakeFeatureServer(StubServer):
+    """
+    `with FakeFeatureServer(features) as fs: ... fs.url ...` (a URL da camada 0).
+
+    `features` são dicts Esri JSON ({"attributes", "geometry"}); o OBJECTID é a posição + 1.
+    Responde aos metadados (?f=json) e ao /query com returnIdsOnly, returnCountOnly,
+    faixas de OBJECTID no where e resultOffset/resultRecordCount, limitado a
+    `max_record_count`. Com `listar_ids=False` o servidor não lista os ids (força a
+    paginação por offset). `falhas` são status HTTP devolvidos, um por pedido, antes
+    das respostas normais.
+    """
+
+    def __init__(self, features=(), max_record_count=1000, listar_ids=True, falhas=()):
+        super().__init__()
+        self.features = [{**f, "attributes": {"OBJECTID": i, **f["attributes"]}} for i, f in enumerate(features, start=1)]
+        self.max_record_count = max_record_count
+        self.listar_ids = listar_ids
+        self.falhas = list(falhas)
+        self.requisicoes = []
+
+    def _metadados(self):
+        exemplo = self.features[0]["attributes"] if self.features else {"OBJECTID": 1}
+        tipos = {int: "esriFieldTypeInteger", float: "esriFieldTypeDouble"}
+        campos = [{"name": k, "type": "esriFieldTypeOID" if k == "OBJECTID" else tipos.get(type(v), "esriFieldTypeString")}
+                  for k, v in exemplo.items()]
+        return {"maxRecordCount": self.max_record_count, "objectIdField": "OBJECTID", "fields": campos,
+                "advancedQueryCapabilities": {"supportsPagination": True}}
+
+    def responder(self, caminho):
+        partes = urlsplit(caminho)
+        params = dict(parse_qsl(partes.query))
+        self.requisicoes.append(params)
+        if self.falhas:
+            return self.falhas.pop(0), "text/plain", b"falha simulada"
+        if not partes.path.endswith("/query"):
+            return 200, "application/json", json.dumps(self._metadados()).encode()
+
+        selecionadas = self.features
+        for campo, op, valor in _COMPARACAO_OID.findall(params.get("where", "")):
+            comparar = {">=": operator.ge, "<=": operator.le, "=": operator.eq}[op]
+            selecionadas = [f for f in selecionadas if comparar(f["attributes"].get(campo), int(valor))]
+        if params.get("returnIdsOnly") == "true":
+            if not self.listar_ids:
+                corpo = {"error": {"code": 400, "message": "returnIdsOnly não suportado"}}
+            else:
+                corpo = {"objectIdFieldName": "OBJECTID", "objectIds": [f["attributes"]["OBJECTID"] for f in selecionadas]}
+        elif params.get("returnCountOnly") == "true":
+            corpo = {"count": len(selecionadas)}
+        else:
+            inicio = int(params.get("resultOffset", 0))
+            quantidade = min(int(params.get("resultRecordCount", self.max_record_count)), self.max_record_count)
+            pagina = selecionadas[inicio:inicio + quantidade]
+            corpo = {"features": pagina, "exceededTransferLimit": inicio + quantidade < len(selecionadas)}
+        return 200, "application/json", json.dumps(corpo).encode()
+
+    def __enter__(self):
+        super().__enter__()
+        self.url += "/arcgis/rest/services/Teste/FeatureServer/0"
+        return self
+
+
+def _quadrado(x, y, lado, horario=True):
+    anel = [[x, y], [x, y + lado], [x + lado, y + lado], [x + lado, y], [x, y]]
+    return anel if horario else anel[::-1]
+
+
+def demo(n=2350):
+    import tempfile
+
+    import geopandas as gpd
+    import requests
+
+    # multipolígonos com o buraco da primeira parte listado depois da segunda parte
+    features = [{
+        "attributes": {"codigo": f"F{i}", "area": float(i)},
+        "geometry": {"rings": [_quadrado(i, 0, 1), _quadrado(i, 5, 1), _quadrado(i + 0.25, 0.25, 0.5, horario=False)]},
+    } for i in range(n)]
+    with tempfile.TemporaryDirectory() as pasta:
+        for listar_ids in (True, False):
+            with FakeFeatureServer(features, max_record_count=500, listar_ids=listar_ids, falhas=[503]) as fs:
+                inicio = time.perf_counter()
+                total = extract_layer(fs.url, os.path.join(pasta, "camada.parquet"))
+                gdf = gpd.read_parquet(os.path.join(pasta, "camada.parquet"))
+                modo = "faixas de OBJECTID" if listar_ids else "resultOffset"
+                print(f"{modo:20s} {total} feições em {len(fs.requisicoes)} requisições "
+                      f"({time.perf_counter() - inicio:.2f} s; um 503 repetido)")
+                assert total == n and gdf["codigo"].is_unique
+                buracos = [len(p.interiors) for p in gdf.geometry.iloc[0].geoms]
+                assert buracos == [1, 0] and gdf.geometry.is_valid.all()
+        print("buraco atribuído à casca que o contém: ok")
+
+        with FakeFeatureServer(features[:10], falhas=[400]) as fs:
+            try:
+                get_json(requests.Session(), fs.url, {"f": "json"})
+            except requests.exceptions.HTTPError:
+                print(f"400 sobe sem nova tentativa: {len(fs.requisicoes)} requisição")
+
+
+def main():
+    if sys.argv[1:2] == ["demo"]:
+        return demo()
+    parser = argparse.ArgumentParser(description="Extrai uma camada ArcGIS REST inteira para GeoParquet.")
+    parser.add_argument("url", help="URL da camada (.../MapServer/N ou .../FeatureServer/N/query) ou nome no registro de camadas")
+    parser.add_argument("destino", help="Arquivo .parquet de saída")
+    parser.add_argument("--workers", type=int, help=f"padrão: concorrência da camada no registro, ou {MAX_WORKERS}")
+    parser.add_argument("--where", default="1=1")
+    args = parser.parse_args()
+
+    from layer_registry import get_registry
+    camada = get_registry().get(args.url)
+    url = camada.url if camada else args.url
+    workers = args.workers or (camada.concorrencia if camada else MAX_WORKERS)
+
+    total = extract_layer(
+        url, args.destino, max_workers=workers, where=args.where,
+        on_page=lambda n, t: print(f"Página {n}/{t}", end="\r"),
+    )
+    print(f"\n✅ {total} feições gravadas em {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
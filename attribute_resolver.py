@@ -0,0 +1,200 @@
+# attribute_resolver.py
+# Resolução vetorizada dos rótulos de exibição (colunas_nome / mapeamento / dicionario).
+#
+# Cada base declara listas de colunas candidatas, ex.:
+#   "colunas_nome": ["MUNICIPIO", "Município", "NOME_MUN", "nm_mun"]
+#   "mapeamento": {"legenda": [...], "detalhes": {"Área": ["area_ha"], "Fonte": "Base Vetorial"}}
+#   "dicionario": DICIONARIO_SOLOS
+# Em vez de procurar a coluna feição por feição, a lista é "compilada" uma vez
+# por schema (quais candidatos existem, com a grafia real da camada) e depois
+# aplicada à tabela inteira de uma vez: o primeiro valor não vazio entre os
+# candidatos (coalesce) e o dicionário aplicado sobre as categorias distintas.
+#
+# Benchmark: python attribute_resolver.py bench [N_LINHAS]
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from config_bases import DICIONARIO_SOLOS
+
+
+class Literal(str):
+    """Valor fixo de um detalhe (texto do mapeamento que não é nome de coluna)."""
+
+
+def _colunas_existentes(colunas, candidatos):
+    """Candidatos presentes na camada, na ordem de preferência e com a grafia da camada (sem diferenciar maiúsculas)."""
+    por_nome = {}
+    for c in colunas:
+        por_nome.setdefault(str(c).lower(), c)
+    return list(dict.fromkeys(por_nome[c.lower()] for c in candidatos if c.lower() in por_nome))
+
+
+class CompiledResolver:
+    """Escolha fixa de colunas para um schema; `resolve()` produz os rótulos de uma tabela inteira."""
+
+    def __init__(self, regras, dicionario=None):
+        # regras: {rótulo: [colunas] ou Literal}
+        self.regras = regras
+        self.dicionario = dicionario
+
+    def columns(self):
+        """Colunas da camada efetivamente usadas (útil para ler só o necessário)."""
+        return list(dict.fromkeys(c for r in self.regras.values() if not isinstance(r, Literal) for c in r))
+
+    @staticmethod
+    def _coalesce(df, colunas, n):
+        if not colunas:
+            return pd.Series([None] * n, index=df.index, dtype=object)
+        resultado = None
+        for coluna in colunas:
+            serie = df[coluna]
+            if serie.dtype == object or pd.api.types.is_string_dtype(serie):
+                # Texto vazio conta como ausente, para o próximo candidato preencher
+                serie = serie.where(serie.astype(str).str.strip().ne("") & serie.notna())
+            resultado = serie if resultado is None else resultado.fillna(serie)
+            if not resultado.isna().any():
+                break
+        return resultado
+
+    def _traduzir(self, serie):
+        """Aplica o dicionário sobre as categorias distintas (não linha a linha); códigos sem tradução ficam como estão."""
+        categorias = serie.astype("category")
+        originais = categorias.cat.categories
+        traduzidos = pd.Index([self.dicionario.get(str(c).strip(), c) for c in originais])
+        rotulos = traduzidos.unique()
+        codigos = rotulos.get_indexer(traduzidos)
+        atuais = categorias.cat.codes.to_numpy()
+        if len(codigos):
+            # -1 (nulo) é recortado só para indexar; a máscara devolve -1 nessas linhas
+            novos = np.where(atuais >= 0, codigos[np.clip(atuais, 0, None)], -1)
+        else:  # tudo nulo: não há categorias
+            novos = np.full(len(atuais), -1)
+        return pd.Series(pd.Categorical.from_codes(novos, categories=rotulos), index=serie.index)
+
+    def resolve(self, df):
+        """DataFrame [nome, legenda, ...detalhes] alinhado ao índice de `df`."""
+        n = len(df)
+        dados = {}
+        for rotulo, regra in self.regras.items():
+            if isinstance(regra, Literal):
+                dados[rotulo] = pd.Series(pd.Categorical([str(regra)] * n), index=df.index) if n else pd.Series([], dtype=object)
+            else:
+                dados[rotulo] = self._coalesce(df, regra, n)
+        if self.dicionario and dados.get("nome") is not None and n:
+            dados["nome"] = self._traduzir(dados["nome"])
+        return pd.DataFrame(dados, index=df.index)
+
+
+class AttributeResolver:
+    """Regras de rótulo de uma base de config_bases.py, compiladas (e guardadas) por schema."""
+
+    def __init__(self, base):
+        self.base = base or {}
+        self._compilados = {}
+
+    def compile(self, colunas):
+        chave = tuple(colunas)
+        if chave not in self._compilados:
+            mapeamento = self.base.get("mapeamento", {})
+            regras = {
+                "nome": _colunas_existentes(colunas, self.base.get("colunas_nome", [])),
+                "legenda": _colunas_existentes(colunas, mapeamento.get("legenda", [])),
+            }
+            for rotulo, candidatos in mapeamento.get("detalhes", {}).items():
+                if isinstance(candidatos, str):
+                    regras[rotulo] = _colunas_existentes(colunas, [candidatos]) or Literal(candidatos)
+                else:
+                    regras[rotulo] = _colunas_existentes(colunas, candidatos)
+            self._compilados[chave] = CompiledResolver(regras, self.base.get("dicionario"))
+        return self._compilados[chave]
+
+    def resolve(self, df):
+        return self.compile(list(df.columns)).resolve(df)
+
+
+def resolve_labels(df, base):
+    """Atalho: rótulos de exibição de `df` segundo a base."""
+    return AttributeResolver(base).resolve(df)
+
+
+# --- Benchmark ---
+
+BASE_BENCH = {
+    "nome": "Solos (sintético)",
+    "colunas_nome": ["CLASSE_PRI", "classe"],
+    "mapeamento": {"legenda": ["LEGENDA", "leg"], "detalhes": {"Área": ["AREA_HA", "area"], "Fonte": "Base sintética"}},
+    "dicionario": DICIONARIO_SOLOS,
+}
+
+
+def _quadro_sintetico(n, semente=42):
+    rng = np.random.default_rng(semente)
+    codigos = np.array(list(DICIONARIO_SOLOS) + ["XX", "YY"], dtype=object)
+    classe_pri = codigos[rng.integers(0, len(codigos), n)]
+    classe_pri[rng.random(n) < 0.3] = None  # 30% vazios, preenchidos por "classe"
+    return pd.DataFrame({
+        "classe_pri": classe_pri,
+        "CLASSE": codigos[rng.integers(0, len(codigos), n)],
+        "leg": np.array([f"Unidade {i}" for i in range(500)], dtype=object)[rng.integers(0, 500, n)],
+        "area_ha": rng.uniform(0, 1000, n),
+    })
+
+
+def _linha_a_linha(df, base):
+    """Como um consumidor ingênuo faria: para cada feição, percorre candidatos e dicionário."""
+    mapeamento = base["mapeamento"]
+    saida = []
+    for registro in df.to_dict("records"):
+        chaves = {k.lower(): v for k, v in registro.items()}
+
+        def primeiro(candidatos):
+            for c in candidatos:
+                v = chaves.get(c.lower())
+                if not pd.isna(v) and str(v).strip() != "":
+                    return v
+            return None
+
+        nome = primeiro(base["colunas_nome"])
+        linha = {"nome": base["dicionario"].get(str(nome).strip(), nome) if nome is not None else None,
+                 "legenda": primeiro(mapeamento["legenda"])}
+        for rotulo, candidatos in mapeamento["detalhes"].items():
+            linha[rotulo] = candidatos if isinstance(candidatos, str) else primeiro(candidatos)
+        saida.append(linha)
+    return pd.DataFrame(saida)
+
+
+def bench(n=1_000_000):
+    df = _quadro_sintetico(n)
+    inicio = time.perf_counter()
+    vetorizado = resolve_labels(df, BASE_BENCH)
+    t_vet = time.perf_counter() - inicio
+    print(f"Vetorizado: {n:,} linhas em {t_vet * 1000:.0f} ms")
+
+    inicio = time.perf_counter()
+    ingenuo = _linha_a_linha(df, BASE_BENCH)
+    t_ing = time.perf_counter() - inicio
+    print(f"Linha a linha: {n:,} linhas em {t_ing * 1000:.0f} ms ({t_ing / t_vet:.0f}x mais lento)")
+
+    iguais = all(
+        vetorizado[c].astype(object).where(vetorizado[c].notna(), None).tolist()
+        == ingenuo[c].astype(object).where(ingenuo[c].notna(), None).tolist()
+        for c in vetorizado.columns
+    )
+    print(f"Resultados idênticos: {iguais}")
+
+    # Regressão: sem nenhum valor no nome (todas as colunas nulas ou ausentes) não há categorias a traduzir
+    for vazio in (df.head(3).assign(classe_pri=None, CLASSE=None), pd.DataFrame({"outra": [1, 2]})):
+        nomes = resolve_labels(vazio, BASE_BENCH)["nome"]
+        assert len(nomes) == len(vazio) and nomes.isna().all(), nomes
+    print("Entrada sem nomes: ok")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+    else:
+        print("Uso: python attribute_resolver.py bench [N_LINHAS]")
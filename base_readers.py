@@ -0,0 +1,360 @@
+# base_readers.py
+# Leitores leves para amostrar as bases (ZIP/Shapefile, GeoJSON) sem carregar o arquivo inteiro.
+
+import io
+import json
+import os
+import posixpath
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from urllib.parse import urlsplit
+
+import geopandas as gpd
+import requests
+
+import disk_cache
+from host_breaker import get_board
+from http_async import shared_session
+
+EXTENSOES_GEO = (".shp", ".geojson", ".json", ".gpkg")
+# Arquivos auxiliares que acompanham o .shp
+EXTENSOES_SHP = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+# --- 1. Leitura de ZIP sem extractall ---
+
+def _membros_geo(zf):
+    """Lista os membros geoespaciais do ZIP (ignorando lixo do macOS), na ordem do arquivo."""
+    return [
+        m for m in zf.namelist()
+        if m.lower().endswith(EXTENSOES_GEO) and not m.startswith("__MACOSX/")
+    ]
+
+
+def vsizip_path(caminho, membro):
+    """Caminho virtual GDAL para um membro do ZIP; as chaves aceitam arquivos sem extensão .zip (ex.: cache)."""
+    return f"/vsizip/{{{os.fspath(caminho)}}}/{membro}"
+
+
+def _ler_membros(zf, membro, n_features):
+    """Extrai só o membro escolhido (e os auxiliares do shapefile) e lê N feições."""
+    raiz, ext = posixpath.splitext(membro)
+    necessarios = [membro]
+    if ext.lower() == ".shp":
+        necessarios = [m for m in zf.namelist() if posixpath.splitext(m)[0] == raiz and posixpath.splitext(m)[1].lower() in EXTENSOES_SHP]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for m in necessarios:
+            destino = os.path.join(temp_dir, posixpath.basename(m))
+            with zf.open(m) as origem, open(destino, "wb") as saida:
+                while True:
+                    bloco = origem.read(1024 * 1024)
+                    if not bloco:
+                        break
+                    saida.write(bloco)
+        return gpd.read_file(os.path.join(temp_dir, posixpath.basename(membro)), rows=n_features)
+
+
+def read_zip_sample(fonte, n_features=50):
+    """
+    Lê as primeiras `n_features` feições do primeiro .shp/.geojson de um ZIP.
+
+    `fonte` pode ser um caminho (lido direto pelo GDAL via /vsizip/, sem extrair nada)
+    ou um objeto de arquivo (ex.: upload do Streamlit), do qual só os membros
+    necessários são extraídos. Retorna None se o ZIP não tiver camada geoespacial.
+    """
+    with zipfile.ZipFile(fonte, "r") as zf:
+        membros = _membros_geo(zf)
+        if not membros:
+            return None
+        membro = membros[0]
+        if isinstance(fonte, (str, os.PathLike)):
+            return gpd.read_file(vsizip_path(fonte, membro), rows=n_features)
+        return _ler_membros(zf, membro, n_features)
+
+
+# --- 2. Amostragem de Parquet pelo rodapé (footer) ---
+# O rodapé do Parquet traz o esquema e a posição de cada row group. Com ele dá
+# para ler só as colunas e o row group desejados; em arquivos remotos isso vira
+# requisições HTTP Range (rodapé + um row group) em vez do download completo.
+
+class RangeNotSupported(IOError):
+    """O servidor não respondeu 206 a uma requisição com Range."""
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """Arquivo remoto somente-leitura, lido sob demanda via HTTP Range."""
+
+    BLOCO = 256 * 1024  # leitura antecipada mínima por requisição
+
+    def __init__(self, url, session=None, **kwargs):
+        self.url = url
+        self.http = session or shared_session()
+        self.kwargs = kwargs
+        self.bytes_lidos = 0
+        self._pos = 0
+        self._buffer_inicio = 0
+        self._buffer = b""
+        r = self._pedir("head", url, allow_redirects=True)
+        r.raise_for_status()
+        if r.headers.get("Accept-Ranges", "").lower() != "bytes" or "Content-Length" not in r.headers:
+            raise RangeNotSupported(url)
+        self.url = r.url  # já resolve redirecionamentos (ex.: github.com -> raw.githubusercontent.com)
+        self.tamanho = int(r.headers["Content-Length"])
+
+    def _pedir(self, metodo, url, **extra):
+        # pelo disjuntor do host: falha na hora se o host estiver fora do ar
+        kwargs = {**self.kwargs, **extra}
+        with get_board().guard(url, kwargs.pop("timeout", disk_cache.TIMEOUT)) as chamada:
+            r = getattr(self.http, metodo)(url, timeout=chamada.timeout, **kwargs)
+            chamada.done(r.status_code)
+        return r
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self.tamanho + offset
+        return self._pos
+
+    def _buscar(self, inicio, fim):
+        headers = dict(self.kwargs.get("headers") or {})
+        headers["Range"] = f"bytes={inicio}-{fim - 1}"
+        # stream: se o servidor ignorar o Range (200 com o arquivo inteiro), fecha sem baixar o corpo
+        with self._pedir("get", self.url, headers=headers, stream=True) as r:
+            if r.status_code != 206:
+                raise RangeNotSupported(f"{self.url} (status {r.status_code})")
+            dados = r.content
+        self.bytes_lidos += len(dados)
+        return dados
+
+    def readinto(self, b):
+        n = min(len(b), self.tamanho - self._pos)
+        if n <= 0:
+            return 0
+        fim_buffer = self._buffer_inicio + len(self._buffer)
+        if not (self._buffer_inicio <= self._pos and self._pos + n <= fim_buffer):
+            fim = min(self.tamanho, self._pos + max(n, self.BLOCO))
+            self._buffer_inicio, self._buffer = self._pos, self._buscar(self._pos, fim)
+        inicio = self._pos - self._buffer_inicio
+        b[:n] = self._buffer[inicio:inicio + n]
+        self._pos += n
+        return n
+
+
+def _remoto(fonte):
+    return isinstance(fonte, str) and fonte.startswith(("http://", "https://"))
+
+
+def _abrir_parquet(fonte, range_http=True, **kwargs):
+    """Abre um Parquet local, de objeto de arquivo ou de URL (via Range; se não der, pelo cache em disco)."""
+    import pyarrow.parquet as pq  # opcional: sem pyarrow o ImportError chega a quem chamou
+    if _remoto(fonte):
+        if range_http:
+            try:
+                return pq.ParquetFile(io.BufferedReader(HTTPRangeFile(fonte, **kwargs), buffer_size=64 * 1024))
+            except RangeNotSupported:
+                pass
+        caminho, status = disk_cache.fetch(fonte, **kwargs)
+        if caminho is None:
+            raise IOError(f"Falha download (Status: {status})")
+        fonte = caminho
+    return pq.ParquetFile(fonte)
+
+
+def geometry_columns(schema):
+    """Colunas de geometria declaradas nos metadados GeoParquet ('geo'), ou 'geometry' por convenção."""
+    meta = schema.metadata or {}
+    if b"geo" in meta:
+        return set(json.loads(meta[b"geo"]).get("columns", {}))
+    return {"geometry"} & set(schema.names)
+
+
+def parquet_schema(fonte, **kwargs):
+    """Schema pyarrow do Parquet (só o rodapé é lido), sem colunas de índice do pandas."""
+    import pyarrow as pa
+    schema = _abrir_parquet(fonte, **kwargs).schema_arrow
+    return pa.schema([f for f in schema if not f.name.startswith("__index_level_")], metadata=schema.metadata)
+
+
+def read_parquet_sample(fonte, n_rows=50, columns=None, include_geometry=False, **kwargs):
+    """
+    Lê até `n_rows` linhas de um único row group sorteado do Parquet.
+
+    Só o rodapé e as colunas pedidas desse row group são lidos; a coluna de
+    geometria é ignorada, a menos que `include_geometry=True`. `fonte` pode ser
+    caminho, objeto de arquivo ou URL. kwargs vão para requests (headers, verify...).
+    Retorna um DataFrame pandas (vazio se o arquivo não tiver linhas).
+    """
+    try:
+        return _amostra_parquet(_abrir_parquet(fonte, **kwargs), n_rows, columns, include_geometry)
+    except RangeNotSupported:
+        if not _remoto(fonte):
+            raise
+        # o servidor deixou de aceitar Range depois do rodapé: lê a cópia do cache em disco
+        return _amostra_parquet(_abrir_parquet(fonte, range_http=False, **kwargs), n_rows, columns, include_geometry)
+
+
+def _amostra_parquet(pf, n_rows, columns, include_geometry):
+    schema = pf.schema_arrow
+    if columns is None:
+        columns = [c for c in schema.names if not c.startswith("__index_level_")]
+        if not include_geometry:
+            geo = geometry_columns(schema)
+            columns = [c for c in columns if c not in geo]
+    if pf.metadata.num_rows == 0:
+        return schema.empty_table().select(columns).to_pandas()
+
+    grupos = [i for i in range(pf.metadata.num_row_groups) if pf.metadata.row_group(i).num_rows > 0]
+    lote = next(pf.iter_batches(batch_size=n_rows, row_groups=[random.choice(grupos)], columns=columns))
+    return lote.to_pandas()
+
+
+# --- 3. Leitura completa, preferindo o gêmeo GeoParquet ---
+# Bases GeoJSON/ZIP de config_bases.py declaram "url_parquet" quando existe uma
+# cópia colunar gerada por convert_bases.py; ela é lida primeiro por ser bem
+# menor para transferir e muito mais rápida de decodificar.
+
+DIR_LOCAL = os.path.dirname(os.path.abspath(__file__))
+
+
+def local_path(url, **kwargs):
+    """Caminho local da URL: o arquivo no diretório do projeto, se existir, ou a cópia no cache em disco."""
+    local = os.path.join(DIR_LOCAL, posixpath.basename(urlsplit(url).path))
+    if os.path.exists(local):
+        return local
+    caminho, status = disk_cache.fetch(url, **kwargs)
+    if caminho is None:
+        raise IOError(f"Falha download {url} (Status: {status})")
+    return caminho
+
+
+def read_geo_file(caminho):
+    """Lê GeoParquet, ZIP (Shapefile/GeoJSON) ou GeoJSON pelo conteúdo (arquivos do cache não têm extensão)."""
+    with open(caminho, "rb") as f:
+        assinatura = f.read(4)
+    if assinatura == b"PAR1":
+        return gpd.read_parquet(caminho)
+    if assinatura[:2] == b"PK":
+        with zipfile.ZipFile(caminho) as zf:
+            membros = _membros_geo(zf)
+        if not membros:
+            raise IOError(f"Nenhum .shp/.geojson no ZIP: {caminho}")
+        return gpd.read_file(vsizip_path(caminho, membros[0]))
+    return gpd.read_file(caminho)
+
+
+def source_urls(base, prefer_parquet=None, **kwargs):
+    """
+    (urls, kwargs) para ler a base, na ordem de tentativa, com a política do registro de camadas.
+
+    `prefer_parquet=None` segue o formato preferido da camada; a validade do
+    cache da camada vira `max_idade` do disk_cache (se não vier em kwargs).
+    """
+    from layer_registry import layer_for
+
+    camada = layer_for(base)
+    if prefer_parquet is None:
+        prefer_parquet = camada.prefere_parquet
+    urls = [base["url_parquet"]] if prefer_parquet and base.get("url_parquet") else []
+    urls.append(base["url"])
+    kwargs.setdefault("max_idade", camada.cache_ttl)
+    return urls, kwargs
+
+
+def read_base(base, prefer_parquet=None, **kwargs):
+    """Lê a base inteira como GeoDataFrame, usando "url_parquet" quando existir e caindo para "url" se falhar."""
+    urls, kwargs = source_urls(base, prefer_parquet, **kwargs)
+    erro = None
+    for url in urls:
+        try:
+            return read_geo_file(local_path(url, **kwargs))
+        except (IOError, requests.exceptions.RequestException) as e:
+            erro = e
+    raise erro
+
+
+# --- 4. Benchmark (ZIP sintético) ---
+# Uso: python base_readers.py bench-zip [MB]
+# Compara o caminho antigo (BytesIO + extractall + leitura completa) com read_zip_sample.
+# Cada variante roda num subprocesso para medir o pico de memória (RSS) isoladamente.
+
+def _gerar_zip_sintetico(caminho, mb):
+    import numpy as np
+    from shapely import box
+
+    n = max(1000, int(mb * 1024 * 1024 / 180))  # ~180 bytes por feição (shp + dbf)
+    x = np.random.uniform(-58, -51, n)
+    y = np.random.uniform(-24, -17, n)
+    gdf = gpd.GeoDataFrame(
+        {"classe": np.random.choice(["25-45", ">45"], n), "gridcode": np.arange(n), "texto": ["x" * 40] * n},
+        geometry=box(x, y, x + 0.001, y + 0.001),
+        crs="EPSG:4674",
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shp = os.path.join(temp_dir, "sintetico.shp")
+        gdf.to_file(shp)
+        with zipfile.ZipFile(caminho, "w", zipfile.ZIP_DEFLATED) as zf:
+            for f in os.listdir(temp_dir):
+                zf.write(os.path.join(temp_dir, f), f)
+
+
+def _variante_antiga(caminho):
+    import io
+    with open(caminho, "rb") as f:
+        conteudo = io.BytesIO(f.read())
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with zipfile.ZipFile(conteudo, "r") as zf:
+            zf.extractall(temp_dir)
+        files = [f for f in os.listdir(temp_dir) if f.endswith((".shp", ".geojson"))]
+        return gpd.read_file(os.path.join(temp_dir, files[0])).sample(1)
+
+
+def _medir(variante, caminho):
+    import resource  # só existe em Unix; usado apenas no benchmark
+    base_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    inicio = time.perf_counter()
+    if variante == "antiga":
+        _variante_antiga(caminho)
+    else:
+        read_zip_sample(caminho).sample(1)
+    tempo = time.perf_counter() - inicio
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{variante:8s} tempo={tempo:7.2f}s  pico_rss={pico_mb:8.1f} MB  (+{pico_mb - base_mb:.1f} MB além dos imports)")
+
+
+def bench_zip(mb=200):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        caminho = os.path.join(temp_dir, "sintetico.zip")
+        # Gera em subprocesso: no Linux o pico de RSS do pai é herdado pelos filhos
+        subprocess.run([sys.executable, __file__, "_gerar", str(mb), caminho], check=True)
+        with zipfile.ZipFile(caminho) as zf:
+            descompactado = sum(i.file_size for i in zf.infolist())
+        print(f"ZIP sintético: {os.path.getsize(caminho) / 1024 / 1024:.1f} MB compactado, {descompactado / 1024 / 1024:.1f} MB descompactado")
+        for variante in ("antiga", "nova"):
+            subprocess.run([sys.executable, __file__, "_medir", variante, caminho], check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["_medir"]:
+        _medir(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ["_gerar"]:
+        _gerar_zip_sintetico(sys.argv[3], float(sys.argv[2]))
+    elif sys.argv[1:2] == ["bench-zip"]:
+        bench_zip(float(sys.argv[2]) if len(sys.argv) > 2 else 200)
+    else:
+        print("Uso: python base_readers.py bench-zip [MB]")
@@ -6,15 +6,33 @@ URL_HIDRO_OFFLINE = "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/
 
 # ATUALIZADO PARA GEOJSON RAW 👇
 URL_AUTEX_IBAMA = "https://raw.githubusercontent.com/chirugaiteiro/bases_ambientais/main/Dados_Agrupados_QGIS.geojson"
+# Mesmo conteúdo de Dados_Agrupados_QGIS.geojson / Autex_Sinaflor.geojson, em GeoParquet (~7x menor)
+URL_AUTEX_PARQUET = "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/heads/main/Autex_Sinaflor.parquet"
 
 URL_PARQUET_CONVERTED = "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/heads/main/converted_data.parquet"
 
+# Focos do ano corrente (WFS do INPE): usado pelo wizard e pela ingestão incremental (focos_ingest.py)
+URL_FOCOS_WFS = "https://queimadas.dgi.inpe.br/queimadas/geoserver/wfs"
+LAYER_FOCOS_WFS = "bdqueimadas:focos_br_ref"
+
 # --- URLS DE SERVIÇOS DE IMAGEM (RESTORED) ---
 URL_LANDSAT_2008_EXPORT = "https://www.pinms.ms.gov.br/arcgis/rest/services/Imagens/Landsat_5_antes_2008_upscaling8x_v2/ImageServer/exportImage"
 URL_SENTINEL_2025_EXPORT = "https://sentinel.arcgis.com/arcgis/rest/services/Sentinel2/ImageServer/exportImage"
 URL_DECLIVIDADE_EXPORT = "https://www.pinms.ms.gov.br/arcgis/rest/services/Imagens/fusao_declividade_graus/ImageServer/exportImage"
 URL_HIDRO_EXPORT = "https://www.pinms.ms.gov.br/arcgis/rest/services/SEMADESC/SEMADESC_MAPAS/MapServer/export"
 
+# --- GÊMEOS GEOPARQUET ---
+# Bases GeoJSON/ZIP com "url_parquet" têm uma cópia GeoParquet (zstd + coluna bbox)
+# gerada por convert_bases.py; os leitores usam essa cópia primeiro.
+# Só declare "url_parquet" depois de publicar o arquivo: um gêmeo que não existe
+# custa um 404 a cada leitura (e conta como falha no disjuntor do host). Para gerar
+# os que faltam (Vegetação, Geologia, Declividade, Hidrografia): convert_bases.py --pendentes
+
+# --- POLÍTICA DE CACHE POR CAMADA ---
+# Validade do cache, requisições simultâneas e formato preferido têm padrões por
+# tipo de fonte em layer_registry.py; uma base só declara "cache" para fugir deles,
+# ex.: "cache": {"ttl": 3600, "concorrencia": 2, "formato": "zip"}.
+
 # --- ESTRUTURA DOS MAPEAMENTOS ---
 # (Mantido o restante do arquivo igual...)
 
@@ -396,6 +414,7 @@ BASES_FISCALIZACAO = [
         # Adicionei 'alert_code' como primeira opção
         "colunas_nome": ["alert_code", "alerta_id", "cod_alerta"], 
         "tipo": "poligono",
+        "cache": {"ttl": 6 * 3600},  # alertas publicados ao longo do dia
         "mapeamento": {
             "legenda": ["bioma", "biome"],
             "detalhes": {
@@ -406,6 +425,19 @@ BASES_FISCALIZACAO = [
             }
         }
     },
+    {
+        "nome": "Focos de Calor (INPE - Ano Atual)", 
+        "tipo_fonte": "WFS", 
+        "url": URL_FOCOS_WFS, 
+        "layer_name": LAYER_FOCOS_WFS, 
+        "colunas_nome": ["id", "foco_id"], 
+        "tipo": "ponto",
+        "cache": {"ttl": 3600},  # novos focos a cada passagem de satélite
+        "mapeamento": {
+            "legenda": ["satelite"],
+            "detalhes": {"Data": ["data_hora_gmt"], "Município": ["municipio"]}
+        }
+    },
     {
         "nome": "Áreas Antropizadas (SICAR/Dinamizada)", 
         "tipo_fonte": "REST", 
@@ -463,6 +495,7 @@ BASES_RELEVO = [
     {
         "nome": "APP Topo de Morro",
         "url": "https://github.com/chirugaiteiro/bases_ambientais/raw/main/app_topo_morro.geojson",
+        "url_parquet": "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/heads/main/app_topo_morro.parquet",
         "tipo_arquivo": "geojson",
         "colunas_nome": ["classe", "tipo", "nome"],
         "mapeamento": {
@@ -476,6 +509,7 @@ BASES_LICENCAS_FEDERAL = [
     {
         "nome": "Autex Sinaflor (Base GeoJSON)",
         "url": "https://raw.githubusercontent.com/chirugaiteiro/bases_ambientais/main/Autex_Sinaflor.geojson",
+        "url_parquet": URL_AUTEX_PARQUET,
         "tipo_fonte": "FEDERAL_GEOJSON",
         
         "colunas_chave": {
@@ -503,6 +537,22 @@ BASES_LICENCAS_FEDERAL = [
 BASES_GITHUB = [
     {"nome": "Focos Históricos (INPE - Parquet)", "url": URL_FOCOS_PARQUET, "tipo_fonte": "PARQUET"},
     {"nome": "Hidrografia MS (Offline - ZIP)", "url": URL_HIDRO_OFFLINE, "tipo_fonte": "ZIP"},
-    {"nome": "Dados Agrupados (Autex - ZIP)", "url": URL_AUTEX_IBAMA, "tipo_fonte": "ZIP"},
+    {"nome": "Dados Agrupados (Autex - ZIP)", "url": URL_AUTEX_IBAMA, "url_parquet": URL_AUTEX_PARQUET, "tipo_fonte": "GEOJSON"},
     {"nome": "Dados Convertidos (Parquet)", "url": URL_PARQUET_CONVERTED, "tipo_fonte": "PARQUET"}
 ]
+
+
+# --- CATEGORIAS (ordem das abas do wizard e dos grupos do verificador) ---
+# layer_registry.py monta o registro único (validado e indexado) a partir daqui.
+CATEGORIAS = {
+    "Administrativas": BASES_ADMINISTRATIVAS,
+    "CAR (Sicar/MS)": BASES_CAR,
+    "Classificação (Vegetação/Solos/Geologia)": BASES_CLASSIFICACAO,
+    "Restrições Gerais": BASES_GERAIS,
+    "Hidrografia (Online)": BASES_HIDRO,
+    "Fiscalização": BASES_FISCALIZACAO,
+    "Licenças": BASES_LICENCAS,
+    "Relevo (Declividade/Topo de Morro)": BASES_RELEVO,
+    "Licenças Federais (Autex)": BASES_LICENCAS_FEDERAL,
+    "Arquivos GitHub (ZIP/Parquet)": BASES_GITHUB,
+}
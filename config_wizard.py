@@ -1,14 +1,13 @@
 import streamlit as st
-import requests
-import pandas as pd
-import geopandas as gpd
 import random
 import json
-import io
-import zipfile
-import tempfile
-import os
-import urllib3
+import http_async
+import schema_cache
+from layer_registry import get_registry
+
+# pandas, geopandas/pyogrio (base_readers), requests/urllib3 (disk_cache) são
+# importados dentro das funções: o Streamlit reexecuta este script a cada
+# interação, e só quem abre uma amostra ou tabela de campos paga por eles.
 
 # ==============================================================================
 # 0. CONFIGURAÇÕES GERAIS E SSL
@@ -16,170 +15,106 @@ import urllib3
 
 st.set_page_config(layout="wide", page_title="Configurador de Bases Mutum")
 
-# Silencia o aviso de "InsecureRequestWarning"
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Cabeçalho para simular um navegador real (evita erro 403/503 no GitHub)
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-}
+def silenciar_ssl():
+    """Silencia o aviso de "InsecureRequestWarning" (chamado antes de requisições com verify=False)."""
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+# Cabeçalho de navegador e limites por domínio ficam em http_async.py (compartilhado com o base_check)
+HEADERS = http_async.HEADERS
 
 # ==============================================================================
 # 1. DADOS DE CONFIGURAÇÃO
 # ==============================================================================
 
-# --- URLS GITHUB (ARQUIVOS ESTÁTICOS) ---
-URL_GEOJSON_GITHUB = "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/heads/main/focos_historico.zip"
-URL_HIDRO_OFFLINE = "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/heads/main/hidrografia_MS.zip"
-URL_AUTEX_IBAMA = "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/heads/main/Dados_Agrupados_QGIS.zip"
-URL_PARQUET_CONVERTED = "https://github.com/chirugaiteiro/bases_ambientais/raw/refs/heads/main/converted_data.parquet"
-
-# --- LISTAS DE BASES ---
-
-BASES_ADMINISTRATIVAS = [
-    {"nome": "Municípios MS", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/SEMADESC/SEMADESC_MAPAS/MapServer/38/query", "tipo": "poligono"},
-    {"nome": "Biomas em MS", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/lim_biomas_atual/MapServer/0/query", "tipo": "poligono"}
-]
-
-BASES_CAR = [
-    {"nome": "CAR - Limite da Propriedade", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/car_lim_propriedade/FeatureServer/8/query", "tipo": "poligono"},
-    {"nome": "CAR - Uso Restrito", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/car_uso_restrito/FeatureServer/3/query", "tipo": "poligono"},
-    {"nome": "CAR - Uso Consolidado", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/car_uso_consolidado/FeatureServer/4/query", "tipo": "poligono"},
-    {"nome": "CAR - Servidão Administrativa", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/car_servidao_adm/FeatureServer/5/query", "tipo": "poligono"},
-    {"nome": "CAR - Reserva Legal", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/car_reserva_legal/FeatureServer/6/query", "tipo": "poligono"},
-    {"nome": "CAR - Remanescente Veg. Nativa", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/car_remanescente_veg_nativa/FeatureServer/7/query", "tipo": "poligono"},
-    {"nome": "CAR - Áreas de Preservação Permanente (APP)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/car_app/FeatureServer/9/query", "tipo": "poligono"}
-]
-
-BASES_GERAIS = [
-    {"nome": "Unidades de Conservação", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/UCs_MS_Mosaico/MapServer/0/query", "tipo": "poligono"},
-    {"nome": "Terras Indígenas", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/CAMADAS_API_SISGEO_v1/FeatureServer/4/query", "tipo": "poligono"},
-    {"nome": "Povos Tradicionais (Quilombolas)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/AGRAER_SERVICOS/Povos_Tradicionais/MapServer/2/query", "tipo": "poligono"},
-    {"nome": "Áreas de Uso Restrito (Dec. 15.661)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/SiriemaGeo_Sisla/MapServer/49/query", "tipo": "poligono"},
-    {"nome": "Áreas Priorit. Banhados", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/SiriemaGeo_Sisla/MapServer/52/query", "tipo": "poligono"},
-    {"nome": "Bacias Hidrográficas do Rio Paraná em MS", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/SiriemaGeo_Sisla/MapServer/14/query", "tipo": "poligono"},
-    {"nome": "Bacias Hidrográficas do Rio Paraguai em MS", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/SiriemaGeo_Sisla/MapServer/13/query", "tipo": "poligono"},
-    {"nome": "Corredores Ecológicos do Pantanal", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/Corredores_Ecológicos_Pantanal/MapServer/0/query", "tipo": "poligono"},
-    {"nome": "Área de Entorno 0-3 Km (Rio Taquari)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/SiriemaGeo_Sisla/MapServer/48/query", "tipo": "poligono"},
-    {"nome": "Zona de Amortecimento (Estaduais)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/CAMADAS_API_SISGEO_v1/FeatureServer/2/query", "tipo": "poligono"},
-    {"nome": "ZA (Conama 0-2km)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/CAMADAS_API_SISGEO_v1/FeatureServer/1/query", "tipo": "poligono"},
-    {"nome": "ZA (Conama 0-3km)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/CAMADAS_API_SISGEO_v1/FeatureServer/0/query", "tipo": "poligono"}
-]
-
-BASES_HIDRO = [
-    {"nome": "Hidrografia MS (Rios)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/SEMADESC/SEMADESC_MAPAS/MapServer/12/query", "tipo": "linha"}
-]
-
-BASES_FISCALIZACAO = [
-    {"nome": "Embargos IBAMA", "tipo_fonte": "REST", "url": "https://pamgia.ibama.gov.br/server/rest/services/01_Publicacoes_Bases/adm_embargos_ibama_a/MapServer/0/query", "tipo": "poligono"},
-    {"nome": "Embargos ICMBio", "tipo_fonte": "WFS", "url": "https://geoservicos.inde.gov.br/geoserver/ICMBio/ows", "layer_name": "ICMBio:embargos_icmbio", "tipo": "poligono"},
-    {"nome": "MapBiomas Alerta", "tipo_fonte": "WFS", "url": "https://production.alerta.mapbiomas.org/geoserver/wfs", "layer_name": "mapbiomas-alertas:alert_report", "tipo": "poligono"},
-    {"nome": "Focos de Calor (INPE - Ano Atual)", "tipo_fonte": "WFS", "url": "https://queimadas.dgi.inpe.br/queimadas/geoserver/wfs", "layer_name": "bdqueimadas:focos_br_ref", "tipo": "ponto"},
-    {"nome": "Áreas Antropizadas (SICAR/Dinamizada)", "tipo_fonte": "REST", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/CAR/Insumos/MapServer/1/query", "tipo": "poligono"},
-]
-
-BASES_LICENCAS = [
-    {"nome": "Licenças Emitidas (Siriema/IMASUL)", "url": "https://www.pinms.ms.gov.br/arcgis/rest/services/IMASUL/licencas_ambientais/FeatureServer/16/query", "tipo": "poligono"}
-]
-
-# --- BASES OFFLINE / GITHUB ---
-BASES_GITHUB = [
-    {"nome": "Focos Históricos (INPE - ZIP)", "url": URL_GEOJSON_GITHUB, "tipo_fonte": "ZIP"},
-    {"nome": "Hidrografia MS (Offline - ZIP)", "url": URL_HIDRO_OFFLINE, "tipo_fonte": "ZIP"},
-    {"nome": "Dados Agrupados (Autex - ZIP)", "url": URL_AUTEX_IBAMA, "tipo_fonte": "ZIP"},
-    {"nome": "Dados Convertidos (Parquet)", "url": URL_PARQUET_CONVERTED, "tipo_fonte": "PARQUET"}
-]
-
-CATEGORIAS = {
-    "Administrativas": BASES_ADMINISTRATIVAS,
-    "CAR (Sicar/MS)": BASES_CAR,
-    "Restrições Gerais": BASES_GERAIS,
-    "Hidrografia (Online)": BASES_HIDRO,
-    "Fiscalização": BASES_FISCALIZACAO,
-    "Licenças": BASES_LICENCAS,
-    "Arquivos GitHub (ZIP/Parquet)": BASES_GITHUB
-}
+# Camadas e categorias vêm do registro único (layer_registry.py, montado de
+# config_bases.py): o wizard não mantém cópia própria das listas BASES_*.
+REGISTRO = get_registry()
+CATEGORIAS = {cat: REGISTRO.category(cat) for cat in REGISTRO.categories()}
 
 # ==============================================================================
 # 2. FUNÇÕES DE EXTRAÇÃO
 # ==============================================================================
 
 @st.cache_data(ttl=3600, show_spinner=False)
-def fetch_rest_wfs_attributes(layer_config):
+def fetch_rest_wfs_attributes(fonte, url, layer_name=None):
     """Busca atributos via API (ArcGIS REST ou OGC WFS)."""
-    tipo = layer_config.get("tipo_fonte", "REST")
-    url = layer_config["url"]
     
     try:
         data_attributes = {}
         # --- LÓGICA REST ---
-        if tipo == "REST":
+        if fonte == "ARCGIS":
             params = {"where": "1=1", "outFields": "*", "f": "json", "resultRecordCount": 5, "returnGeometry": "false"}
             if not url.endswith("query"): url = url.rstrip("/") + "/query"
-            r = requests.get(url, params=params, headers=HEADERS, timeout=15, verify=False)
-            if r.status_code == 200:
+            r = http_async.get(url, params=params, timeout=15)
+            if r.status == 200:
                 features = r.json().get("features", [])
                 if features: data_attributes = random.choice(features).get("attributes", {})
                 else: return {"AVISO": "Camada vazia."}
-            else: return {"ERRO": f"Status: {r.status_code}"}
+            else: return {"ERRO": f"Status: {r.status}"}
 
         # --- LÓGICA WFS ---
-        elif tipo == "WFS":
-            params = {"service": "WFS", "version": "1.1.0", "request": "GetFeature", "typeName": layer_config.get("layer_name"), "outputFormat": "application/json", "maxFeatures": 5}
-            r = requests.get(url, params=params, headers=HEADERS, timeout=30, verify=False)
-            if r.status_code == 200:
+        elif fonte == "WFS":
+            params = {"service": "WFS", "version": "1.1.0", "request": "GetFeature", "typeName": layer_name, "outputFormat": "application/json", "maxFeatures": 5}
+            r = http_async.get(url, params=params, timeout=30)
+            if r.status == 200:
                 try:
                     features = r.json().get("features", [])
                     if features: data_attributes = random.choice(features).get("properties", {})
                     else: return {"AVISO": "WFS vazio."}
                 except: return {"ERRO": "JSON inválido."}
-            else: return {"ERRO": f"WFS Status: {r.status_code}"}
+            else: return {"ERRO": f"WFS Status: {r.status}"}
         
         return data_attributes
     except Exception as e: return {"ERRO": str(e)}
 
 @st.cache_data(ttl=3600, show_spinner=False)
-def fetch_zip_attributes(url, uploaded_file=None):
-    """Baixa ZIP ou usa arquivo enviado, extrai e lê Shapefile/GeoJSON com Geopandas."""
+def fetch_file_attributes(url, uploaded_file=None, max_idade=None):
+    """Baixa ZIP/GeoJSON ou usa arquivo enviado e lê só as primeiras feições (sem extrair o ZIP)."""
     try:
+        import zipfile
+        import disk_cache
+        from base_readers import read_zip_sample
+
         # Se usuário enviou arquivo manualmente, usa ele
         if uploaded_file:
             zip_file_object = uploaded_file
         else:
-            r = requests.get(url, headers=HEADERS, timeout=60, verify=False)
-            if r.status_code != 200: return {"ERRO": f"Falha download (Status: {r.status_code})"}
-            zip_file_object = io.BytesIO(r.content)
+            silenciar_ssl()
+            # Cache em disco: reinícios do app custam só uma revalidação (304)
+            zip_file_object, status = disk_cache.fetch(url, headers=HEADERS, timeout=60, verify=False, max_idade=max_idade)
+            if zip_file_object is None: return {"ERRO": f"Falha download (Status: {status})"}
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with zipfile.ZipFile(zip_file_object, 'r') as zf: zf.extractall(temp_dir)
-            files = [f for f in os.listdir(temp_dir) if f.endswith(('.shp', '.geojson'))]
-            if not files: return {"ERRO": "Nenhum .shp/.geojson no ZIP."}
-            
-            gdf = gpd.read_file(os.path.join(temp_dir, files[0]))
-            if gdf.empty: return {"AVISO": "Arquivo vazio."}
-            
-            return {k: str(v) for k, v in gdf.sample(1).iloc[0].drop('geometry', errors='ignore').to_dict().items()}
-    except Exception as e: return {"ERRO": f"Erro ZIP: {str(e)}"}
+        if zipfile.is_zipfile(zip_file_object):
+            gdf = read_zip_sample(zip_file_object, n_features=50)
+        else:  # GeoJSON solto
+            import geopandas as gpd
+            if hasattr(zip_file_object, "seek"): zip_file_object.seek(0)
+            gdf = gpd.read_file(zip_file_object, rows=50)
+        if gdf is None: return {"ERRO": "Nenhum .shp/.geojson no ZIP."}
+        if gdf.empty: return {"AVISO": "Arquivo vazio."}
+        
+        return {k: str(v) for k, v in gdf.sample(1).iloc[0].drop('geometry', errors='ignore').to_dict().items()}
+    except Exception as e: return {"ERRO": f"Erro arquivo: {str(e)}"}
 
 @st.cache_data(ttl=3600, show_spinner=False)
 def fetch_parquet_attributes(url, uploaded_file=None):
-    """Baixa e lê arquivo PARQUET (requer engine pyarrow)."""
+    """Lê uma amostra do PARQUET (requer engine pyarrow): só o rodapé e um row group, sem a geometria."""
     try:
-        # Se usuário enviou arquivo manualmente
+        from base_readers import read_parquet_sample
+
+        # Se usuário enviou arquivo manualmente, usa ele
         if uploaded_file:
-            file_object = uploaded_file
+            df = read_parquet_sample(uploaded_file)
         else:
-            r = requests.get(url, headers=HEADERS, timeout=60, verify=False)
-            if r.status_code != 200: return {"ERRO": f"Falha download (Status: {r.status_code})"}
-            file_object = io.BytesIO(r.content)
-        
-        # Lê o parquet
-        df = pd.read_parquet(file_object)
+            # Lê a URL via HTTP Range (rodapé + um row group); sem suporte a Range, usa o cache em disco
+            df = read_parquet_sample(url, headers=HEADERS, timeout=60, verify=False)
             
         if df.empty: return {"AVISO": "Parquet vazio."}
         
         sample = df.sample(1).iloc[0]
-        if 'geometry' in sample: sample = sample.drop('geometry')
         
         return {k: str(v) for k, v in sample.to_dict().items()}
         
@@ -197,77 +132,130 @@ st.markdown("Extração automática de colunas para configuração do sistema.")
 
 if "final_config" not in st.session_state: st.session_state["final_config"] = {}
 
-tabs = st.tabs(list(CATEGORIAS.keys()) + ["💾 Gerar Config Final"])
+def campos_dataframe(esquema):
+    """Tabela de campos do cache de esquemas (tipo, alias e domínio)."""
+    import pandas as pd
+    linhas = []
+    for c in esquema["campos"]:
+        dominio = c.get("dominio")
+        if isinstance(dominio, dict) and "min" in dominio: dominio = f"{dominio['min']} – {dominio['max']}"
+        elif dominio: dominio = ", ".join(f"{k}={v}" for k, v in dominio.items())
+        linhas.append({"Campo": c["nome"], "Tipo": c.get("tipo") or "", "Alias": c.get("alias") or "", "Domínio": dominio or ""})
+    return pd.DataFrame(linhas)
 
-for i, (cat_name, layers) in enumerate(CATEGORIAS.items()):
-    with tabs[i]:
-        st.header(cat_name)
-        for layer in layers:
-            with st.expander(f"📍 {layer['nome']}", expanded=False):
-                # Botão de carregar
-                if st.button("Carregar Amostra", key=f"btn_{layer['nome']}"):
-                    st.session_state[f"load_{layer['nome']}"] = True
+def render_layer(camada, esquema):
+    """Expander de uma camada: esquema em cache, amostra e seleção de colunas."""
+    with st.expander(f"📍 {camada.nome}", expanded=False):
+        if esquema:
+            info = esquema["info"]
+            detalhes = [f"{esquema['tipo']}", f"{len(esquema['campos'])} campos", f"versão {esquema['versao']}"]
+            if info.get("geometria"): detalhes.append(f"geometria {info['geometria']}")
+            if info.get("max_record_count"): detalhes.append(f"maxRecordCount {info['max_record_count']}")
+            st.caption(" · ".join(detalhes))
+            st.dataframe(campos_dataframe(esquema), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Esquema não está em cache (use 🔄 Atualizar esquemas).")
 
-                # Estado de carregamento ativado
-                if st.session_state.get(f"load_{layer['nome']}", False):
-                    amostra = {}
+        # Botão de carregar
+        if st.button("Carregar Amostra", key=f"btn_{camada.nome}"):
+            st.session_state[f"load_{camada.nome}"] = True
+
+        # Estado de carregamento ativado
+        if st.session_state.get(f"load_{camada.nome}", False):
+            amostra = {}
+            
+            # 1. Tenta baixar automaticamente
+            with st.spinner("Conectando..."):
+                fonte = camada.fonte
+                if fonte in ("ZIP", "GEOJSON"):
+                    # Gêmeo GeoParquet primeiro (bem menor); se não existir, cai para o ZIP/GeoJSON
+                    if camada.prefere_parquet: amostra = fetch_parquet_attributes(camada.url_parquet)
+                    if not amostra or "ERRO" in amostra: amostra = fetch_file_attributes(camada.url, max_idade=camada.cache_ttl)
+                elif fonte == "PARQUET": amostra = fetch_parquet_attributes(camada.url)
+                else: amostra = fetch_rest_wfs_attributes(fonte, camada.url, camada.layer_id)
+
+            # 2. Se der ERRO, mostra opção de Upload Manual (Fallback)
+            if "ERRO" in amostra:
+                st.error(f"Não foi possível baixar automaticamente: {amostra['ERRO']}")
+                st.markdown("**Solução Alternativa:** Se você tiver o arquivo no seu computador, arraste-o abaixo:")
+                
+                # Define tipo de arquivo aceito
+                f_types = {"PARQUET": ["parquet"], "ZIP": ["zip"], "GEOJSON": ["geojson", "json", "zip"]}.get(fonte, ["zip"])
+                uploaded = st.file_uploader(f"Upload manual ({camada.nome})", type=f_types, key=f"up_{camada.nome}")
+                
+                if uploaded:
+                    with st.spinner("Lendo arquivo enviado..."):
+                        if fonte == "PARQUET": amostra = fetch_parquet_attributes(None, uploaded)
+                        else: amostra = fetch_file_attributes(None, uploaded)
+
+            # 3. Exibe Tabela se tiver dados válidos (do download ou do upload)
+            if amostra and "ERRO" not in amostra and "AVISO" not in amostra:
+                df_data = []
+                saved_conf = st.session_state["final_config"].get(camada.nome, {})
+                
+                tipos = {c["nome"]: c.get("tipo") for c in esquema["campos"]} if esquema else {}
+                for k, v in amostra.items():
+                    df_data.append({
+                        "Campo Original": k,
+                        "Tipo": tipos.get(k) or "",
+                        "Valor Exemplo": str(v)[:100],
+                        "Usar?": k in saved_conf,
+                        "Nome no App (Alias)": saved_conf.get(k, "")
+                    })
+                
+                import pandas as pd
+                edited = st.data_editor(
+                    pd.DataFrame(df_data),
+                    column_config={
+                        "Usar?": st.column_config.CheckboxColumn("Extrair?", width="small"),
+                        "Nome no App (Alias)": st.column_config.TextColumn("Nome Amigável", width="large"),
+                        "Valor Exemplo": st.column_config.TextColumn("Exemplo", disabled=True),
+                        "Tipo": st.column_config.TextColumn("Tipo", disabled=True, width="small"),
+                        "Campo Original": st.column_config.TextColumn("Campo", disabled=True)
+                    },
+                    hide_index=True,
+                    key=f"ed_{camada.nome}"
+                )
+                
+                sel = edited[edited["Usar?"] == True]
+                if not sel.empty:
+                    mapping = {row["Campo Original"]: (row["Nome no App (Alias)"] or row["Campo Original"].capitalize()) for _, row in sel.iterrows()}
+                    st.session_state["final_config"][camada.nome] = mapping
+                    st.success(f"Salvo: {len(mapping)} colunas.")
                     
-                    # 1. Tenta baixar automaticamente
-                    with st.spinner("Conectando..."):
-                        tipo = layer.get("tipo_fonte", "REST")
-                        if tipo == "ZIP": amostra = fetch_zip_attributes(layer["url"])
-                        elif tipo == "PARQUET": amostra = fetch_parquet_attributes(layer["url"])
-                        else: amostra = fetch_rest_wfs_attributes(layer)
+            elif "AVISO" in amostra:
+                st.warning(amostra["AVISO"])
+
+def render_categoria(cat_name, layers):
+    st.header(cat_name)
+    esquemas_cache = schema_cache.get_cache()
+    configs = [c.config for c in layers]
 
-                    # 2. Se der ERRO, mostra opção de Upload Manual (Fallback)
-                    if "ERRO" in amostra:
-                        st.error(f"Não foi possível baixar automaticamente: {amostra['ERRO']}")
-                        st.markdown("**Solução Alternativa:** Se você tiver o arquivo no seu computador, arraste-o abaixo:")
-                        
-                        # Define tipo de arquivo aceito
-                        f_types = ["parquet"] if tipo == "PARQUET" else ["zip"]
-                        uploaded = st.file_uploader(f"Upload manual ({layer['nome']})", type=f_types, key=f"up_{layer['nome']}")
-                        
-                        if uploaded:
-                            with st.spinner("Lendo arquivo enviado..."):
-                                if tipo == "ZIP": amostra = fetch_zip_attributes(None, uploaded)
-                                elif tipo == "PARQUET": amostra = fetch_parquet_attributes(None, uploaded)
+    # Esquemas de todas as camadas da aba, inspecionados em paralelo e guardados em cache local
+    col_atualizar, col_forcar = st.columns([1, 3])
+    forcar = col_forcar.checkbox("Conferir também as que estão dentro da validade", key=f"forcar_{cat_name}")
+    if col_atualizar.button("🔄 Atualizar esquemas", key=f"esq_{cat_name}", help="Consulta ?f=json / DescribeFeatureType / rodapé Parquet das camadas desta aba"):
+        silenciar_ssl()
+        with st.spinner("Inspecionando camadas..."):
+            resultado = esquemas_cache.refresh(configs, forcar=forcar, headers=HEADERS, verify=False)
+        alteradas = [n for n, e in resultado.items() if e in ("novo", "alterado")]
+        erros = {n: e for n, e in resultado.items() if e.startswith("erro")}
+        st.caption(f"{len(resultado)} camadas conferidas · {len(alteradas)} novas/alteradas · {len(erros)} com erro")
+        for n, e in erros.items(): st.caption(f"⚠️ {n}: {e[6:]}")
+    esquemas = esquemas_cache.get_many(configs)
 
-                    # 3. Exibe Tabela se tiver dados válidos (do download ou do upload)
-                    if amostra and "ERRO" not in amostra and "AVISO" not in amostra:
-                        df_data = []
-                        saved_conf = st.session_state["final_config"].get(layer["nome"], {})
-                        
-                        for k, v in amostra.items():
-                            df_data.append({
-                                "Campo Original": k,
-                                "Valor Exemplo": str(v)[:100],
-                                "Usar?": k in saved_conf,
-                                "Nome no App (Alias)": saved_conf.get(k, "")
-                            })
-                        
-                        edited = st.data_editor(
-                            pd.DataFrame(df_data),
-                            column_config={
-                                "Usar?": st.column_config.CheckboxColumn("Extrair?", width="small"),
-                                "Nome no App (Alias)": st.column_config.TextColumn("Nome Amigável", width="large"),
-                                "Valor Exemplo": st.column_config.TextColumn("Exemplo", disabled=True),
-                                "Campo Original": st.column_config.TextColumn("Campo", disabled=True)
-                            },
-                            hide_index=True,
-                            key=f"ed_{layer['nome']}"
-                        )
-                        
-                        sel = edited[edited["Usar?"] == True]
-                        if not sel.empty:
-                            mapping = {row["Campo Original"]: (row["Nome no App (Alias)"] or row["Campo Original"].capitalize()) for _, row in sel.iterrows()}
-                            st.session_state["final_config"][layer["nome"]] = mapping
-                            st.success(f"Salvo: {len(mapping)} colunas.")
-                            
-                    elif "AVISO" in amostra:
-                        st.warning(amostra["AVISO"])
+    for camada in layers:
+        render_layer(camada, esquemas.get(camada.nome))
 
-with tabs[-1]:
+def render_config_final():
     st.header("JSON Final")
     if st.button("Gerar Código"):
         st.code(f"CONFIG_COLUNAS = {json.dumps(st.session_state['final_config'], indent=4, ensure_ascii=False)}", language="python")
+
+# Só a aba escolhida é montada (st.tabs executaria o corpo de todas a cada interação)
+ABA_FINAL = "💾 Gerar Config Final"
+aba = st.segmented_control("Categoria", list(CATEGORIAS) + [ABA_FINAL], default=next(iter(CATEGORIAS)), key="aba", label_visibility="collapsed")
+if aba == ABA_FINAL:
+    render_config_final()
+elif aba:
+    render_categoria(aba, CATEGORIAS[aba])
@@ -0,0 +1,79 @@
+# convert_bases.py
+# Gera o gêmeo GeoParquet ("url_parquet") de cada base GeoJSON/ZIP de config_bases.py.
+#
+# Uso: python convert_bases.py [--saida DIR] [--forcar] [--pendentes]
+#
+# Os arquivos são gravados com compressão zstd, coluna de cobertura "bbox"
+# (GeoParquet 1.1, permite filtrar por extensão sem decodificar a geometria) e
+# row groups pequenos, para que a amostragem do wizard leia só um pedaço.
+# Depois de gerados, basta publicá-los no repositório (mesmo nome da URL).
+
+import argparse
+import os
+import posixpath
+from urllib.parse import urlsplit
+
+from base_readers import DIR_LOCAL, local_path, read_geo_file
+from layer_registry import get_registry
+
+COMPRESSAO = "zstd"
+LINHAS_POR_ROW_GROUP = 10_000
+
+
+def iter_convertible_bases(pendentes=False):
+    """
+    Bases de arquivo que declaram um gêmeo GeoParquet, sem repetir o mesmo destino.
+
+    Com `pendentes`, também as bases GeoJSON/ZIP ainda sem gêmeo, com o destino
+    de mesmo nome da URL (publique o arquivo e só então declare "url_parquet").
+    """
+    vistos = set()
+    for camada in get_registry():
+        destino = camada.url_parquet
+        base = camada.config
+        if not destino and pendentes and camada.fonte in ("ZIP", "GEOJSON"):
+            destino = posixpath.splitext(camada.url.split("?")[0])[0] + ".parquet"
+            base = {**base, "url_parquet": destino}
+        if camada.arquivo and destino and destino not in vistos:
+            vistos.add(destino)
+            yield base
+
+
+def convert_base(base, saida=DIR_LOCAL, forcar=False, **kwargs):
+    """Converte uma base para GeoParquet. Retorna (caminho_destino, mensagem)."""
+    destino = os.path.join(saida, posixpath.basename(urlsplit(base["url_parquet"]).path))
+    if os.path.exists(destino) and not forcar:
+        return destino, "já existe (use --forcar para regerar)"
+
+    gdf = read_geo_file(local_path(base["url"], **kwargs))
+    temp = destino + ".part"
+    gdf.to_parquet(
+        temp,
+        compression=COMPRESSAO,
+        write_covering_bbox=True,
+        schema_version="1.1.0",
+        row_group_size=LINHAS_POR_ROW_GROUP,
+        index=False,
+    )
+    os.replace(temp, destino)
+    return destino, f"{len(gdf)} feições, {os.path.getsize(destino) / 1024:.0f} KB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera os gêmeos GeoParquet das bases GeoJSON/ZIP.")
+    parser.add_argument("--saida", default=DIR_LOCAL, help="Diretório de destino (padrão: diretório do projeto)")
+    parser.add_argument("--forcar", action="store_true", help="Regera mesmo se o arquivo já existir")
+    parser.add_argument("--pendentes", action="store_true", help="Inclui as bases GeoJSON/ZIP que ainda não declaram url_parquet")
+    args = parser.parse_args()
+
+    os.makedirs(args.saida, exist_ok=True)
+    for base in iter_convertible_bases(args.pendentes):
+        try:
+            destino, mensagem = convert_base(base, args.saida, args.forcar, timeout=120)
+            print(f"✅ {base['nome']}: {os.path.basename(destino)} — {mensagem}")
+        except Exception as e:
+            print(f"❌ {base['nome']}: {e}")
+
+
+if __name__ == "__main__":
+    main()
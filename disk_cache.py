@@ -0,0 +1,230 @@
+# disk_cache.py
+# Cache persistente em disco para os arquivos baixados (GitHub e afins).
+#
+# - Conteúdo endereçado por hash: cada arquivo fica em objetos/<sha[:2]>/<sha256>
+# - Índice em SQLite (url -> sha, ETag, Last-Modified, tamanho, último acesso),
+#   seguro para vários processos ao mesmo tempo (config_wizard.py e base_check.py)
+# - Revalidação com requisição condicional: se nada mudou o servidor responde 304
+#   e o arquivo local é reaproveitado sem nova transferência; dentro da validade
+#   da camada (max_idade) nem a revalidação é feita
+# - Remoção LRU (menos usados recentemente) quando o total passa do limite; entradas
+#   usadas nos últimos EM_USO segundos (e a que acabou de ser gravada) ficam, mesmo
+#   que o total passe do limite por um tempo: outro processo pode ter recebido o
+#   caminho e ainda não ter aberto o arquivo
+# - Host fora do ar (disjuntor aberto em host_breaker.py): a cópia local é
+#   devolvida sem tentar a conexão
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+# --- CONFIGURAÇÃO (pode ser sobrescrita por variáveis de ambiente) ---
+CACHE_DIR = os.environ.get("BASES_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bases_ambientais"))
+CACHE_MAX_MB = float(os.environ.get("BASES_CACHE_MAX_MB", "500"))
+TIMEOUT = 60  # teto em segundos; host_breaker reduz pela latência recente do host
+EM_USO = 300  # segundos desde o último acesso em que uma entrada não é removida
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entradas (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    tamanho INTEGER NOT NULL,
+    baixado_em REAL NOT NULL,
+    ultimo_acesso REAL NOT NULL
+)
+"""
+
+
+class DiskCache:
+    """Cache de downloads em disco, indexado pela URL."""
+
+    def __init__(self, diretorio=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.diretorio = diretorio
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(os.path.join(diretorio, "objetos"), exist_ok=True)
+        with self._conectar() as con:
+            con.execute(_SCHEMA)
+
+    # --- Índice ---
+
+    @contextmanager
+    def _conectar(self):
+        # timeout alto: outro processo pode estar segurando o lock de escrita
+        con = sqlite3.connect(os.path.join(self.diretorio, "index.sqlite"), timeout=30, isolation_level=None)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            yield con
+        finally:
+            con.close()
+
+    def _caminho_objeto(self, sha):
+        return os.path.join(self.diretorio, "objetos", sha[:2], sha)
+
+    def _entrada(self, url):
+        with self._conectar() as con:
+            return con.execute(
+                "SELECT sha256, etag, last_modified, baixado_em FROM entradas WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _tocar(self, url, revalidado=False):
+        # baixado_em marca a última vez que o servidor confirmou o conteúdo (download ou 304)
+        agora = time.time()
+        with self._conectar() as con:
+            if revalidado:
+                con.execute("UPDATE entradas SET ultimo_acesso = ?, baixado_em = ? WHERE url = ?", (agora, agora, url))
+            else:
+                con.execute("UPDATE entradas SET ultimo_acesso = ? WHERE url = ?", (agora, url))
+
+    # --- Gravação ---
+
+    def _gravar(self, url, response):
+        """Grava o corpo da resposta (em streaming) e registra no índice. Retorna o caminho."""
+        sha = hashlib.sha256()
+        tamanho = 0
+        fd, temp = tempfile.mkstemp(dir=self.diretorio, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+                    sha.update(chunk)
+                    tamanho += len(chunk)
+            digest = sha.hexdigest()
+            destino = self._caminho_objeto(digest)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            # os.replace é atômico: leitores nunca veem um arquivo pela metade
+            os.replace(temp, destino)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+        agora = time.time()
+        with self._conectar() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, response.headers.get("ETag"), response.headers.get("Last-Modified"), tamanho, agora, agora),
+            )
+        self.evict(manter=url)
+        return destino
+
+    def evict(self, manter=None):
+        """
+        Remove as entradas menos usadas recentemente até o cache caber no limite.
+
+        Não remove `manter` (a URL recém-gravada, mesmo maior que o limite) nem
+        entradas acessadas nos últimos EM_USO segundos.
+        """
+        recentes = time.time() - EM_USO
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                # Objetos são compartilhados entre URLs com o mesmo conteúdo: conta cada um uma vez
+                total = con.execute(
+                    "SELECT COALESCE(SUM(tamanho), 0) FROM (SELECT DISTINCT sha256, tamanho FROM entradas)"
+                ).fetchone()[0]
+                removidos = []
+                for url, sha, tamanho in con.execute(
+                    "SELECT url, sha256, tamanho FROM entradas WHERE ultimo_acesso < ? AND url IS NOT ? "
+                    "ORDER BY ultimo_acesso", (recentes, manter)
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    con.execute("DELETE FROM entradas WHERE url = ?", (url,))
+                    if not con.execute("SELECT 1 FROM entradas WHERE sha256 = ?", (sha,)).fetchone():
+                        removidos.append(sha)
+                        total -= tamanho
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        for sha in removidos:
+            try:
+                os.remove(self._caminho_objeto(sha))
+            except OSError:
+                pass  # já removido por outro processo, ou aberto (Windows não remove arquivo aberto)
+
+    # --- API ---
+
+    def fetch(self, url, session=None, max_idade=None, **kwargs):
+        """
+        Retorna (caminho_local, status) para a URL, baixando apenas se necessário.
+
+        status é 304 quando a cópia local foi revalidada, 200 quando houve download
+        e o código de erro caso contrário (None se não houve conexão). Se o servidor
+        falhar (ou estiver com o disjuntor aberto) e existir cópia antiga, ela é
+        devolvida (caminho preenchido mesmo com status de erro).
+        Com `max_idade` (segundos, a validade da camada em layer_registry.py), uma
+        cópia confirmada há menos tempo que isso é devolvida sem consultar o
+        servidor (status 304).
+        kwargs são repassados para requests (headers, timeout, verify...).
+        """
+        import requests  # só quem baixa precisa dele (CACHE_DIR é importado por módulos leves)
+        from host_breaker import CircuitOpen, get_board
+        from http_async import shared_session
+
+        http = session or shared_session()
+        entrada = self._entrada(url)
+        local = self._caminho_objeto(entrada[0]) if entrada else None
+        if local and not os.path.exists(local):
+            entrada = local = None
+        if entrada and max_idade and time.time() - entrada[3] < max_idade:
+            self._tocar(url)
+            return local, 304
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entrada:
+            _, etag, last_modified, _ = entrada
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            with get_board().guard(url, kwargs.pop("timeout", TIMEOUT)) as chamada:
+                r = http.get(url, headers=headers, stream=True, timeout=chamada.timeout, **kwargs)
+                chamada.done(r.status_code)
+        except (CircuitOpen, requests.exceptions.RequestException):
+            if local:
+                self._tocar(url)
+                return local, None
+            raise
+
+        with r:
+            if r.status_code == 304 and local:
+                self._tocar(url, revalidado=True)
+                return local, 304
+            if r.status_code == 200:
+                try:
+                    return self._gravar(url, r), 200
+                except requests.exceptions.RequestException:
+                    # a conexão caiu no meio do corpo: o cabeçalho contou como sucesso, o download não
+                    get_board().breaker(url).failure()
+                    if local:
+                        self._tocar(url)
+                        return local, None
+                    raise
+        # Erro HTTP: serve a cópia antiga se houver
+        if local:
+            self._tocar(url)
+        return local, r.status_code
+
+
+_cache_padrao = None
+
+
+def get_cache():
+    """Instância compartilhada do cache com a configuração padrão."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = DiskCache()
+    return _cache_padrao
+
+
+def fetch(url, session=None, max_idade=None, **kwargs):
+    """Atalho para get_cache().fetch(...)."""
+    return get_cache().fetch(url, session=session, max_idade=max_idade, **kwargs)
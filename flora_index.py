@@ -0,0 +1,387 @@
+# flora_index.py
+# Índice das espécies da flora ameaçada (flora-ameacada-2021.csv) para cruzar com o Autex Sinaflor.
+#
+# Os nomes científicos são normalizados (sem autoria, sem acentos, minúsculas,
+# sem marcador de categoria infraespecífica): "Arthrocereus melanurus subsp.
+# magnus N.P.Taylor & Zappi" e "Arthrocereus melanurus magnus" viram a mesma chave.
+# Sem marcador, a terceira palavra só é lida como infraespecífica se a lista
+# tem esse epíteto para a espécie; senão é autoria ("Cedrela fissilis Vell.").
+# Busca, nesta ordem:
+#   1. chave exata
+#   2. espécie de um nome infraespecífico (a espécie inteira está na lista)
+#   3. prefixo único (epíteto truncado: "Tabebuia impetig")
+#   4. trigramas (grafias diferentes: "Albizia hasslerii" x "Albizia hassleri")
+# Só os nomes distintos são normalizados e buscados; a coluna inteira do Autex
+# (várias espécies por linha, separadas por "|") é resolvida por fatoração.
+# O índice é gerado uma vez e gravado em Parquet no diretório do disk_cache;
+# é refeito sozinho quando o CSV muda.
+#
+# Benchmark: python flora_index.py bench [N_LINHAS]
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config_bases import BASES_LICENCAS_FEDERAL
+from disk_cache import CACHE_DIR
+
+DIR_LOCAL = os.path.dirname(os.path.abspath(__file__))
+CSV_FLORA = os.path.join(DIR_LOCAL, "flora-ameacada-2021.csv")
+DIR_FLORA = os.path.join(CACHE_DIR, "flora")
+COLUNA_AUTEX = BASES_LICENCAS_FEDERAL[0]["colunas_chave"]["cientifico"]  # NOME_CIENTIFICO
+SEPARADOR_AUTEX = "|"
+VERSAO_FORMATO = 2
+
+SIMILARIDADE_MINIMA = 0.75   # trigramas em comum / união
+PREFIXO_MINIMO = 3           # letras do epíteto num nome truncado
+GRAVIDADE = {"VU": 1, "EN": 2, "CR": 3, "EW": 4, "EX": 5}
+
+_MARCADORES = {"subsp", "ssp", "var", "f", "fo", "forma", "subvar", "cv"}
+_QUALIFICADORES = {"cf", "aff", "x", "sp", "spp", "nov"}
+_PARTICULAS_AUTOR = {"et", "ex", "de", "da", "do", "dos", "das", "van", "von", "der", "del", "la", "le", "in", "non", "sensu", "al"}
+_EPITETO = re.compile(r"^[a-z][a-z-]*$")
+
+
+# --- 1. Normalização ---
+
+def _sem_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def normalize_name(nome, infras=None):
+    """
+    (chave, binômio) do nome científico; ("", "") se não der para ler.
+
+    'Protium giganteum var. crassifolium (Engl.) Daly' -> ('protium giganteum crassifolium', 'protium giganteum')
+    'Cedrela fissilis Vell.' -> ('cedrela fissilis', 'cedrela fissilis')
+
+    `infras` ({binômio: epítetos infraespecíficos conhecidos}) permite ler a
+    forma do Autex, sem marcador: 'Hymenaea courbaril stilbocarpa'.
+    """
+    if not isinstance(nome, str):
+        return "", ""
+    texto = _sem_acentos(nome).replace("×", " ").lower()
+    tokens = [t.strip(".,;:") for t in texto.split()]
+    tokens = [t for t in tokens if t and t not in _QUALIFICADORES]
+    if len(tokens) < 2 or not _EPITETO.match(tokens[0]) or not _EPITETO.match(tokens[1]):
+        return (tokens[0], tokens[0]) if tokens and _EPITETO.match(tokens[0]) else ("", "")
+    binomio = f"{tokens[0]} {tokens[1]}"
+    infra = None
+    for i, token in enumerate(tokens[2:], start=2):
+        if token in _MARCADORES and i + 1 < len(tokens) and _EPITETO.match(tokens[i + 1]):
+            infra = tokens[i + 1]
+            break
+        # sem marcador, só um epíteto que a lista conhece para a espécie; o resto é autoria
+        if i == 2 and infras and token in infras.get(binomio, ()):
+            infra = token
+            break
+    return (f"{binomio} {infra}" if infra and infra != tokens[1] else binomio), binomio
+
+
+def _trigramas(chave):
+    texto = f"  {chave} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _categoria(texto):
+    sigla = re.search(r"\(([A-Z]{2})\)", texto) if isinstance(texto, str) else None
+    return sigla.group(1) if sigla else None
+
+
+# --- 2. Construção e persistência ---
+
+def read_flora_csv(caminho=CSV_FLORA):
+    """Tabela [chave, binomio, especie, familia, categoria_2021, categoria_2014] da lista (CSV ';', UTF-8 com BOM)."""
+    df = pd.read_csv(caminho, sep=";", encoding="utf-8-sig", dtype=str)
+    especie = next(c for c in df.columns if c.startswith("Espécie"))
+    familia = next(c for c in df.columns if c.startswith("Família"))
+    anterior = next(c for c in df.columns if c.startswith("Nome avaliação"))
+    cat_2014 = next(c for c in df.columns if c.startswith("Categoria em 2014"))
+    cat_2021 = next(c for c in df.columns if "2021" in c and c.startswith("Sugestão"))
+
+    chaves = [normalize_name(n) for n in df[especie]]
+    tabela = pd.DataFrame({
+        "chave": [c for c, _ in chaves],
+        "binomio": [b for _, b in chaves],
+        "especie": df[especie].str.strip(),
+        "familia": df[familia].str.strip(),
+        "categoria_2021": df[cat_2021].map(_categoria),
+        "categoria_2014": df[cat_2014].map(_categoria),
+    })
+    # Nome da avaliação anterior como sinônimo (mesma linha, outra chave)
+    sinonimos = [normalize_name(n) for n in df[anterior]]
+    extra = tabela.assign(chave=[c for c, _ in sinonimos], binomio=[b for _, b in sinonimos])
+    extra = extra[(extra["chave"] != "") & ~extra["chave"].isin(tabela["chave"])]
+    tabela = pd.concat([tabela[tabela["chave"] != ""], extra], ignore_index=True)
+    # uma linha por chave: fica a categoria mais grave
+    tabela["_gravidade"] = tabela["categoria_2021"].map(GRAVIDADE).fillna(0)
+    tabela = tabela.sort_values(["chave", "_gravidade"], ascending=[True, False], kind="stable")
+    return tabela.drop_duplicates("chave").drop(columns="_gravidade").reset_index(drop=True)
+
+
+def _versao(caminho):
+    info = os.stat(caminho)
+    return hashlib.sha1(f"{os.path.abspath(caminho)}|{info.st_mtime_ns}|{info.st_size}|{VERSAO_FORMATO}".encode()).hexdigest()[:16]
+
+
+class FloraIndex:
+    """Espécies ameaçadas por chave normalizada, com índices de prefixo e trigramas."""
+
+    def __init__(self, tabela, postings=None):
+        self.tabela = tabela.reset_index(drop=True)
+        chaves = self.tabela["chave"].to_numpy(dtype=object)
+        self._por_chave = {c: i for i, c in enumerate(chaves)}
+        self._infras = {}
+        for chave, binomio in zip(chaves, self.tabela["binomio"]):
+            if chave != binomio:
+                self._infras.setdefault(binomio, set()).add(chave.rsplit(" ", 1)[1])
+        self._ordem = np.argsort(chaves)
+        self._ordenadas = chaves[self._ordem].astype(str)
+        self._trigramas = [_trigramas(c) for c in chaves]
+        if postings is None:
+            postings = {}
+            for i, trigramas in enumerate(self._trigramas):
+                for t in trigramas:
+                    postings.setdefault(t, []).append(i)
+            postings = {t: np.array(ids, dtype=np.int32) for t, ids in postings.items()}
+        self._postings = postings
+
+    @classmethod
+    def build(cls, caminho=CSV_FLORA):
+        return cls(read_flora_csv(caminho))
+
+    def save(self, diretorio, versao=""):
+        os.makedirs(diretorio, exist_ok=True)
+        tabela = pa.Table.from_pandas(self.tabela, preserve_index=False)
+        tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), b"versao": versao.encode()})
+        postings = pa.table({"trigrama": list(self._postings), "ids": [v.tolist() for v in self._postings.values()]})
+        for nome, t in (("especies.parquet", tabela), ("trigramas.parquet", postings)):
+            parcial = os.path.join(diretorio, nome + ".part")
+            pq.write_table(t, parcial)
+            os.replace(parcial, os.path.join(diretorio, nome))
+
+    @classmethod
+    def load(cls, diretorio, versao=None):
+        """Índice gravado; None se não existir ou se a versão não bater."""
+        caminho = os.path.join(diretorio, "especies.parquet")
+        if not os.path.exists(caminho):
+            return None
+        tabela = pq.read_table(caminho)
+        if versao is not None and (tabela.schema.metadata or {}).get(b"versao", b"").decode() != versao:
+            return None
+        postings = pq.read_table(os.path.join(diretorio, "trigramas.parquet")).to_pydict()
+        return cls(tabela.to_pandas(), {t: np.array(ids, dtype=np.int32) for t, ids in zip(postings["trigrama"], postings["ids"])})
+
+    # --- 3. Busca ---
+
+    def _prefixo(self, chave):
+        genero, _, epiteto = chave.partition(" ")
+        if len(epiteto) < PREFIXO_MINIMO:
+            return -1
+        inicio = np.searchsorted(self._ordenadas, chave, "left")
+        fim = np.searchsorted(self._ordenadas, chave + "￿", "left")
+        candidatos = {self.tabela["binomio"].iat[self._ordem[i]] for i in range(inicio, fim)}
+        # só aceita se todos os candidatos são a mesma espécie
+        if len(candidatos) != 1:
+            return -1
+        especie = candidatos.pop()
+        return self._por_chave.get(especie, self._ordem[inicio])
+
+    def _trigrama(self, chave):
+        alvo = _trigramas(chave)
+        contagem = {}
+        for t in alvo:
+            for i in self._postings.get(t, ()):
+                contagem[i] = contagem.get(i, 0) + 1
+        melhor, similaridade = -1, 0.0
+        for i, comuns in contagem.items():
+            s = comuns / (len(alvo) + len(self._trigramas[i]) - comuns)
+            if s > similaridade:
+                melhor, similaridade = i, s
+        return (melhor, similaridade) if similaridade >= SIMILARIDADE_MINIMA else (-1, similaridade)
+
+    def lookup(self, nomes, aproximado=True):
+        """
+        DataFrame alinhado a `nomes`: [nome, chave, indice, tipo, similaridade].
+
+        `indice` é a linha em self.tabela (-1 sem correspondência); `tipo` é
+        "exato", "especie", "prefixo", "trigrama" ou None.
+        """
+        linhas = []
+        for nome in nomes:
+            chave, binomio = normalize_name(nome, self._infras)
+            indice, tipo, similaridade = self._por_chave.get(chave, -1), "exato", 1.0
+            if indice < 0 and binomio != chave:
+                indice, tipo = self._por_chave.get(binomio, -1), "especie"
+            if indice < 0 and aproximado and chave:
+                indice, tipo = self._prefixo(chave), "prefixo"
+                if indice < 0:
+                    (indice, similaridade), tipo = self._trigrama(chave), "trigrama"
+            linhas.append((nome, chave, indice, tipo if indice >= 0 else None, similaridade if indice >= 0 else 0.0))
+        resultado = pd.DataFrame(linhas, columns=["nome", "chave", "indice", "tipo", "similaridade"])
+        # sem correspondência o tipo é None (o pandas 3 converteria a coluna de texto para NaN)
+        resultado["tipo"] = pd.Series([l[3] for l in linhas], index=resultado.index, dtype=object)
+        return resultado
+
+    def _combinacoes(self, serie, separador, aproximado):
+        """
+        (códigos, pares): `códigos` leva cada linha de `serie` à sua combinação
+        distinta (-1 se vazia); `pares` tem uma linha por (combinação, espécie citada).
+        """
+        codigos, combinacoes = pd.factorize(serie, use_na_sentinel=True)
+        partes = pd.Series(combinacoes, dtype=object).str.split(separador).explode().str.strip()
+        partes = partes[partes.notna() & (partes != "")]
+        nomes, i_nome = np.unique(partes.to_numpy(dtype=str), return_inverse=True)
+        achados = self.lookup(nomes, aproximado)
+        indice = achados["indice"].to_numpy()[i_nome]
+        lista = self.tabela.reindex(indice).reset_index(drop=True)
+        pares = pd.DataFrame({
+            "combinacao": partes.index.to_numpy(),
+            "nome": achados["nome"].to_numpy()[i_nome],
+            "chave": achados["chave"].to_numpy()[i_nome],
+            "tipo": achados["tipo"].to_numpy()[i_nome],
+            "similaridade": achados["similaridade"].to_numpy()[i_nome],
+            "ameacada": indice >= 0,
+            "especie_lista": lista["especie"].to_numpy(),
+            "familia": lista["familia"].to_numpy(),
+            "categoria_2021": lista["categoria_2021"].to_numpy(),
+            "categoria_2014": lista["categoria_2014"].to_numpy(),
+        })
+        return codigos, len(combinacoes), pares
+
+    def match_column(self, serie, separador=SEPARADOR_AUTEX, aproximado=True):
+        """
+        Uma linha por (linha de `serie`, espécie citada) com a correspondência na lista.
+
+        Colunas: linha (posição em `serie`), nome, chave, tipo, similaridade,
+        ameacada, especie_lista, familia, categoria_2021, categoria_2014.
+        """
+        codigos, _, pares = self._combinacoes(serie, separador, aproximado)
+        # expande combinação -> linhas da série que a usam (vetorizado)
+        ordem = np.argsort(codigos, kind="stable")
+        ordenados = codigos[ordem]
+        inicio = np.searchsorted(ordenados, pares["combinacao"].to_numpy(), "left")
+        repeticoes = np.searchsorted(ordenados, pares["combinacao"].to_numpy(), "right") - inicio
+        i_par = np.repeat(np.arange(len(pares)), repeticoes)
+        deslocamento = np.arange(len(i_par)) - np.repeat(np.cumsum(repeticoes) - repeticoes, repeticoes)
+        resultado = pares.drop(columns="combinacao").iloc[i_par].reset_index(drop=True)
+        resultado.insert(0, "linha", ordem[np.repeat(inicio, repeticoes) + deslocamento])
+        return resultado.sort_values(["linha", "nome"], kind="stable", ignore_index=True)
+
+    def annotate(self, df, coluna=COLUNA_AUTEX, separador=SEPARADOR_AUTEX, aproximado=True):
+        """
+        Cópia de `df` com ameacada (bool), especies_ameacadas (texto) e
+        categoria_2021 (a mais grave entre as espécies da linha).
+
+        O resultado é calculado por combinação distinta da coluna e levado às
+        linhas por índice, sem expandir a tabela.
+        """
+        codigos, n_comb, pares = self._combinacoes(df[coluna], separador, aproximado)
+        pares = pares[pares["ameacada"]]
+        gravidade = pares["categoria_2021"].map(GRAVIDADE).fillna(0).to_numpy()
+        pares = pares.assign(_g=gravidade).sort_values(["combinacao", "_g"], ascending=[True, False], kind="stable")
+        categoria = np.full(n_comb + 1, None, dtype=object)   # última posição: linhas vazias (código -1)
+        nomes = np.full(n_comb + 1, None, dtype=object)
+        primeiros = pares.drop_duplicates("combinacao")
+        categoria[primeiros["combinacao"].to_numpy()] = primeiros["categoria_2021"].to_numpy()
+        for comb, especies in pares.groupby("combinacao", sort=False)["especie_lista"]:
+            nomes[comb] = SEPARADOR_AUTEX.join(dict.fromkeys(especies))
+        ameacada = np.zeros(n_comb + 1, dtype=bool)
+        ameacada[pares["combinacao"].to_numpy()] = True
+
+        saida = df.copy()
+        saida["ameacada"] = ameacada[codigos]
+        saida["especies_ameacadas"] = nomes[codigos]
+        saida["categoria_2021"] = categoria[codigos]
+        return saida
+
+
+_indice = None
+
+
+def get_index(caminho=CSV_FLORA, diretorio=DIR_FLORA):
+    """Índice do processo: lê o gravado no cache ou gera (e grava) a partir do CSV."""
+    global _indice
+    versao = _versao(caminho)
+    if _indice is None or getattr(_indice, "versao", None) != versao:
+        indice = FloraIndex.load(diretorio, versao)
+        if indice is None:
+            indice = FloraIndex.build(caminho)
+            indice.save(diretorio, versao)
+        indice.versao = versao
+        _indice = indice
+    return _indice
+
+
+# --- 4. Benchmark ---
+
+def _coluna_sintetica(n, indice, semente=42):
+    rng = np.random.default_rng(semente)
+    autex = pd.read_parquet(os.path.join(DIR_LOCAL, "Autex_Sinaflor.parquet"), columns=[COLUNA_AUTEX])[COLUNA_AUTEX].dropna()
+    nomes = pd.Series(autex.str.split(SEPARADOR_AUTEX).explode().str.strip().unique())
+    ameacadas = indice.tabela["especie"].sample(300, random_state=semente)
+    # grafias alteradas: letra trocada no epíteto / nome truncado
+    binomios = [" ".join(n.split()[:2]) for n in ameacadas]
+    variantes = [b[:-3] + "i" + b[-2:] for b in binomios[:50]] + [b[:-2] for b in binomios[50:80]]
+    vocabulario = np.array(list(nomes) + list(ameacadas) + variantes, dtype=object)
+    combinacoes = [SEPARADOR_AUTEX.join(rng.choice(vocabulario, rng.integers(1, 8))) for _ in range(20_000)]
+    return pd.Series(np.array(combinacoes, dtype=object)[rng.integers(0, len(combinacoes), n)])
+
+
+def bench(n=1_000_000):
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        inicio = time.perf_counter()
+        indice = FloraIndex.build()
+        indice.save(diretorio, "bench")
+        print(f"Índice: {len(indice.tabela)} chaves, gerado e gravado em {time.perf_counter() - inicio:.2f}s")
+        inicio = time.perf_counter()
+        indice = FloraIndex.load(diretorio, "bench")
+        print(f"Leitura do índice gravado: {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    serie = _coluna_sintetica(n, indice)
+    inicio = time.perf_counter()
+    anotado = indice.annotate(pd.DataFrame({COLUNA_AUTEX: serie}))
+    tempo = time.perf_counter() - inicio
+    print(f"annotate: {n:,} linhas em {tempo:.2f}s ({n / tempo:,.0f} linhas/s), {anotado['ameacada'].sum():,} com espécie ameaçada")
+
+    pares = indice.match_column(serie.head(50_000))
+    print(f"tipos de correspondência (50 mil linhas): {pares[pares['ameacada']]['tipo'].value_counts().to_dict()}")
+
+    # referência: linha a linha, só busca exata (amostra, extrapolada)
+    amostra = serie.head(50_000)
+    inicio = time.perf_counter()
+    for valor in amostra:
+        [indice._por_chave.get(normalize_name(p.strip(), indice._infras)[0], -1) for p in valor.split(SEPARADOR_AUTEX)]
+    tempo_ingenuo = (time.perf_counter() - inicio) / len(amostra) * n
+    print(f"linha a linha, só exato (extrapolado para {n:,} linhas): {tempo_ingenuo:.0f}s")
+
+    anotado = anotado.head(50_000)
+    pares = pares[pares["ameacada"]]
+    print(f"annotate x match_column (50 mil linhas) conferem: {set(pares['linha']) == set(np.flatnonzero(anotado['ameacada']))}")
+
+
+def main():
+    if sys.argv[1:2] == ["bench"]:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+    elif sys.argv[1:2] == ["build"]:
+        indice = get_index()
+        print(f"✅ {len(indice.tabela)} espécies em {DIR_FLORA}")
+    elif len(sys.argv) > 1:
+        print(json.dumps(get_index().lookup(sys.argv[1:]).to_dict("records"), ensure_ascii=False, indent=2, default=str))
+    else:
+        print("Uso: python flora_index.py build | bench [N_LINHAS] | NOME [NOME...]")
+
+
+if __name__ == "__main__":
+    main()
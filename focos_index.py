@@ -0,0 +1,299 @@
+# focos_index.py
+# Índice de consulta para os focos de calor (focos_historico.parquet).
+#
+# O arquivo original é um único row group com a data em texto ("1/1/2025 00:35"),
+# então qualquer consulta lê o histórico inteiro. Aqui ele é reorganizado num
+# dataset particionado:
+#   <dir>/mes=2025-01/parte-base.parquet
+#   <dir>/mes=2025-02/parte-base.parquet ...
+# Dentro de cada mês as linhas são ordenadas por uma chave de grade (ordem Z
+# sobre células de 0,05°) e gravadas em row groups pequenos; cada row group
+# guarda min/max de lat, lon e data_hora, e o pyarrow pula os que não cruzam a
+# consulta. A distância exata é calculada em NumPy só nos candidatos.
+#
+# Uso: python focos_index.py build [--forcar]
+#      python focos_index.py bench [N_CONSULTAS]
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shapely
+
+from base_readers import local_path
+from config_bases import URL_FOCOS_PARQUET
+from disk_cache import CACHE_DIR
+
+DIR_INDICE = os.environ.get("BASES_FOCOS_DIR", os.path.join(CACHE_DIR, "focos"))
+COMPRESSAO = "zstd"
+LINHAS_POR_ROW_GROUP = 1024
+FORMATO_DATA = "%m/%d/%Y %H:%M"  # data_hora_gmt do BDQueimadas
+ARQUIVO_MANIFESTO = "_compactacao.json"  # compactação em andamento num mês (focos_ingest.compact_month)
+
+# Grade da chave espacial (cobre o Brasil com folga)
+CELULA_GRAUS = 0.05
+LON_MIN, LAT_MIN = -75.0, -35.0
+RAIO_TERRA_M = 6_371_008.8
+CRS_METRICO = "EPSG:5880"
+
+
+# --- 1. Chaves de partição e de grade ---
+
+def _espalhar_bits(v):
+    """Intercala zeros entre os 16 bits baixos (para a ordem Z / Morton)."""
+    v = v.astype(np.uint32) & 0xFFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+def grid_key(lon, lat):
+    """Chave Z-order da célula de cada ponto: células vizinhas ficam próximas na ordenação."""
+    ix = np.clip((np.asarray(lon) - LON_MIN) // CELULA_GRAUS, 0, 0xFFFF)
+    iy = np.clip((np.asarray(lat) - LAT_MIN) // CELULA_GRAUS, 0, 0xFFFF)
+    return (_espalhar_bits(ix) | (_espalhar_bits(iy) << 1)).astype(np.uint32)
+
+
+def prepare_table(tabela):
+    """
+    Acrescenta data_hora (timestamp UTC), mes ("AAAA-MM") e celula a uma tabela de focos.
+
+    Aceita tanto o formato do arquivo histórico (data_hora_gmt em texto) quanto
+    tabelas que já tragam data_hora. A coluna de geometria WKB é descartada:
+    lat/lon bastam para a consulta e o arquivo fica bem menor.
+    """
+    if "geometry" in tabela.column_names:
+        tabela = tabela.drop_columns(["geometry"])
+    if "data_hora" not in tabela.column_names:
+        data_hora = pc.strptime(tabela["data_hora_gmt"], format=FORMATO_DATA, unit="ms", error_is_null=True)
+        tabela = tabela.append_column("data_hora", data_hora)
+    tabela = tabela.set_column(tabela.schema.get_field_index("data_hora"), "data_hora", tabela["data_hora"].cast(pa.timestamp("ms")))
+    mes = pc.strftime(tabela["data_hora"], format="%Y-%m")
+    celula = grid_key(tabela["lon"].to_numpy(zero_copy_only=False), tabela["lat"].to_numpy(zero_copy_only=False))
+    for nome, coluna in (("mes", mes), ("celula", pa.array(celula, type=pa.uint32()))):
+        if nome in tabela.column_names:
+            tabela = tabela.drop_columns([nome])
+        tabela = tabela.append_column(nome, coluna)
+    return tabela
+
+
+def write_partitions(tabela, diretorio, sufixo):
+    """
+    Grava uma tabela preparada como um arquivo novo por mês (mes=AAAA-MM/parte-<sufixo>.parquet).
+
+    Nunca sobrescreve: se o arquivo já existir, levanta FileExistsError. Linhas sem mes
+    (data_hora que não pôde ser lida) ficam de fora. Retorna os caminhos gravados.
+    """
+    gravados = []
+    for mes in pc.unique(tabela["mes"]).to_pylist():
+        if mes is None:
+            continue
+        parte = tabela.filter(pc.equal(tabela["mes"], mes))
+        parte = parte.take(pc.sort_indices(parte, [("celula", "ascending"), ("data_hora", "ascending")]))
+        pasta = os.path.join(diretorio, f"mes={mes}")
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f"parte-{sufixo}.parquet")
+        if os.path.exists(caminho):
+            raise FileExistsError(caminho)
+        # prefixo "_": o pyarrow.dataset ignora o temporário, mesmo dentro da pasta do mês
+        temp = os.path.join(pasta, f"_parte-{sufixo}.parquet.part")
+        pq.write_table(parte.drop_columns(["mes"]), temp, compression=COMPRESSAO, row_group_size=LINHAS_POR_ROW_GROUP)
+        os.replace(temp, caminho)
+        gravados.append(caminho)
+    return gravados
+
+
+def build_index(origem=None, diretorio=DIR_INDICE, forcar=False):
+    """
+    Gera o dataset particionado a partir de focos_historico.parquet.
+
+    Retorna (linhas gravadas, linhas descartadas por data_hora_gmt ilegível).
+    """
+    if os.path.isdir(diretorio) and os.listdir(diretorio):
+        if not forcar:
+            raise FileExistsError(f"{diretorio} já existe (use forcar=True para refazer).")
+        shutil.rmtree(diretorio)
+    origem = origem or local_path(URL_FOCOS_PARQUET)
+    tabela = prepare_table(pq.read_table(origem))
+    write_partitions(tabela, diretorio, "base")
+    descartadas = tabela["mes"].null_count
+    return tabela.num_rows - descartadas, descartadas
+
+
+# --- 2. Consulta ---
+
+def _intervalo(inicio, fim):
+    """Converte as datas para [inicio, fim) em Timestamp; um `fim` só com data inclui o dia inteiro."""
+    inicio = pd.Timestamp(inicio) if inicio is not None else None
+    if fim is not None:
+        fim = pd.Timestamp(fim)
+        if fim == fim.normalize():
+            fim += pd.Timedelta(days=1)
+    return inicio, fim
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Distância em metros (vetorizada) entre pontos em graus."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(a))
+
+
+def superseded_files(diretorio=DIR_INDICE):
+    """
+    Arquivos de entrada de compactações interrompidas cujo arquivo compactado já foi
+    publicado: os focos deles já estão no compactado e não devem ser lidos de novo.
+    """
+    substituidos = set()
+    for manifesto in glob.glob(os.path.join(diretorio, "mes=*", ARQUIVO_MANIFESTO)):
+        pasta = os.path.dirname(manifesto)
+        try:
+            with open(manifesto, encoding="utf-8") as f:
+                pendente = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if os.path.exists(os.path.join(pasta, pendente["destino"])):
+            substituidos.update(os.path.normpath(os.path.join(pasta, nome)) for nome in pendente["entradas"])
+    return substituidos
+
+
+class FocosIndex:
+    """Consulta focos por raio e período lendo só as partições e row groups que podem conter resultado."""
+
+    def __init__(self, diretorio=DIR_INDICE):
+        self.diretorio = diretorio
+        self.refresh()
+
+    def refresh(self):
+        """Relê a lista de arquivos (depois de uma ingestão nova, por exemplo)."""
+        self.dataset = ds.dataset(self.diretorio, format="parquet", partitioning="hive")
+        substituidos = superseded_files(self.diretorio)
+        if substituidos:
+            # compactação interrompida: sem as entradas, nenhum foco aparece duas vezes
+            arquivos = [f for f in self.dataset.files if os.path.normpath(f) not in substituidos]
+            self.dataset = ds.dataset(arquivos, format="parquet", partitioning="hive", partition_base_dir=self.diretorio)
+        self._fragmentos = {}
+        for fragmento in self.dataset.get_fragments():
+            mes = ds.get_partition_keys(fragmento.partition_expression)["mes"]
+            self._fragmentos.setdefault(mes, []).append(fragmento)
+
+    def _meses(self, inicio, fim):
+        meses = sorted(self._fragmentos)
+        if inicio is not None:
+            meses = [m for m in meses if m >= inicio.strftime("%Y-%m")]
+        if fim is not None:
+            meses = [m for m in meses if m <= (fim - pd.Timedelta(milliseconds=1)).strftime("%Y-%m")]
+        return meses
+
+    def candidates(self, limites, inicio=None, fim=None, columns=None):
+        """Focos dentro do retângulo (xmin, ymin, xmax, ymax) e do período, como pyarrow.Table."""
+        inicio, fim = _intervalo(inicio, fim)
+        xmin, ymin, xmax, ymax = limites
+        filtro = (pc.field("lon") >= xmin) & (pc.field("lon") <= xmax) & (pc.field("lat") >= ymin) & (pc.field("lat") <= ymax)
+        if inicio is not None:
+            filtro &= pc.field("data_hora") >= pa.scalar(inicio.to_pydatetime(), pa.timestamp("ms"))
+        if fim is not None:
+            filtro &= pc.field("data_hora") < pa.scalar(fim.to_pydatetime(), pa.timestamp("ms"))
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + ["lon", "lat", "data_hora"]))
+        fragmentos = [f for mes in self._meses(inicio, fim) for f in self._fragmentos[mes]]
+        if not fragmentos:
+            vazia = self.dataset.schema.empty_table()
+            return vazia.select(columns) if columns else vazia
+        # O FileSystemDataset só com os arquivos dos meses pedidos; o filtro usa as estatísticas dos row groups
+        parcial = ds.FileSystemDataset(fragmentos, self.dataset.schema, self.dataset.format, self.dataset.filesystem)
+        return parcial.to_table(filter=filtro, columns=columns)
+
+    def near(self, geometria, raio_m, inicio=None, fim=None, columns=None):
+        """
+        Focos a até `raio_m` metros de `geometria` (shapely em EPSG:4674) entre `inicio` e `fim`.
+
+        Retorna um DataFrame com a coluna extra "distancia_m", ordenado por data_hora.
+        """
+        xmin, ymin, xmax, ymax = geometria.bounds
+        dlat = np.degrees(raio_m / RAIO_TERRA_M)
+        dlon = dlat / max(np.cos(np.radians(max(abs(ymin), abs(ymax)))), 1e-6)
+        tabela = self.candidates((xmin - dlon, ymin - dlat, xmax + dlon, ymax + dlat), inicio, fim, columns)
+        lon = tabela["lon"].to_numpy(zero_copy_only=False)
+        lat = tabela["lat"].to_numpy(zero_copy_only=False)
+
+        if isinstance(geometria, shapely.Point):
+            distancia = haversine_m(geometria.x, geometria.y, lon, lat)
+        else:
+            # Polígono/linha: distância plana no CRS métrico, vetorizada sobre os candidatos
+            import geopandas as gpd
+            alvo = gpd.GeoSeries([geometria], crs="EPSG:4674").to_crs(CRS_METRICO).iloc[0]
+            pontos = gpd.GeoSeries(shapely.points(lon, lat), crs="EPSG:4674").to_crs(CRS_METRICO)
+            distancia = shapely.distance(alvo, np.asarray(pontos.values))
+
+        dentro = distancia <= raio_m
+        df = tabela.filter(pa.array(dentro)).to_pandas()
+        df["distancia_m"] = distancia[dentro]
+        return df.sort_values("data_hora", kind="stable").reset_index(drop=True)
+
+
+# --- 3. Benchmark ---
+
+def bench(n=200):
+    if not os.path.isdir(DIR_INDICE):
+        inicio = time.perf_counter()
+        linhas, _ = build_index()
+        print(f"Índice gerado: {linhas} focos em {time.perf_counter() - inicio:.2f}s ({DIR_INDICE})")
+
+    indice = FocosIndex()
+    completo = pd.read_parquet(local_path(URL_FOCOS_PARQUET), columns=["lat", "lon", "data_hora_gmt"])
+    rng = np.random.default_rng(42)
+    amostra = completo.sample(n, random_state=42)
+    consultas = [
+        (shapely.Point(lon + rng.normal(0, 0.02), lat + rng.normal(0, 0.02)), "2025-08-01", "2025-08-31")
+        for lon, lat in zip(amostra["lon"], amostra["lat"])
+    ]
+
+    inicio = time.perf_counter()
+    total = sum(len(indice.near(p, 5000, a, b, columns=["id", "data_hora"])) for p, a, b in consultas)
+    tempo = (time.perf_counter() - inicio) / n
+    print(f"Índice: {tempo * 1000:.1f} ms por consulta (5 km, 1 mês), {total} focos no total")
+
+    inicio = time.perf_counter()
+    for p, a, b in consultas[:20]:
+        df = pd.read_parquet(local_path(URL_FOCOS_PARQUET))
+        datas = pd.to_datetime(df["data_hora_gmt"], format=FORMATO_DATA)
+        df = df[(datas >= a) & (datas < pd.Timestamp(b) + pd.Timedelta(days=1))]
+        df[haversine_m(p.x, p.y, df["lon"].to_numpy(), df["lat"].to_numpy()) <= 5000]
+    tempo = (time.perf_counter() - inicio) / 20
+    print(f"Leitura completa (pd.read_parquet): {tempo * 1000:.1f} ms por consulta")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice particionado dos focos de calor.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    gerar = sub.add_parser("build", help="Gera o índice a partir de focos_historico.parquet")
+    gerar.add_argument("--forcar", action="store_true")
+    gerar.add_argument("--destino", default=DIR_INDICE)
+    medir = sub.add_parser("bench", help="Compara o índice com a leitura completa")
+    medir.add_argument("n", nargs="?", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.comando == "build":
+        linhas, descartadas = build_index(diretorio=args.destino, forcar=args.forcar)
+        print(f"✅ {linhas} focos indexados em {args.destino}")
+        if descartadas:
+            print(f"⚠️ {descartadas} focos descartados: data_hora_gmt fora do formato {FORMATO_DATA}")
+    else:
+        bench(args.n)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
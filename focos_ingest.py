@@ -0,0 +1,368 @@
+# focos_ingest.py
+# Atualização incremental do índice de focos (focos_index.py) a partir do WFS do INPE.
+#
+# Em vez de refazer focos_historico.parquet a cada dia:
+#   1. a marca d'água (maior data_hora já gravada) fica em <dir>/_ingestao.json
+#   2. o WFS é consultado só a partir da marca (CQL_FILTER em data_hora_gmt),
+#      com uma janela de atraso para focos publicados depois do horário da passagem
+#   3. os focos novos (id ainda não visto) viram arquivos novos em cada mês:
+#      mes=AAAA-MM/parte-<execução>.parquet; arquivos existentes nunca são alterados
+#   4. em segundo plano, os arquivos pequenos de um mês são juntados num só
+#      (os focos não mudam, só o número de arquivos)
+#
+# Uso: python focos_ingest.py [--url URL] [--filtro "estado='MATO GROSSO DO SUL'"] [--compactar]
+#      python focos_ingest.py demo   (WFS local, sem rede)
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from config_bases import LAYER_FOCOS_WFS, URL_FOCOS_WFS
+from focos_index import (ARQUIVO_MANIFESTO, COMPRESSAO, DIR_INDICE, LINHAS_POR_ROW_GROUP, FocosIndex, prepare_table,
+                         write_partitions)
+from http_async import sync_session
+from wfs_client import fetch_page
+
+FILTRO_PADRAO = "estado='MATO GROSSO DO SUL'"  # mesmo recorte do focos_historico.parquet
+JANELA_ATRASO = pd.Timedelta(hours=6)
+TAMANHO_PAGINA = 1000
+
+ARQUIVO_ESTADO = "_ingestao.json"  # prefixo "_": ignorado pelo pyarrow.dataset
+ARQUIVO_TRAVA = "_compactando.lock"  # travado com flock: arquivo esquecido por uma queda não bloqueia
+MIN_ARQUIVOS_COMPACTAR = 8
+MAX_LINHAS_PEQUENO = 50_000
+
+
+# --- 1. Estado (marca d'água) ---
+
+def load_state(diretorio=DIR_INDICE):
+    """Estado da ingestão; sem arquivo, a marca é a maior data_hora do índice."""
+    caminho = os.path.join(diretorio, ARQUIVO_ESTADO)
+    if not os.path.isdir(diretorio):
+        raise FileNotFoundError(f"Índice de focos não encontrado em {diretorio}; gere com 'python focos_index.py build'.")
+    if os.path.exists(caminho):
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    indice = FocosIndex(diretorio)
+    maior = pc.max(indice.dataset.to_table(columns=["data_hora"])["data_hora"]).as_py()
+    return {"marca_dagua": maior.isoformat() if maior else None, "execucoes": []}
+
+
+def _gravar_json(caminho, dados):
+    with open(caminho + ".part", "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    os.replace(caminho + ".part", caminho)
+
+
+def save_state(estado, diretorio=DIR_INDICE):
+    _gravar_json(os.path.join(diretorio, ARQUIVO_ESTADO), estado)
+
+
+# --- 2. Busca no WFS ---
+
+def _filtro_cql(desde, filtro=None):
+    condicoes = [f"data_hora_gmt >= '{desde.strftime('%Y-%m-%dT%H:%M:%SZ')}'"]
+    if filtro:
+        condicoes.append(f"({filtro})")
+    return " AND ".join(condicoes)
+
+
+def fetch_since(desde, url=URL_FOCOS_WFS, layer_name=LAYER_FOCOS_WFS, filtro=FILTRO_PADRAO,
+                page_size=TAMANHO_PAGINA, session=None, **kwargs):
+    """Focos do WFS com data_hora_gmt >= `desde`, como pyarrow.Table (com data_hora já convertida)."""
+    session = session or sync_session()
+    kwargs.setdefault("timeout", 120)
+    # id desempata: vários focos têm a mesma data_hora_gmt, e sem ordem total as páginas
+    # startIndex podem pular focos (que a marca d'água depois deixa para trás)
+    filtros = {"CQL_FILTER": _filtro_cql(desde, filtro), "sortBy": "data_hora_gmt,id"}
+    atributos, inicio = [], 0
+    while True:
+        pagina, _ = fetch_page(session, url, layer_name, inicio, page_size, filtros, **kwargs)
+        atributos += pagina
+        if len(pagina) < page_size:
+            break
+        inicio += page_size
+    if not atributos:
+        return None
+
+    df = pd.DataFrame(atributos)
+    # O WFS devolve ISO 8601 ("2025-09-10T03:20:00Z"); o histórico usa "9/10/2025 03:20"
+    df["data_hora"] = pd.to_datetime(df["data_hora_gmt"], format="ISO8601", utc=True).dt.tz_localize(None)
+    dh = df["data_hora"].dt
+    df["data_hora_gmt"] = dh.month.astype(str) + "/" + dh.day.astype(str) + "/" + dh.strftime("%Y %H:%M")
+    df["id"] = df["id"].astype(str)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _conformar(tabela, schema):
+    """Ajusta a tabela ao schema do índice: mesmas colunas, mesma ordem e tipos (faltantes viram nulo)."""
+    colunas = []
+    for campo in schema:
+        if campo.name in tabela.column_names:
+            colunas.append(tabela[campo.name].cast(campo.type))
+        else:
+            colunas.append(pa.nulls(tabela.num_rows, type=campo.type))
+    return pa.table(colunas, schema=schema)
+
+
+# --- 3. Ingestão ---
+
+def ingest(diretorio=DIR_INDICE, url=URL_FOCOS_WFS, layer_name=LAYER_FOCOS_WFS, filtro=FILTRO_PADRAO,
+           janela=JANELA_ATRASO, compactar=False, agora=None, **kwargs):
+    """
+    Acrescenta ao índice os focos publicados desde a última execução.
+
+    Retorna um resumo {novos, marca_dagua, arquivos, compactacao}; `compactacao` é
+    a thread de compactação em segundo plano (ou None). kwargs vão para requests.
+    """
+    estado = load_state(diretorio)
+    recover(diretorio)
+    marca = pd.Timestamp(estado["marca_dagua"]) if estado.get("marca_dagua") else None
+    desde = (marca - janela) if marca is not None else pd.Timestamp("1970-01-01")
+
+    novos = fetch_since(desde, url, layer_name, filtro, **kwargs)
+    arquivos = []
+    if novos is not None:
+        novos = prepare_table(novos)
+        # Focos da janela de atraso que já estão no índice são descartados
+        indice = FocosIndex(diretorio)
+        vistos = indice.candidates((-180, -90, 180, 90), desde, None, columns=["id"])["id"]
+        novos = novos.filter(pc.invert(pc.is_in(novos["id"], value_set=vistos)))
+        novos = _sem_repetidos(novos)
+
+    if novos is not None and novos.num_rows:
+        schema = FocosIndex(diretorio).dataset.schema
+        schema = pa.schema([c for c in schema if c.name != "mes"])
+        tabela = _conformar(novos, schema).append_column("mes", novos["mes"])
+        sufixo = (agora or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        arquivos = write_partitions(tabela, diretorio, sufixo)
+        maior = pc.max(tabela["data_hora"]).as_py()
+        if marca is None or maior > marca:
+            estado["marca_dagua"] = maior.isoformat()
+
+    estado.setdefault("execucoes", []).append({
+        "em": (agora or datetime.now(timezone.utc)).isoformat(timespec="seconds"),
+        "novos": novos.num_rows if novos is not None else 0,
+        "arquivos": [os.path.relpath(a, diretorio) for a in arquivos],
+    })
+    estado["execucoes"] = estado["execucoes"][-100:]
+    save_state(estado, diretorio)
+
+    return {
+        "novos": novos.num_rows if novos is not None else 0,
+        "marca_dagua": estado["marca_dagua"],
+        "arquivos": arquivos,
+        "compactacao": start_compaction(diretorio) if compactar and arquivos else None,
+    }
+
+
+def _sem_repetidos(tabela):
+    """Mantém a primeira ocorrência de cada id (páginas vizinhas podem repetir focos)."""
+    primeiras = pa.table({"id": tabela["id"], "i": pa.array(range(tabela.num_rows))}).group_by("id").aggregate([("i", "min")])
+    return tabela.take(pa.array(sorted(primeiras["i_min"].to_pylist()), type=pa.int64()))
+
+
+# --- 4. Compactação ---
+# Cada mês compactado passa por um manifesto (_compactacao.json na pasta do mês) com o
+# arquivo novo e as entradas. Se o processo cair entre publicar o arquivo novo e remover
+# as entradas, a próxima compactação termina a remoção (senão os focos ficariam em dobro);
+# se cair antes de publicar, descarta o arquivo temporário.
+
+def _retomar(pasta):
+    """Conclui ou desfaz uma compactação interrompida do mês (se houver manifesto)."""
+    manifesto = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    if not os.path.exists(manifesto):
+        return
+    with open(manifesto, encoding="utf-8") as f:
+        pendente = json.load(f)
+    destino = os.path.join(pasta, pendente["destino"])
+    # publicado: as entradas já estão no arquivo novo; senão, só o temporário sobra
+    restos = pendente["entradas"] if os.path.exists(destino) else [_temporario(pendente["destino"])]
+    for nome in restos:
+        try:
+            os.remove(os.path.join(pasta, nome))
+        except FileNotFoundError:
+            pass
+    os.remove(manifesto)
+
+
+def _temporario(nome):
+    return "_" + nome + ".part"  # prefixo "_": um leitor do dataset nunca vê o arquivo pela metade
+
+
+def compact_month(pasta, min_arquivos=MIN_ARQUIVOS_COMPACTAR, max_linhas=MAX_LINHAS_PEQUENO):
+    """
+    Junta os arquivos pequenos de ingestão de um mês num só. Retorna o caminho novo (ou None).
+
+    Só entram arquivos de ingestão (parte-<data>-*.parquet) com até `max_linhas`
+    linhas; o arquivo base e os já compactados ficam como estão. O arquivo novo é
+    publicado antes de os antigos serem removidos, então um leitor nunca vê focos faltando.
+    """
+    _retomar(pasta)
+    pequenos = [
+        c for c in sorted(glob.glob(os.path.join(pasta, "parte-[0-9]*.parquet")))
+        if pq.ParquetFile(c).metadata.num_rows <= max_linhas
+    ]
+    if len(pequenos) < min_arquivos:
+        return None
+    tabela = pa.concat_tables([pq.read_table(c) for c in pequenos], promote_options="default")
+    tabela = tabela.take(pc.sort_indices(tabela, [("celula", "ascending"), ("data_hora", "ascending")]))
+    nome = f"parte-compacta-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}.parquet"
+    destino, temp = os.path.join(pasta, nome), os.path.join(pasta, _temporario(nome))
+    manifesto = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    _gravar_json(manifesto, {"destino": nome, "entradas": [os.path.basename(c) for c in pequenos]})
+    pq.write_table(tabela, temp, compression=COMPRESSAO, row_group_size=LINHAS_POR_ROW_GROUP)
+    os.replace(temp, destino)
+    for c in pequenos:
+        os.remove(c)
+    os.remove(manifesto)
+    return destino
+
+
+@contextmanager
+def _trava_exclusiva(caminho):
+    """True se conseguiu a trava (sem esperar). O sistema solta a trava se o processo cair."""
+    with open(caminho, "a") as trava:
+        try:
+            import fcntl
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:  # Windows
+            import msvcrt
+            try:
+                msvcrt.locking(trava.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                yield False
+                return
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def recover(diretorio=DIR_INDICE):
+    """Conclui as compactações interrompidas, se nenhuma compactação estiver em andamento."""
+    with _trava_exclusiva(os.path.join(diretorio, ARQUIVO_TRAVA)) as travado:
+        if travado:
+            for pasta in sorted(glob.glob(os.path.join(diretorio, "mes=*"))):
+                _retomar(pasta)
+
+
+def compact(diretorio=DIR_INDICE, **kwargs):
+    """Compacta todos os meses. Só uma compactação por vez (arquivo de trava); retorna os arquivos novos."""
+    with _trava_exclusiva(os.path.join(diretorio, ARQUIVO_TRAVA)) as travado:
+        if not travado:
+            return []
+        novos = [compact_month(p, **kwargs) for p in sorted(glob.glob(os.path.join(diretorio, "mes=*")))]
+        return [n for n in novos if n]
+
+
+def start_compaction(diretorio=DIR_INDICE, **kwargs):
+    """Roda compact() numa thread (não daemon: o processo espera ela terminar antes de sair)."""
+    thread = threading.Thread(target=compact, args=(diretorio,), kwargs=kwargs, name="compactacao-focos")
+    thread.start()
+    return thread
+
+
+# --- 5. Demonstração ---
+# Ingestão contra um WFS local (wfs_client.FakeWFS): nada de rede.
+
+def _focos_sinteticos(primeiro, n, passo=pd.Timedelta(hours=3)):
+    inicio = pd.Timestamp("2025-01-20")
+    return [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [-54.5 + i % 50 * 0.01, -20.5 + i % 37 * 0.01]},
+        "properties": {
+            "id": f"foco-{i}", "lat": -20.5 + i % 37 * 0.01, "lon": -54.5 + i % 50 * 0.01,
+            "data_hora_gmt": (inicio + i // 4 * passo).strftime("%Y-%m-%dT%H:%M:%SZ"),  # 4 focos por passagem
+            "satelite": "AQUA_M-T", "estado": "MATO GROSSO DO SUL",
+        },
+    } for i in range(primeiro, primeiro + n)]
+
+
+def demo():
+    import tempfile
+    from unittest import mock
+
+    from wfs_client import FakeWFS
+
+    def contagem(diretorio):
+        ids = FocosIndex(diretorio).dataset.to_table(columns=["id"])["id"]
+        return len(ids), len(pc.unique(ids))
+
+    with tempfile.TemporaryDirectory() as diretorio, FakeWFS() as wfs:
+        # índice base com os 100 primeiros focos (o que focos_index.py build geraria)
+        historico = wfs.features = _focos_sinteticos(0, 100)
+        write_partitions(prepare_table(fetch_since(pd.Timestamp("1970-01-01"), wfs.url, "focos")), diretorio, "base")
+        wfs.requisicoes.clear()
+
+        opcoes = {"url": wfs.url, "layer_name": "focos", "filtro": FILTRO_PADRAO, "page_size": 7}
+        wfs.features = historico + _focos_sinteticos(100, 30)
+        resumo = ingest(diretorio, **opcoes)
+        print(f"1ª ingestão: {resumo['novos']} novos em {len(resumo['arquivos'])} arquivo(s), "
+              f"{len(wfs.requisicoes)} requisições; marca {resumo['marca_dagua']}")
+        assert resumo["novos"] == 30 and contagem(diretorio) == (130, 130)
+        assert ingest(diretorio, **opcoes)["novos"] == 0
+        print("2ª ingestão sem focos novos: 0 novos (janela de atraso não duplica)")
+
+        for lote in range(4):  # execuções pequenas, como a cada hora
+            wfs.features += _focos_sinteticos(130 + lote * 5, 5)
+            ingest(diretorio, **opcoes)
+        pastas = sorted(glob.glob(os.path.join(diretorio, "mes=*")))
+        print(f"{sum(len(glob.glob(os.path.join(p, 'parte-[0-9]*'))) for p in pastas)} arquivos de ingestão "
+              f"em {len(pastas)} mês(es); focos {contagem(diretorio)} (4 focos por horário, páginas de 7)")
+
+        # queda entre publicar o arquivo compactado e remover as entradas
+        with mock.patch("focos_ingest.os.remove", side_effect=OSError("queda simulada")):
+            try:
+                compact(diretorio, min_arquivos=2)
+            except OSError:
+                pass
+        def arquivos_de_ingestao():
+            return sum(len(glob.glob(os.path.join(p, "parte-[0-9]*"))) for p in pastas)
+
+        assert contagem(diretorio) == (150, 150)
+        print(f"depois da queda: {arquivos_de_ingestao()} entradas ainda no disco, mas o índice lê "
+              f"focos (total, distintos) = {contagem(diretorio)}")
+        ingest(diretorio, **opcoes)
+        assert contagem(diretorio) == (150, 150) and arquivos_de_ingestao() == 0
+        print(f"a ingestão seguinte conclui a compactação: {arquivos_de_ingestao()} entradas, focos {contagem(diretorio)}")
+
+        # a trava é do processo, não do arquivo: o arquivo que ficou não impede a próxima compactação,
+        # mas uma compactação em andamento impede outra
+        assert os.path.exists(os.path.join(diretorio, ARQUIVO_TRAVA))
+        with _trava_exclusiva(os.path.join(diretorio, ARQUIVO_TRAVA)) as travado:
+            assert travado and compact(diretorio, min_arquivos=1) == []
+        print("trava: arquivo esquecido não bloqueia; compactação em andamento bloqueia ✅")
+
+
+def main():
+    if sys.argv[1:2] == ["demo"]:
+        return demo()
+    parser = argparse.ArgumentParser(description="Acrescenta ao índice de focos os focos novos do WFS do INPE.")
+    parser.add_argument("--url", default=URL_FOCOS_WFS)
+    parser.add_argument("--layer", default=LAYER_FOCOS_WFS)
+    parser.add_argument("--filtro", default=FILTRO_PADRAO, help="CQL extra (vazio = Brasil inteiro)")
+    parser.add_argument("--dir", default=DIR_INDICE)
+    parser.add_argument("--compactar", action="store_true", help="Junta os arquivos pequenos em segundo plano")
+    args = parser.parse_args()
+
+    resumo = ingest(args.dir, args.url, args.layer, args.filtro or None, compactar=args.compactar)
+    print(f"✅ {resumo['novos']} focos novos em {len(resumo['arquivos'])} arquivo(s); marca d'água: {resumo['marca_dagua']}")
+    if resumo["compactacao"]:
+        resumo["compactacao"].join()
+        print("✅ Compactação concluída")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# geoparquet_writer.py
+# Gravação incremental de GeoParquet: cada lote de feições vira um row group,
+# então a memória fica limitada ao tamanho do lote e não ao tamanho da camada.
+
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from pyproj import CRS
+
+COMPRESSAO = "zstd"
+
+
+def geo_metadata(crs=None, coluna="geometry"):
+    """Metadados 'geo' (GeoParquet 1.0) para uma coluna WKB."""
+    info = {"encoding": "WKB", "geometry_types": []}
+    if crs is not None:
+        info["crs"] = CRS.from_user_input(crs).to_json_dict()
+    return {"version": "1.0.0", "primary_column": coluna, "columns": {coluna: info}}
+
+
+def _tipo_inferido(valores):
+    """Tipo arrow dos valores de uma coluna num lote (texto se o lote misturar tipos)."""
+    try:
+        return pa.array(valores, from_pandas=True).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string()
+
+
+def _promover(atual, novo):
+    """Tipo que comporta os dois: nulo dá lugar ao outro, inteiro com real vira real, o resto incompatível vira texto."""
+    try:
+        schemas = [pa.schema([pa.field("c", atual)]), pa.schema([pa.field("c", novo)])]
+        return pa.unify_schemas(schemas, promote_options="permissive").field("c").type
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string()
+
+
+def _coluna(valores, tipo):
+    try:
+        return pa.array(valores, type=tipo, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if not pa.types.is_string(tipo):
+            raise
+        # coluna promovida a texto: valores de outros tipos viram str
+        return pa.array([v if v is None or isinstance(v, str) else str(v) for v in valores], type=tipo, from_pandas=True)
+
+
+class GeoParquetStreamWriter:
+    """
+    Escreve lotes de (atributos, geometrias) num arquivo GeoParquet.
+
+    `schema` é o pyarrow.Schema dos atributos; se None, é inferido lote a lote:
+    um lote com tipo diferente (ex.: inteiro e depois real, ou coluna só com nulos
+    no início) promove a coluna e o que já foi gravado é regravado no tipo novo.
+    Colunas ausentes num lote viram nulo. O arquivo é gravado num .part e só
+    aparece no destino ao fechar.
+    """
+
+    def __init__(self, caminho, schema=None, crs=None):
+        self.caminho = caminho
+        self.schema_atributos = schema
+        self.crs = crs
+        self._inferido = schema is None
+        self._tipos = {}  # tipos inferidos até agora (nulo preservado)
+        self.linhas = 0
+        self._temp = caminho + ".part"
+        self._writer = None
+
+    def _abrir(self):
+        schema = self.schema_atributos.append(pa.field("geometry", pa.binary()))
+        schema = schema.with_metadata({"geo": json.dumps(geo_metadata(self.crs))})
+        self._writer = pq.ParquetWriter(self._temp, schema, compression=COMPRESSAO)
+        self._schema = schema
+
+    def write(self, atributos, geometrias):
+        """Grava um lote: `atributos` é uma lista de dicts e `geometrias` uma lista de geometrias shapely (ou None)."""
+        if not atributos:
+            return
+        if self._inferido:
+            self._inferir(atributos)
+        if self._writer is None:
+            self._abrir()
+        colunas = {f.name: _coluna([a.get(f.name) for a in atributos], f.type) for f in self.schema_atributos}
+        colunas["geometry"] = pa.array(shapely.to_wkb(list(geometrias)), type=pa.binary())
+        self._writer.write_table(pa.table(colunas, schema=self._schema))
+        self.linhas += len(atributos)
+
+    def _inferir(self, atributos):
+        """Atualiza o schema inferido com o lote; se ele mudar depois de aberto o arquivo, regrava o que já foi escrito."""
+        tipos = dict(self._tipos)
+        for nome in dict.fromkeys(k for a in atributos for k in a):
+            novo = _tipo_inferido([a.get(nome) for a in atributos])
+            tipos[nome] = _promover(tipos[nome], novo) if nome in tipos else novo
+        self._tipos = tipos
+        # Colunas só com nulos (até agora) ficam como texto
+        schema = pa.schema([pa.field(n, pa.string() if pa.types.is_null(t) else t) for n, t in tipos.items()])
+        if self._writer is not None and not schema.equals(self.schema_atributos):
+            self._regravar(schema)
+        self.schema_atributos = schema
+
+    def _regravar(self, schema_atributos):
+        """Regrava os row groups já escritos no schema promovido (só acontece quando um lote muda o tipo de uma coluna)."""
+        self._writer.close()
+        self._writer = None
+        anterior = self._temp + ".old"
+        os.replace(self._temp, anterior)
+        try:
+            self.schema_atributos = schema_atributos
+            self._abrir()
+            with pq.ParquetFile(anterior) as arquivo:
+                for i in range(arquivo.num_row_groups):
+                    grupo = arquivo.read_row_group(i)
+                    colunas = {
+                        f.name: grupo.column(f.name).cast(f.type) if f.name in grupo.column_names
+                        else pa.nulls(len(grupo), f.type)
+                        for f in self._schema
+                    }
+                    self._writer.write_table(pa.table(colunas, schema=self._schema))
+        finally:
+            os.remove(anterior)
+
+    def close(self):
+        """Finaliza o arquivo. Retorna o número de linhas gravadas."""
+        if self._writer is None:
+            # Camada vazia: ainda assim grava um arquivo válido (só com geometria)
+            self.schema_atributos = self.schema_atributos or pa.schema([])
+            self._abrir()
+        self._writer.close()
+        os.replace(self._temp, self.caminho)
+        return self.linhas
+
+    def abort(self):
+        """Descarta o arquivo parcial."""
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._temp):
+            os.remove(self._temp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
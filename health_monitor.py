@@ -0,0 +1,322 @@
+# health_monitor.py
+# Monitor de disponibilidade sem interface: sonda todas as URLs do registro de camadas
+# em intervalos fixos e guarda o histórico; base_check.py só lê esse histórico.
+#
+# - alvos: as URLs globais/de imagem de config_bases.py mais todas as camadas do
+#   registro (layer_registry.py), agrupadas pela categoria
+# - cada ciclo usa url_probe.check_urls (sondagem leve, concorrência limitada no
+#   total e por host, disjuntor por host de host_breaker.py)
+# - histórico em SQLite (health.sqlite no diretório do disk_cache, WAL: o painel
+#   lê enquanto o monitor grava): uma linha compacta por sondagem, alvos numa
+#   tabela à parte, retenção de RETENCAO_DIAS dias; o estado dos disjuntores do
+#   monitor é gravado ao fim de cada ciclo
+# - uma instância por máquina (trava com flock onde existir)
+#
+# Uso: python health_monitor.py [--intervalo 300] [--uma-vez] [--workers 16] [--por-host 4]
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+
+from disk_cache import CACHE_DIR
+
+CAMINHO_PADRAO = os.environ.get("BASES_HEALTH_DB", os.path.join(CACHE_DIR, "health.sqlite"))
+INTERVALO = 300        # segundos entre o início de dois ciclos
+RETENCAO_DIAS = 30
+DIA = 24 * 3600
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS alvos (
+        id INTEGER PRIMARY KEY,
+        grupo TEXT NOT NULL,
+        nome TEXT NOT NULL,
+        url TEXT NOT NULL,
+        layer_name TEXT,
+        UNIQUE (grupo, nome, url)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sondagens (
+        alvo INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        ok INTEGER NOT NULL,
+        codigo TEXT,
+        status TEXT NOT NULL,
+        bytes INTEGER NOT NULL,
+        latencia_ms INTEGER NOT NULL,
+        PRIMARY KEY (alvo, ts)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS sondagens_ts ON sondagens (ts)",
+    """
+    CREATE TABLE IF NOT EXISTS ciclos (
+        inicio REAL PRIMARY KEY,
+        duracao REAL NOT NULL,
+        alvos INTEGER NOT NULL,
+        falhas INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS disjuntores (
+        host TEXT PRIMARY KEY,
+        estado TEXT NOT NULL,
+        falhas_seguidas INTEGER NOT NULL,
+        p50_ms INTEGER,
+        p95_ms INTEGER,
+        timeout_s REAL,
+        reabre_em_s REAL,
+        atualizado_em REAL NOT NULL
+    )
+    """,
+)
+
+
+def is_ok(resultado):
+    """Sondagem bem-sucedida: resposta 2xx/3xx sem erro no corpo (mesmo critério do verificador)."""
+    return resultado["Status"].startswith(("🟢", "🟡"))
+
+
+def _percentil(valores, p):
+    # valores já ordenados; mesmo critério de host_breaker (vizinho mais próximo)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+# --- 1. Histórico em SQLite ---
+
+class HealthStore:
+    """Histórico das sondagens; o painel só lê, o monitor grava."""
+
+    def __init__(self, caminho=CAMINHO_PADRAO):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self.caminho = caminho
+        with self._conectar() as con:
+            for comando in _SCHEMA:
+                con.execute(comando)
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            yield con
+        finally:
+            con.close()
+
+    def _ids(self, con, itens):
+        chaves = [(i["Grupo"], i["Nome da Base"], i["URL"]) for i in itens]
+        con.executemany(
+            "INSERT OR IGNORE INTO alvos (grupo, nome, url, layer_name) VALUES (?, ?, ?, ?)",
+            [(*c, i.get("layer_name")) for c, i in zip(chaves, itens)],
+        )
+        ids = {(g, n, u): id_ for id_, g, n, u in con.execute("SELECT id, grupo, nome, url FROM alvos")}
+        return [ids[c] for c in chaves]
+
+    def append(self, itens, resultados, ts=None):
+        """Grava um ciclo: `itens` como em url_probe.check_urls e os resultados na mesma ordem."""
+        ts = int(ts or time.time())
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            ids = self._ids(con, itens)
+            con.executemany(
+                "INSERT OR REPLACE INTO sondagens VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(id_, ts, int(is_ok(r)), str(r["Cód."]), r["Status"], r["Bytes"], r["Latência (ms)"])
+                 for id_, r in zip(ids, resultados)],
+            )
+            con.execute("COMMIT")
+
+    def record_cycle(self, inicio, duracao, alvos, falhas):
+        with self._conectar() as con:
+            con.execute("INSERT OR REPLACE INTO ciclos VALUES (?, ?, ?, ?)", (inicio, duracao, alvos, falhas))
+
+    def save_breakers(self, estados, agora=None):
+        """Estado dos disjuntores do monitor (host_breaker.BreakerBoard.snapshot)."""
+        agora = agora or time.time()
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            con.execute("DELETE FROM disjuntores")
+            con.executemany(
+                "INSERT INTO disjuntores VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(e["host"], e["estado"], e["falhas_seguidas"], e["p50_ms"], e["p95_ms"], e["timeout_s"],
+                  e["reabre_em_s"], agora) for e in estados],
+            )
+            con.execute("COMMIT")
+
+    def prune(self, retencao_dias=RETENCAO_DIAS):
+        """Apaga sondagens e ciclos mais antigos que a retenção. Retorna quantas sondagens saíram."""
+        limite = time.time() - retencao_dias * DIA
+        with self._conectar() as con:
+            apagadas = con.execute("DELETE FROM sondagens WHERE ts < ?", (limite,)).rowcount
+            con.execute("DELETE FROM ciclos WHERE inicio < ?", (limite,))
+        return apagadas
+
+    # --- Leitura (painel) ---
+
+    def last_cycle(self):
+        """{"inicio", "duracao", "alvos", "falhas"} do último ciclo, ou None."""
+        with self._conectar() as con:
+            linha = con.execute("SELECT inicio, duracao, alvos, falhas FROM ciclos ORDER BY inicio DESC LIMIT 1").fetchone()
+        return dict(zip(("inicio", "duracao", "alvos", "falhas"), linha)) if linha else None
+
+    def summary(self, janela=DIA, agora=None):
+        """
+        Por alvo, nas últimas `janela` segundos: sondagens, disponibilidade (%),
+        p50/p95 da latência (só das sondagens OK) e a última sondagem.
+        """
+        desde = (agora or time.time()) - janela
+        with self._conectar() as con:
+            alvos = con.execute("SELECT id, grupo, nome, url FROM alvos ORDER BY id").fetchall()
+            linhas = con.execute(
+                "SELECT alvo, ts, ok, status, latencia_ms FROM sondagens WHERE ts >= ? ORDER BY alvo, ts", (desde,)
+            ).fetchall()
+        por_alvo = {}
+        for alvo, ts, ok, status, latencia in linhas:
+            por_alvo.setdefault(alvo, []).append((ts, ok, status, latencia))
+        resumo = []
+        for id_, grupo, nome, url in alvos:
+            sondagens = por_alvo.get(id_)
+            if not sondagens:
+                continue
+            latencias = sorted(l for _, ok, _, l in sondagens if ok)
+            ultima = sondagens[-1]
+            resumo.append({
+                "grupo": grupo,
+                "nome": nome,
+                "url": url,
+                "sondagens": len(sondagens),
+                "uptime": 100 * sum(ok for _, ok, _, _ in sondagens) / len(sondagens),
+                "p50_ms": _percentil(latencias, 50) if latencias else None,
+                "p95_ms": _percentil(latencias, 95) if latencias else None,
+                "ultimo_status": ultima[2],
+                "ultima_em": ultima[0],
+            })
+        return resumo
+
+    def series(self, nome, janela=DIA, agora=None):
+        """[(ts, ok, latencia_ms)] de um alvo (pelo nome) nas últimas `janela` segundos."""
+        desde = (agora or time.time()) - janela
+        with self._conectar() as con:
+            return con.execute(
+                "SELECT s.ts, s.ok, s.latencia_ms FROM sondagens s JOIN alvos a ON a.id = s.alvo "
+                "WHERE a.nome = ? AND s.ts >= ? ORDER BY s.ts", (nome, desde)
+            ).fetchall()
+
+    def breakers(self):
+        with self._conectar() as con:
+            con.row_factory = sqlite3.Row
+            return [dict(l) for l in con.execute("SELECT * FROM disjuntores ORDER BY host")]
+
+
+# --- 2. Alvos ---
+
+def targets():
+    """Itens {"Grupo", "Nome da Base", "URL", "layer_name"} de tudo o que é monitorado."""
+    from config_bases import (
+        URL_FOCOS_PARQUET, URL_HIDRO_OFFLINE, URL_AUTEX_IBAMA, URL_PARQUET_CONVERTED,
+        URL_LANDSAT_2008_EXPORT, URL_SENTINEL_2025_EXPORT, URL_DECLIVIDADE_EXPORT, URL_HIDRO_EXPORT,
+    )
+    from layer_registry import get_registry
+
+    globais = "URLs Globais (Estáticas/GitHub)"
+    imagens = "Serviços de Imagem (ArcGIS Export)"
+    itens = [
+        {"Grupo": globais, "Nome da Base": "Focos Históricos (PARQUET)", "URL": URL_FOCOS_PARQUET},
+        {"Grupo": globais, "Nome da Base": "Hidrografia MS (ZIP)", "URL": URL_HIDRO_OFFLINE},
+        {"Grupo": globais, "Nome da Base": "Autex IBAMA (GEOJSON)", "URL": URL_AUTEX_IBAMA},
+        {"Grupo": globais, "Nome da Base": "Dados Convertidos (PARQUET)", "URL": URL_PARQUET_CONVERTED},
+        {"Grupo": imagens, "Nome da Base": "Landsat 2008 Export", "URL": URL_LANDSAT_2008_EXPORT},
+        {"Grupo": imagens, "Nome da Base": "Sentinel 2025 Export", "URL": URL_SENTINEL_2025_EXPORT},
+        {"Grupo": imagens, "Nome da Base": "Declividade Export", "URL": URL_DECLIVIDADE_EXPORT},
+        {"Grupo": imagens, "Nome da Base": "Hidrografia MapServer Export", "URL": URL_HIDRO_EXPORT},
+    ]
+    # Camadas do registro; as WFS levam o typeName para a sondagem via GetCapabilities
+    for camada in get_registry():
+        itens.append({
+            "Grupo": camada.categoria,
+            "Nome da Base": camada.nome,
+            "URL": camada.url,
+            "layer_name": camada.layer_id if camada.fonte == "WFS" else None,
+        })
+    return itens
+
+
+# --- 3. Ciclos ---
+
+def run_once(store, itens=None, **kwargs):
+    """Sonda todos os alvos uma vez e grava. kwargs vão para url_probe.check_urls (max_workers, max_por_host, timeout)."""
+    from host_breaker import get_board
+    from url_probe import TIMEOUT, check_urls
+
+    itens = targets() if itens is None else itens
+    inicio = time.time()
+    resultados = check_urls(itens, **kwargs)
+    duracao = time.time() - inicio
+    falhas = sum(not is_ok(r) for r in resultados)
+    store.append(itens, resultados, ts=inicio)
+    store.record_cycle(inicio, duracao, len(itens), falhas)
+    store.save_breakers(get_board().snapshot(kwargs.get("timeout", TIMEOUT)))
+    return {"alvos": len(itens), "falhas": falhas, "duracao": duracao}
+
+
+@contextmanager
+def _instancia_unica(caminho):
+    try:
+        import fcntl
+    except ImportError:  # Windows: sem trava
+        yield
+        return
+    with open(caminho + ".lock", "w") as trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SystemExit(f"Outro monitor já está rodando ({caminho}.lock).")
+        yield
+
+
+def run(store, intervalo=INTERVALO, retencao_dias=RETENCAO_DIAS, ciclos=None, **kwargs):
+    """Ciclos a cada `intervalo` segundos (o próximo começa no horário, não depois do anterior terminar)."""
+    with _instancia_unica(store.caminho):
+        proximo = time.monotonic()
+        n = 0
+        while ciclos is None or n < ciclos:
+            n += 1
+            agora = time.strftime('%Y-%m-%d %H:%M:%S')
+            # um ciclo com erro (ex.: "database is locked" depois dos 30 s de espera) não derruba o monitor
+            try:
+                resumo = run_once(store, **kwargs)
+                if n % 12 == 1:
+                    store.prune(retencao_dias)
+                print(f"{agora} {resumo['alvos']} alvos, {resumo['falhas']} com falha, {resumo['duracao']:.1f} s", flush=True)
+            except Exception as e:
+                print(f"{agora} ciclo com erro: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+            if ciclos is not None and n >= ciclos:
+                break
+            # pequeno jitter: vários monitores (máquinas diferentes) não batem juntos no mesmo host
+            proximo += intervalo
+            time.sleep(max(0.0, proximo - time.monotonic()) + random.uniform(0, min(5.0, intervalo / 20)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor periódico das URLs das bases (histórico para o base_check.py).")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO, help="segundos entre ciclos")
+    parser.add_argument("--uma-vez", action="store_true", help="faz um ciclo só e sai")
+    parser.add_argument("--workers", type=int, default=16, help="sondagens simultâneas no total")
+    parser.add_argument("--por-host", type=int, default=4, help="sondagens simultâneas por host")
+    parser.add_argument("--retencao", type=int, default=RETENCAO_DIAS, help="dias de histórico mantidos")
+    parser.add_argument("--db", default=CAMINHO_PADRAO)
+    args = parser.parse_args()
+
+    store = HealthStore(args.db)
+    opcoes = {"max_workers": args.workers, "max_por_host": args.por_host}
+    try:
+        run(store, args.intervalo, args.retencao, ciclos=1 if args.uma_vez else None, **opcoes)
+    except KeyboardInterrupt:
+        print("Monitor encerrado.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+# host_breaker.py
+# Disjuntor (circuit breaker) e timeout adaptativo por host, compartilhados pelo processo.
+#
+# Quando o pinms.ms.gov.br fica lento, cada camada dele esperava o timeout fixo
+# inteiro (10 s no verificador, 15/30/60 s no wizard), uma depois da outra. Aqui,
+# para cada host:
+#   - as latências das últimas respostas ficam numa janela (JANELA) e o timeout
+#     passa a ser FATOR x o percentil PERCENTIL delas, entre TIMEOUT_MIN e o
+#     timeout pedido por quem chamou (que vira só o teto); há uma janela por
+#     classe de endpoint (endpoint_class): um /query de 3 s não é cortado pela
+#     latência dos ?f=json de 50 ms do mesmo host
+#   - LIMIAR_FALHAS falhas seguidas (erro de conexão, timeout, 429 ou 5xx) abrem
+#     o disjuntor: as chamadas seguintes falham na hora (CircuitOpen) e quem tem
+#     cópia antiga (disk_cache, http_async) devolve a cópia
+#   - depois de ESPERA_ABERTO segundos uma única chamada de teste passa
+#     (meio-aberto): sucesso fecha o disjuntor, falha reabre com espera dobrada
+#     (até ESPERA_MAXIMA)
+# Respostas 4xx contam como sucesso: o host respondeu.
+#
+# Demonstração com servidor local que injeta latência e erros:
+#   python host_breaker.py demo
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+JANELA = 50
+MIN_AMOSTRAS = 5
+PERCENTIL = 95
+FATOR = 3.0
+TIMEOUT_MIN = 2.0
+LIMIAR_FALHAS = 3
+ESPERA_ABERTO = 30.0
+ESPERA_MAXIMA = 300.0
+STATUS_FALHA = {429, 500, 502, 503, 504}
+SUFIXOS_CONSULTA = ("/query", "/export", "/exportimage", "/identify", "/find")
+LEVE, CONSULTA = "leve", "consulta"
+
+FECHADO, ABERTO, MEIO_ABERTO = "fechado", "aberto", "meio-aberto"
+
+
+class CircuitOpen(IOError):
+    """O disjuntor do host está aberto: a requisição nem foi feita."""
+
+    def __init__(self, host, reabre_em):
+        super().__init__(f"{host}: disjuntor aberto (nova tentativa em {reabre_em:.0f} s)")
+        self.host = host
+        self.reabre_em = reabre_em
+
+
+def endpoint_class(url):
+    """CONSULTA para endpoints que processam dados (/query, /export...), LEVE para metadados, sondagens e arquivos."""
+    caminho = urlsplit(url).path.lower().rstrip("/")
+    return CONSULTA if caminho.endswith(SUFIXOS_CONSULTA) else LEVE
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+# --- 1. Disjuntor de um host ---
+
+class HostBreaker:
+    """Estado de um host: janelas de latência (uma por classe de endpoint), falhas seguidas e disjuntor."""
+
+    def __init__(self, host, janela=JANELA, limiar_falhas=LIMIAR_FALHAS, espera=ESPERA_ABERTO,
+                 timeout_min=TIMEOUT_MIN, relogio=time.monotonic):
+        self.host = host
+        self.limiar_falhas = limiar_falhas
+        self.espera_inicial = espera
+        self.timeout_min = timeout_min
+        self.relogio = relogio
+        self.janela = janela
+        self.latencias = {}  # classe de endpoint -> deque
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.espera = espera
+        self.aberto_em = None
+        self.teste_em_andamento = False
+        self.total_ok = 0
+        self.total_falhas = 0
+        self.rejeitadas = 0
+        self._lock = threading.Lock()
+
+    def timeout(self, teto, classe=LEVE):
+        """Timeout para a próxima requisição: FATOR x p95 das latências recentes da classe, limitado a [timeout_min, teto]."""
+        with self._lock:
+            latencias = self.latencias.get(classe, ())
+            if len(latencias) < MIN_AMOSTRAS:
+                return teto
+            return min(teto, max(self.timeout_min, FATOR * _percentil(latencias, PERCENTIL)))
+
+    def before(self):
+        """Libera a requisição ou levanta CircuitOpen (no meio-aberto, só uma requisição de teste passa)."""
+        with self._lock:
+            if self.estado == FECHADO:
+                return
+            restante = self.aberto_em + self.espera - self.relogio()
+            if self.estado == ABERTO and restante <= 0:
+                self.estado = MEIO_ABERTO
+            if self.estado == MEIO_ABERTO and not self.teste_em_andamento:
+                self.teste_em_andamento = True
+                return
+            self.rejeitadas += 1
+        raise CircuitOpen(self.host, max(restante, 0))
+
+    def success(self, latencia, classe=LEVE):
+        with self._lock:
+            self.latencias.setdefault(classe, deque(maxlen=self.janela)).append(latencia)
+            self.total_ok += 1
+            self.falhas_seguidas = 0
+            self.teste_em_andamento = False
+            if self.estado != FECHADO:
+                self.estado, self.espera, self.aberto_em = FECHADO, self.espera_inicial, None
+
+    def failure(self):
+        with self._lock:
+            self.total_falhas += 1
+            self.falhas_seguidas += 1
+            if self.estado == MEIO_ABERTO:
+                # o teste falhou: reabre e espera mais da próxima vez
+                self.espera = min(self.espera * 2, ESPERA_MAXIMA)
+                self.estado, self.aberto_em = ABERTO, self.relogio()
+            elif self.estado == FECHADO and self.falhas_seguidas >= self.limiar_falhas:
+                self.estado, self.aberto_em = ABERTO, self.relogio()
+            self.teste_em_andamento = False
+
+    def release(self):
+        """A requisição liberada por before() desistiu sem resultado (ex.: cancelada): não conta nada, só libera o teste."""
+        with self._lock:
+            self.teste_em_andamento = False
+
+    def record(self, status, latencia, classe=LEVE):
+        """Registra o resultado pelo código HTTP (429/5xx são falha; o resto, inclusive 4xx, é sucesso)."""
+        if status in STATUS_FALHA:
+            self.failure()
+        else:
+            self.success(latencia, classe)
+
+    def snapshot(self, teto=None):
+        """Estado para exibição; com `teto`, inclui o timeout que a próxima requisição usaria."""
+        timeout = self.timeout(teto) if teto else None
+        with self._lock:
+            latencias = [l for janela in self.latencias.values() for l in janela]
+            reabre = self.aberto_em + self.espera - self.relogio() if self.estado == ABERTO else None
+            return {
+                "host": self.host,
+                "estado": self.estado,
+                "falhas_seguidas": self.falhas_seguidas,
+                "ok": self.total_ok,
+                "falhas": self.total_falhas,
+                "rejeitadas": self.rejeitadas,
+                "p50_ms": round(_percentil(latencias, 50) * 1000) if latencias else None,
+                "p95_ms": round(_percentil(latencias, 95) * 1000) if latencias else None,
+                "timeout_s": round(timeout, 1) if timeout else None,
+                "reabre_em_s": round(max(reabre, 0), 1) if reabre is not None else None,
+            }
+
+
+# --- 2. Painel de disjuntores do processo ---
+
+def host_of(url):
+    return (urlsplit(url).hostname or url).lower()
+
+
+class BreakerBoard:
+    """Um HostBreaker por host, criado sob demanda (seguro entre threads)."""
+
+    def __init__(self, **parametros):
+        self.parametros = parametros
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url):
+        host = host_of(url)
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = HostBreaker(host, **self.parametros)
+            return self._hosts[host]
+
+    def timeout(self, url, teto):
+        return self.breaker(url).timeout(teto, endpoint_class(url))
+
+    @contextmanager
+    def guard(self, url, teto):
+        """
+        Envolve uma requisição síncrona: `with board.guard(url, 10) as g: r = get(..., timeout=g.timeout)`.
+
+        Levanta CircuitOpen antes de começar se o disjuntor estiver aberto. Exceções
+        dentro do bloco contam como falha; sem exceção, chame g.done(status).
+        """
+        disjuntor, classe = self.breaker(url), endpoint_class(url)
+        disjuntor.before()
+        chamada = _Chamada(disjuntor, disjuntor.timeout(teto, classe), classe)
+        try:
+            yield chamada
+        except BaseException:
+            if not chamada.registrada:
+                disjuntor.failure()
+            raise
+        if not chamada.registrada:
+            chamada.done(None)
+
+    def snapshot(self, teto=None):
+        """Estado de todos os hosts, em ordem alfabética."""
+        with self._lock:
+            disjuntores = sorted(self._hosts.values(), key=lambda d: d.host)
+        return [d.snapshot(teto) for d in disjuntores]
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+class _Chamada:
+    def __init__(self, disjuntor, timeout, classe=LEVE):
+        self.disjuntor = disjuntor
+        self.timeout = timeout
+        self.classe = classe
+        self.inicio = time.perf_counter()
+        self.registrada = False
+
+    def done(self, status):
+        self.registrada = True
+        self.disjuntor.record(status, time.perf_counter() - self.inicio, self.classe)
+
+
+_board = None
+_board_lock = threading.Lock()
+
+
+def get_board():
+    """Painel único do processo (url_probe, http_async, disk_cache e base_readers usam o mesmo)."""
+    global _board
+    with _board_lock:
+        if _board is None:
+            _board = BreakerBoard()
+    return _board
+
+
+# --- 3. Servidor de teste ---
+# Servidor HTTP local cujas respostas têm latência e erros configuráveis (mudáveis
+# com o servidor rodando), para exercitar o disjuntor sem depender dos serviços reais.
+
+class StubServer:
+    """`with StubServer(latencia=0.05) as stub: ... stub.url ...`; altere stub.latencia / stub.status durante o uso."""
+
+    def __init__(self, latencia=0.0, status=200, corpo=b'{"ok": true}'):
+        self.latencia = latencia
+        self.status = status
+        self.corpo = corpo
+        self.requisicoes = 0
+
+    def responder(self, caminho):
+        """(status, Content-Type, corpo) do GET em `caminho`; subclasses simulam serviços específicos."""
+        self.requisicoes += 1
+        return self.status, "application/json", self.corpo
+
+    def __enter__(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(stub.latencia)
+                status, tipo, corpo = stub.responder(self.path)
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", tipo)
+                    self.send_header("Content-Length", str(len(corpo)))
+                    self.end_headers()
+                    self.wfile.write(corpo)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # o cliente desistiu (timeout)
+
+            do_HEAD = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._servidor.server_address[1]}"
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+# --- 4. Demonstração ---
+# Um host com 12 camadas fica lento (latência acima do timeout) e depois se recupera.
+# Compara timeout fixo (como antes) com timeout adaptativo + disjuntor.
+
+def _sondar(session, url, teto, board=None):
+    import requests
+    inicio = time.perf_counter()
+    try:
+        if board is None:
+            r = session.get(url, timeout=teto)
+            return r.status_code, time.perf_counter() - inicio
+        with board.guard(url, teto) as chamada:
+            r = session.get(url, timeout=chamada.timeout)
+            chamada.done(r.status_code)
+        return r.status_code, time.perf_counter() - inicio
+    except CircuitOpen:
+        return "aberto", time.perf_counter() - inicio
+    except requests.exceptions.RequestException:
+        return "timeout", time.perf_counter() - inicio
+
+
+def demo(camadas=12, teto=2.0):
+    import requests
+
+    session = requests.Session()
+    with StubServer(latencia=0.05) as stub:
+        for variante, board in (("timeout fixo", None), ("adaptativo + disjuntor", BreakerBoard(espera=2.0, timeout_min=0.5))):
+            stub.latencia = 0.05
+            for i in range(10):  # aquecimento: latência normal
+                _sondar(session, f"{stub.url}/camada/{i}", teto, board)
+            stub.latencia = teto + 1  # host degradado
+            inicio = time.perf_counter()
+            resultados = [_sondar(session, f"{stub.url}/camada/{i}", teto, board)[0] for i in range(camadas)]
+            degradado = time.perf_counter() - inicio
+            print(f"{variante:24s} host degradado: {camadas} camadas em {degradado:5.1f} s "
+                  f"({resultados.count('timeout')} timeouts, {resultados.count('aberto')} rejeitadas na hora)")
+            if board is not None:
+                print(f"{'':24s} {board.snapshot()[0]}")
+                stub.latencia = 0.05  # recuperação: depois da espera, a chamada de teste fecha o disjuntor
+                time.sleep(2.1)
+                print(f"{'':24s} recuperado: {_sondar(session, f'{stub.url}/camada/0', teto, board)[0]} -> "
+                      f"estado {board.snapshot()[0]['estado']}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:2] == ["demo"]:
+        demo()
+    else:
+        print("Uso: python host_breaker.py demo")
@@ -0,0 +1,334 @@
+# http_async.py
+# Configuração HTTP única dos apps e cliente assíncrono para lotes de requisições pequenas.
+#
+# Quem usa o cliente assíncrono (get/get_many): amostras REST/WFS do
+# config_wizard.py e os tiles de raster_tiles.py. Os caminhos síncronos que
+# baixam em streaming ou paginam (disk_cache, base_readers, url_probe e os
+# extratores) continuam com requests, mas com a sessão de sync_session() /
+# shared_session(): mesmos cabeçalhos, mesma verificação TLS e o mesmo
+# disjuntor por host; o limite por domínio vem de domain_limit().
+#
+# - um único event loop asyncio numa thread de fundo, com uma ClientSession
+#   aiohttp (conexões keep-alive reaproveitadas, pool por host)
+# - limite de requisições simultâneas por domínio (pinms.ms.gov.br derruba
+#   rajadas), configurado em LIMITES_POR_DOMINIO
+# - nova tentativa com espera exponencial + jitter em 429/502/503/504 e
+#   falhas de conexão, respeitando Retry-After
+# - coalescência: GETs idênticos em andamento (ex.: duas sessões do Streamlit
+#   abrindo a mesma camada) compartilham uma única requisição
+# - timeout adaptativo e disjuntor por host (host_breaker.py): com o host fora
+#   do ar, a requisição falha na hora e, se houver, a última resposta boa do
+#   mesmo GET é devolvida marcada como obsoleta (só respostas pequenas e
+#   não imagem são guardadas para isso)
+# Os apps continuam síncronos: get()/get_many() bloqueiam até a resposta.
+#
+# Requer aiohttp (importado só na primeira requisição); HEADERS e os limites
+# por domínio podem ser usados sem ele (url_probe.py usa os mesmos valores).
+
+import asyncio
+import atexit
+import json
+import random
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from urllib.parse import urlsplit
+
+from host_breaker import STATUS_FALHA, CircuitOpen, endpoint_class, get_board
+
+# Cabeçalho de navegador real (evita 403/503 no GitHub e em alguns GeoServers)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+VERIFICAR_SSL = False  # vários servidores públicos têm cadeia de certificados incompleta
+
+LIMITE_PADRAO = 6
+LIMITES_POR_DOMINIO = {
+    "pinms.ms.gov.br": 2,
+    "geoservicos.inde.gov.br": 4,
+    "github.com": 8,
+    "raw.githubusercontent.com": 8,
+}
+TENTATIVAS = 4
+TIMEOUT = 30
+STATUS_REPETIR = {429, 502, 503, 504}
+ESPERA_MAXIMA = 30  # segundos, teto para Retry-After / backoff
+MAX_OBSOLETAS = 256  # últimas respostas boas de GET guardadas para servir com o disjuntor aberto
+MAX_BYTES_OBSOLETAS = 16 * 1024 * 1024  # teto da soma dos corpos guardados
+MAX_BYTES_OBSOLETA = 256 * 1024  # corpos maiores (e imagens, ex.: tiles) não são guardados
+
+
+def domain_limit(url_ou_host, padrao=LIMITE_PADRAO):
+    """Limite de requisições simultâneas para o host (casa também subdomínios: www.pinms.ms.gov.br)."""
+    host = urlsplit(url_ou_host).hostname if "//" in url_ou_host else url_ou_host
+    host = (host or "").lower()
+    for dominio, limite in LIMITES_POR_DOMINIO.items():
+        if host == dominio or host.endswith("." + dominio):
+            return limite
+    return padrao
+
+
+def sync_session(max_por_host=LIMITE_PADRAO):
+    """
+    requests.Session com as configurações do cliente assíncrono (HEADERS, VERIFICAR_SSL).
+
+    pool_maxsize = max_por_host para que as conexões abertas sejam reaproveitadas (keep-alive).
+    """
+    import requests
+    import urllib3
+    from requests.adapters import HTTPAdapter
+
+    if not VERIFICAR_SSL:
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    sessao = requests.Session()
+    sessao.headers.update(HEADERS)
+    sessao.verify = VERIFICAR_SSL
+    adaptador = HTTPAdapter(pool_connections=32, pool_maxsize=max_por_host)
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+_sessao_sync = None
+_sessao_sync_lock = threading.Lock()
+
+
+def shared_session():
+    """Sessão síncrona única do processo (sync_session), padrão de disk_cache e base_readers."""
+    global _sessao_sync
+    with _sessao_sync_lock:
+        if _sessao_sync is None:
+            _sessao_sync = sync_session()
+    return _sessao_sync
+
+
+def _chave_dominio(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return next((d for d in LIMITES_POR_DOMINIO if host == d or host.endswith("." + d)), host)
+
+
+@dataclass(frozen=True)
+class Resposta:
+    """
+    Resposta já lida (o corpo inteiro, ou até `limite_bytes`); nomes de cabeçalho em minúsculas.
+
+    `obsoleta` indica uma cópia da última resposta boa, devolvida porque o host falhou.
+    """
+    url: str
+    status: int
+    headers: dict = field(repr=False)
+    corpo: bytes = field(repr=False)
+    obsoleta: bool = False
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 400
+
+    def text(self, encoding="utf-8"):
+        return self.corpo.decode(encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.corpo)
+
+
+def _espera(tentativa, retry_after=None):
+    if retry_after:
+        try:
+            return min(float(retry_after), ESPERA_MAXIMA)
+        except ValueError:
+            pass
+    return min((2 ** tentativa) * (0.5 + random.random()), ESPERA_MAXIMA)
+
+
+def _normalizar_params(params):
+    # aiohttp só aceita str/int/float nos parâmetros
+    if not params:
+        return None
+    return {k: (str(v).lower() if isinstance(v, bool) else v if isinstance(v, (str, int, float)) else str(v))
+            for k, v in params.items()}
+
+
+class AsyncFetcher:
+    """Cliente aiohttp com limites por domínio, novas tentativas e coalescência de GETs."""
+
+    def __init__(self, headers=HEADERS, verificar_ssl=VERIFICAR_SSL, limite_padrao=LIMITE_PADRAO, tentativas=TENTATIVAS):
+        self.headers = dict(headers)
+        self.verificar_ssl = verificar_ssl
+        self.limite_padrao = limite_padrao
+        self.tentativas = tentativas
+        self._sessao = None
+        self._semaforos = {}
+        self._em_andamento = {}
+        self._ultimas = OrderedDict()
+        self._bytes_ultimas = 0
+
+    async def _obter_sessao(self):
+        if self._sessao is None or self._sessao.closed:
+            import aiohttp  # opcional: só quem faz requisições precisa dele
+            contexto = ssl.create_default_context() if self.verificar_ssl else False
+            conector = aiohttp.TCPConnector(
+                limit=100, limit_per_host=self.limite_padrao, ssl=contexto,
+                keepalive_timeout=60, ttl_dns_cache=300,
+            )
+            self._sessao = aiohttp.ClientSession(connector=conector, headers=self.headers)
+        return self._sessao
+
+    def _semaforo(self, url):
+        chave = _chave_dominio(url)
+        if chave not in self._semaforos:
+            self._semaforos[chave] = asyncio.Semaphore(domain_limit(url, self.limite_padrao))
+        return self._semaforos[chave]
+
+    async def _executar(self, metodo, url, params, data, limite_bytes, timeout):
+        import aiohttp
+        sessao = await self._obter_sessao()
+        disjuntor, classe = get_board().breaker(url), endpoint_class(url)
+        for tentativa in range(self.tentativas):
+            ultima = tentativa == self.tentativas - 1
+            try:
+                async with self._semaforo(url):
+                    disjuntor.before()  # CircuitOpen interrompe as novas tentativas
+                    try:
+                        tempo = aiohttp.ClientTimeout(total=disjuntor.timeout(timeout, classe))
+                        inicio = time.perf_counter()
+                        async with sessao.request(metodo, url, params=params, data=data, timeout=tempo) as r:
+                            corpo = await (r.content.read(limite_bytes) if limite_bytes else r.read())
+                            cabecalhos = {k.lower(): v for k, v in r.headers.items()}
+                            resposta = Resposta(str(r.url), r.status, cabecalhos, corpo)
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        disjuntor.failure()
+                        raise
+                    except BaseException:
+                        # cancelamento ou erro local: sem veredito sobre o host, só libera a chamada
+                        # de teste do meio-aberto (senão o host ficaria rejeitado)
+                        disjuntor.release()
+                        raise
+                disjuntor.record(resposta.status, time.perf_counter() - inicio, classe)
+                if resposta.status not in STATUS_REPETIR or ultima:
+                    return resposta
+                espera = _espera(tentativa, resposta.headers.get("retry-after"))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if ultima:
+                    raise
+                espera = _espera(tentativa)
+            await asyncio.sleep(espera)
+
+    async def request(self, metodo, url, params=None, data=None, limite_bytes=None, timeout=TIMEOUT):
+        """
+        Executa a requisição; GET/HEAD idênticos em andamento são compartilhados.
+
+        `timeout` é o teto: o disjuntor do host o reduz pela latência recente.
+        Se o host falhar (ou o disjuntor estiver aberto) e o mesmo GET já tiver
+        dado certo antes, devolve aquela resposta com `obsoleta=True`.
+        """
+        import aiohttp
+        params = _normalizar_params(params)
+        if metodo not in ("GET", "HEAD"):
+            return await self._executar(metodo, url, params, data, limite_bytes, timeout)
+
+        chave = (metodo, url, tuple(sorted((params or {}).items())), limite_bytes)
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(self._executar(metodo, url, params, data, limite_bytes, timeout))
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_andamento.pop(chave, None))
+        try:
+            # shield: se quem esperava for cancelado, os demais continuam recebendo a resposta
+            resposta = await asyncio.shield(tarefa)
+        except (CircuitOpen, aiohttp.ClientError, asyncio.TimeoutError):
+            if chave not in self._ultimas:
+                raise
+            return replace(self._ultimas[chave], obsoleta=True)
+        if resposta.status in STATUS_FALHA and chave in self._ultimas:
+            return replace(self._ultimas[chave], obsoleta=True)
+        if resposta.ok:
+            self._guardar(chave, resposta)
+        return resposta
+
+    def _guardar(self, chave, resposta):
+        """Guarda a resposta para uso obsoleto: só corpos pequenos e não imagem, com teto de itens e de bytes."""
+        anterior = self._ultimas.pop(chave, None)
+        if anterior is not None:
+            self._bytes_ultimas -= len(anterior.corpo)
+        if len(resposta.corpo) > MAX_BYTES_OBSOLETA or resposta.headers.get("content-type", "").startswith("image/"):
+            return
+        self._ultimas[chave] = resposta
+        self._bytes_ultimas += len(resposta.corpo)
+        while len(self._ultimas) > MAX_OBSOLETAS or self._bytes_ultimas > MAX_BYTES_OBSOLETAS:
+            _, antiga = self._ultimas.popitem(last=False)
+            self._bytes_ultimas -= len(antiga.corpo)
+
+    async def close(self):
+        if self._sessao is not None and not self._sessao.closed:
+            await self._sessao.close()
+
+
+# --- Ponte síncrona (Streamlit roda cada sessão numa thread própria) ---
+
+class _LoopEmFundo:
+    """Event loop rodando numa thread daemon; coroutines são submetidas de qualquer thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="http-async", daemon=True)
+        self.thread.start()
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+_lock = threading.Lock()
+_loop = None
+_fetcher = None
+
+
+def _instancia():
+    global _loop, _fetcher
+    with _lock:
+        if _loop is None:
+            _loop = _LoopEmFundo()
+            _fetcher = AsyncFetcher()
+            atexit.register(close)
+    return _loop, _fetcher
+
+
+def get(url, params=None, limite_bytes=None, timeout=TIMEOUT):
+    """
+    GET síncrono pela camada compartilhada.
+
+    Levanta aiohttp.ClientError/TimeoutError se todas as tentativas falharem, ou
+    CircuitOpen com o host fora do ar (sem resposta anterior para servir).
+    """
+    loop, fetcher = _instancia()
+    return loop.run(fetcher.request("GET", url, params, limite_bytes=limite_bytes, timeout=timeout))
+
+
+def post(url, data=None, timeout=TIMEOUT):
+    """POST síncrono (não é coalescido)."""
+    loop, fetcher = _instancia()
+    return loop.run(fetcher.request("POST", url, data=data, timeout=timeout))
+
+
+def get_many(pedidos, timeout=TIMEOUT):
+    """
+    Vários GETs em paralelo: `pedidos` é uma lista de (url, params).
+
+    Retorna, na mesma ordem, a Resposta ou a exceção de cada pedido.
+    """
+    loop, fetcher = _instancia()
+
+    async def todos():
+        return await asyncio.gather(
+            *(fetcher.request("GET", url, params, timeout=timeout) for url, params in pedidos),
+            return_exceptions=True,
+        )
+
+    return loop.run(todos())
+
+
+def close():
+    """Fecha a sessão aiohttp (chamado automaticamente ao sair)."""
+    if _loop is not None and _loop.thread.is_alive():
+        _loop.run(_fetcher.close(), timeout=5)
@@ -0,0 +1,272 @@
+# layer_registry.py
+# Registro único das camadas: config_bases.py declara, todos os apps e leitores consultam aqui.
+#
+# Cada base das listas BASES_* vira um registro Camada (imutável, com __slots__):
+#   - fonte normalizada (ARCGIS, WFS, PARQUET, ZIP, GEOJSON), deduzida de
+#     "tipo_fonte" / "tipo_arquivo" / "tipo" / extensão da URL
+#   - endpoint e id da camada (índice no MapServer/FeatureServer ou typeName do WFS)
+#   - mapeamento de campos, estilo e a política de desempenho da camada:
+#     validade do cache (cache_ttl), requisições simultâneas (concorrencia) e
+#     formato preferido para leitura (formato)
+# A política vem dos padrões por fonte (POLITICA_PADRAO), limitada pelo host
+# (http_async.LIMITES_POR_DOMINIO) e, quando preciso, ajustada na própria base
+# com a chave "cache": {"ttl": ..., "concorrencia": ..., "formato": ...}.
+#
+# O registro é validado ao ser montado (todos os problemas numa exceção só) e
+# indexado por nome e por categoria (dicionários: busca O(1)).
+# Não importa nada de rede/geo: pode ser usado na primeira tela dos apps.
+#
+# Uso: python layer_registry.py   (valida e lista as camadas por categoria)
+
+import re
+import threading
+from dataclasses import dataclass, field
+
+import config_bases
+from http_async import domain_limit
+
+FONTES = ("ARCGIS", "WFS", "PARQUET", "ZIP", "GEOJSON")
+FONTES_ARQUIVO = ("PARQUET", "ZIP", "GEOJSON")
+FORMATOS = ("esrijson", "geojson", "geoparquet", "zip")
+GEOMETRIAS = ("poligono", "linha", "ponto")
+CHAVES_POLITICA = ("ttl", "concorrencia", "formato")
+
+HORA = 3600
+DIA = 24 * HORA
+# Padrões por fonte: serviços mudam mais que arquivos publicados no GitHub
+POLITICA_PADRAO = {
+    "ARCGIS": {"ttl": DIA, "concorrencia": 4, "formato": "esrijson"},
+    "WFS": {"ttl": DIA, "concorrencia": 4, "formato": "geojson"},
+    "PARQUET": {"ttl": 7 * DIA, "concorrencia": 8, "formato": "geoparquet"},
+    "ZIP": {"ttl": 7 * DIA, "concorrencia": 8, "formato": "zip"},
+    "GEOJSON": {"ttl": 7 * DIA, "concorrencia": 8, "formato": "geojson"},
+}
+
+_EXTENSOES = (((".parquet", ".geoparquet"), "PARQUET"), ((".zip",), "ZIP"), ((".geojson", ".json"), "GEOJSON"))
+_ID_ARCGIS = re.compile(r"/(?:MapServer|FeatureServer)/(\d+)(?:/query)?/?$")
+
+
+# --- 1. Registro de uma camada ---
+
+@dataclass(frozen=True, slots=True)
+class Camada:
+    """Uma base de config_bases.py, normalizada. `config` é o dicionário original (para os leitores)."""
+    nome: str
+    categoria: str | None
+    fonte: str
+    url: str
+    layer_id: str | None
+    url_parquet: str | None
+    geometria: str | None
+    colunas_nome: tuple
+    cache_ttl: int
+    concorrencia: int
+    formato: str
+    mapeamento: dict = field(repr=False, compare=False)
+    estilo: dict | None = field(repr=False, compare=False)
+    config: dict = field(repr=False, compare=False)
+
+    @property
+    def arquivo(self):
+        """Base lida inteira de um arquivo (as ARCGIS/WFS precisam de consulta ou extração)."""
+        return self.fonte in FONTES_ARQUIVO
+
+    @property
+    def prefere_parquet(self):
+        return self.formato == "geoparquet" and bool(self.url_parquet)
+
+
+def source_type(base):
+    """Fonte normalizada de uma base (dicionário de config_bases.py), ou None se não der para deduzir."""
+    tipo_fonte = (base.get("tipo_fonte") or "").upper()
+    url = (base.get("url") or "").lower().split("?")[0]
+    if tipo_fonte == "WFS" or base.get("layer_name"):
+        return "WFS"
+    if tipo_fonte == "REST" or "/rest/services/" in url:
+        return "ARCGIS"
+    arquivo = (base.get("tipo_arquivo") or base.get("tipo") or "").lower()
+    if tipo_fonte == "PARQUET" or arquivo == "parquet" or url.endswith((".parquet", ".geoparquet")):
+        return "PARQUET"
+    if tipo_fonte == "ZIP" or arquivo == "zip" or url.endswith(".zip"):
+        return "ZIP"
+    if tipo_fonte in ("GEOJSON", "FEDERAL_GEOJSON") or arquivo == "geojson" or url.endswith((".geojson", ".json")):
+        return "GEOJSON"
+    return None
+
+
+def _fonte_da_extensao(url):
+    """Fonte de arquivo indicada pela extensão da URL, ou None se a URL não tiver uma conhecida."""
+    url = url.lower().split("?")[0]
+    return next((fonte for extensoes, fonte in _EXTENSOES if url.endswith(extensoes)), None)
+
+
+def _layer_id(base, fonte):
+    if fonte == "WFS":
+        return base.get("layer_name")
+    if fonte == "ARCGIS":
+        achado = _ID_ARCGIS.search(base.get("url") or "")
+        return achado.group(1) if achado else None
+    return None
+
+
+def _politica(base, fonte):
+    padrao = POLITICA_PADRAO.get(fonte, POLITICA_PADRAO["GEOJSON"])
+    ajuste = base.get("cache") or {}
+    formato = ajuste.get("formato") or ("geoparquet" if base.get("url_parquet") else padrao["formato"])
+    concorrencia = min(ajuste.get("concorrencia", padrao["concorrencia"]), domain_limit(base["url"]))
+    return ajuste.get("ttl", padrao["ttl"]), concorrencia, formato
+
+
+def make_layer(base, categoria=None):
+    """Camada a partir de uma base (sem validar: use validate() antes, como build_registry faz)."""
+    fonte = source_type(base)
+    ttl, concorrencia, formato = _politica(base, fonte)
+    geometria = base.get("tipo")
+    return Camada(
+        nome=base["nome"],
+        categoria=categoria,
+        fonte=fonte,
+        url=base["url"],
+        layer_id=_layer_id(base, fonte),
+        url_parquet=base.get("url_parquet"),
+        geometria=geometria if geometria in GEOMETRIAS else None,
+        colunas_nome=tuple(base.get("colunas_nome") or ()),
+        cache_ttl=ttl,
+        concorrencia=concorrencia,
+        formato=formato,
+        mapeamento=base.get("mapeamento") or base.get("colunas_chave") or {},
+        estilo=base.get("style"),
+        config=base,
+    )
+
+
+# --- 2. Validação ---
+
+def validate(base):
+    """Lista de problemas da base (vazia se estiver tudo certo)."""
+    nome = base.get("nome")
+    if not isinstance(nome, str) or not nome.strip():
+        return [f"base sem nome: {base!r:.80}"]
+    erros = []
+    url = base.get("url")
+    if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+        erros.append("url ausente ou não é http(s)")
+        return [f"{nome}: {e}" for e in erros]
+    fonte = source_type(base)
+    if fonte is None:
+        erros.append("fonte não identificada (informe tipo_fonte)")
+    elif fonte == "ARCGIS" and _layer_id(base, fonte) is None:
+        erros.append("URL ArcGIS sem índice da camada (…/MapServer/N ou …/FeatureServer/N)")
+    elif fonte in FONTES_ARQUIVO and _fonte_da_extensao(url) not in (None, fonte):
+        erros.append(f"tipo_fonte {fonte} não confere com a extensão da url ({_fonte_da_extensao(url)})")
+    if base.get("url_parquet") and not base["url_parquet"].lower().endswith(".parquet"):
+        erros.append("url_parquet não aponta para um .parquet")
+    if base.get("tipo") and base["tipo"] not in GEOMETRIAS and base["tipo"] not in ("geojson", "parquet"):
+        erros.append(f"tipo de geometria desconhecido: {base['tipo']}")
+    colunas = base.get("colunas_nome")
+    if colunas is not None and not (isinstance(colunas, list) and all(isinstance(c, str) for c in colunas)):
+        erros.append("colunas_nome deve ser uma lista de textos")
+    mapeamento = base.get("mapeamento")
+    if mapeamento is not None and not (isinstance(mapeamento, dict) and set(mapeamento) <= {"legenda", "detalhes"}):
+        erros.append("mapeamento aceita só 'legenda' e 'detalhes'")
+    ajuste = base.get("cache") or {}
+    if set(ajuste) - set(CHAVES_POLITICA):
+        erros.append(f"chaves de cache desconhecidas: {', '.join(sorted(set(ajuste) - set(CHAVES_POLITICA)))}")
+    if "ttl" in ajuste and not (isinstance(ajuste["ttl"], int) and ajuste["ttl"] > 0):
+        erros.append("cache.ttl deve ser um inteiro positivo (segundos)")
+    if "concorrencia" in ajuste and not (isinstance(ajuste["concorrencia"], int) and ajuste["concorrencia"] >= 1):
+        erros.append("cache.concorrencia deve ser um inteiro >= 1")
+    if "formato" in ajuste and ajuste["formato"] not in FORMATOS:
+        erros.append(f"cache.formato deve ser um de {', '.join(FORMATOS)}")
+    return [f"{nome}: {e}" for e in erros]
+
+
+# --- 3. Registro indexado ---
+
+class LayerRegistry:
+    """Camadas na ordem de config_bases.py, indexadas por nome e por categoria."""
+
+    def __init__(self, camadas):
+        self._por_nome = {c.nome: c for c in camadas}
+        self._por_categoria = {}
+        for c in camadas:
+            self._por_categoria.setdefault(c.categoria, []).append(c)
+        self._por_categoria = {k: tuple(v) for k, v in self._por_categoria.items()}
+
+    def __len__(self):
+        return len(self._por_nome)
+
+    def __iter__(self):
+        return iter(self._por_nome.values())
+
+    def __contains__(self, nome):
+        return nome in self._por_nome
+
+    def __getitem__(self, nome):
+        return self._por_nome[nome]
+
+    def get(self, nome, padrao=None):
+        return self._por_nome.get(nome, padrao)
+
+    def categories(self):
+        """Nomes das categorias, na ordem de config_bases.CATEGORIAS."""
+        return list(self._por_categoria)
+
+    def category(self, categoria):
+        """Camadas de uma categoria (tupla; vazia se a categoria não existir)."""
+        return self._por_categoria.get(categoria, ())
+
+    def layer_for(self, base):
+        """Camada registrada com o nome da base, ou uma montada na hora (bases avulsas, fora do config)."""
+        camada = self._por_nome.get(base.get("nome"))
+        return camada if camada is not None else make_layer(base)
+
+
+def build_registry(categorias=None):
+    """Valida e indexa as bases; levanta ValueError com todos os problemas encontrados."""
+    categorias = config_bases.CATEGORIAS if categorias is None else categorias
+    erros, camadas, vistos = [], [], set()
+    for categoria, bases in categorias.items():
+        for base in bases:
+            problemas = validate(base)
+            if base.get("nome") in vistos:
+                problemas.append(f"{base['nome']}: nome repetido")
+            erros += problemas
+            vistos.add(base.get("nome"))
+            if not problemas:
+                camadas.append(make_layer(base, categoria))
+    if erros:
+        raise ValueError("Registro de camadas inválido:\n  - " + "\n  - ".join(erros))
+    return LayerRegistry(camadas)
+
+
+_registro = None
+_registro_lock = threading.Lock()
+
+
+def get_registry():
+    """Registro único do processo, montado de config_bases.CATEGORIAS na primeira chamada."""
+    global _registro
+    with _registro_lock:
+        if _registro is None:
+            _registro = build_registry()
+    return _registro
+
+
+def layer_for(base):
+    """Atalho para get_registry().layer_for(base)."""
+    return get_registry().layer_for(base)
+
+
+def main():
+    registro = get_registry()
+    for categoria in registro.categories():
+        print(f"--- {categoria} ---")
+        for c in registro.category(categoria):
+            ttl = f"{c.cache_ttl // DIA}d" if c.cache_ttl % DIA == 0 else f"{c.cache_ttl // HORA}h"
+            print(f"  {c.nome:55s} {c.fonte:8s} {c.formato:11s} ttl {ttl:>4s} | {c.concorrencia} simultâneas")
+    print(f"✅ {len(registro)} camadas em {len(registro.categories())} categorias")
+
+
+if __name__ == "__main__":
+    main()
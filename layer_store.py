@@ -0,0 +1,237 @@
+# layer_store.py
+# Camadas carregadas uma vez por processo, em Arrow, compartilhadas entre as sessões do Streamlit.
+#
+# @st.cache_data serializa e copia o valor para cada sessão: com camadas
+# inteiras, cada usuário simultâneo teria a sua cópia do mesmo GeoDataFrame.
+# Aqui cada base vira, uma vez só:
+#   - uma tabela Arrow com a geometria em WKB (ou GeoArrow nativo) e as colunas
+#     de texto repetitivas codificadas em dicionário, mais colunas bbox_* para
+#     filtrar por retângulo sem decodificar geometria
+#   - gravada como arquivo Arrow IPC sem compressão (<nome>-<versao>.arrow no
+#     diretório do disk_cache) e aberta por memory map: vários processos
+#     (workers do Streamlit, scripts) dividem as mesmas páginas do page cache
+# As sessões recebem visões (select/slice) da mesma tabela, sem cópia. Só
+# to_geodataframe() materializa, e de preferência já filtrado por bbox.
+#
+# Benchmark: python layer_store.py bench [SESSOES]
+
+import hashlib
+import os
+import re
+import sys
+import threading
+
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from base_readers import local_path, read_geo_file, source_urls
+from disk_cache import CACHE_DIR
+
+DIR_ARROW = os.path.join(CACHE_DIR, "arrow")
+FRACAO_DICIONARIO = 0.5  # texto com até 50% de valores distintos vira dicionário
+COLUNAS_BBOX = ("bbox_xmin", "bbox_ymin", "bbox_xmax", "bbox_ymax")
+
+
+# --- 1. GeoDataFrame <-> Arrow ---
+
+def to_arrow(gdf, geometry_encoding="WKB", fracao_dicionario=FRACAO_DICIONARIO):
+    """
+    Tabela Arrow compacta da camada.
+
+    `geometry_encoding="geoarrow"` usa buffers de coordenadas nativos; camadas
+    com tipos de geometria misturados ficam em WKB.
+    """
+    try:
+        tabela = pa.table(gdf.to_arrow(geometry_encoding=geometry_encoding, index=False))
+    except (ValueError, NotImplementedError):
+        tabela = pa.table(gdf.to_arrow(geometry_encoding="WKB", index=False))
+    for i, campo in enumerate(tabela.schema):
+        if pa.types.is_string(campo.type) or pa.types.is_large_string(campo.type):
+            coluna = tabela.column(i)
+            if len(coluna) and pc.count_distinct(coluna).as_py() <= fracao_dicionario * len(coluna):
+                tabela = tabela.set_column(i, campo.name, pc.dictionary_encode(coluna))
+    limites = gdf.geometry.bounds.to_numpy()
+    for j, nome in enumerate(COLUNAS_BBOX):
+        tabela = tabela.append_column(nome, pa.array(limites[:, j], type=pa.float64()))
+    return tabela
+
+
+def to_geodataframe(tabela):
+    """GeoDataFrame a partir da tabela (copia: use numa visão já filtrada)."""
+    nomes = [n for n in tabela.column_names if n not in COLUNAS_BBOX]
+    return gpd.GeoDataFrame.from_arrow(tabela.select(nomes))
+
+
+def write_ipc(tabela, caminho):
+    """Grava Arrow IPC sem compressão (requisito para o memory map não copiar)."""
+    parcial = caminho + ".part"
+    with pa.OSFile(parcial, "wb") as destino, pa.ipc.new_file(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(parcial, caminho)
+
+
+def read_ipc(caminho, usar_mmap=True):
+    """Tabela do arquivo IPC: com memory map os buffers apontam direto para o arquivo."""
+    fonte = pa.memory_map(caminho, "r") if usar_mmap else pa.OSFile(caminho, "rb")
+    tabela = pa.ipc.open_file(fonte).read_all()
+    # sem memory map a leitura já copiou tudo para a memória do processo
+    return tabela if usar_mmap else tabela.combine_chunks()
+
+
+# --- 2. Armazém por processo ---
+
+def _nome_arquivo(nome):
+    return re.sub(r"[^\w.-]+", "_", nome).strip("_")
+
+
+def _versao(caminho):
+    # muda quando o arquivo de origem muda (o disk_cache troca o arquivo ao revalidar)
+    info = os.stat(caminho)
+    return hashlib.sha1(f"{os.path.abspath(caminho)}|{info.st_mtime_ns}|{info.st_size}".encode()).hexdigest()[:16]
+
+
+class LayerStore:
+    """
+    Tabelas Arrow das camadas, uma por processo e compartilhadas entre threads (sessões).
+
+    Cada camada é carregada sob um lock próprio: duas sessões pedindo a mesma
+    base ao mesmo tempo esperam a mesma leitura.
+    """
+
+    def __init__(self, diretorio=DIR_ARROW, usar_mmap=True, geometry_encoding="WKB"):
+        os.makedirs(diretorio, exist_ok=True)
+        self.diretorio = diretorio
+        self.usar_mmap = usar_mmap
+        self.geometry_encoding = geometry_encoding
+        self._tabelas = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_da(self, nome):
+        with self._lock:
+            return self._locks.setdefault(nome, threading.Lock())
+
+    def load_file(self, nome, caminho):
+        """Tabela da camada a partir de um arquivo local (GeoParquet, GeoJSON, ZIP)."""
+        versao = _versao(caminho)
+        with self._lock_da(nome):
+            atual = self._tabelas.get(nome)
+            if atual is not None and atual[0] == versao:
+                return atual[1]
+            ipc = os.path.join(self.diretorio, f"{_nome_arquivo(nome)}-{versao}.arrow")
+            if not os.path.exists(ipc):
+                write_ipc(to_arrow(read_geo_file(caminho), self.geometry_encoding), ipc)
+            tabela = read_ipc(ipc, self.usar_mmap)
+            self._tabelas[nome] = (versao, tabela)
+            return tabela
+
+    def load(self, base, prefer_parquet=None, **kwargs):
+        """Tabela de uma base de config_bases.py (gêmeo GeoParquet primeiro, como read_base)."""
+        urls, kwargs = source_urls(base, prefer_parquet, **kwargs)
+        erro = None
+        for url in urls:
+            try:
+                return self.load_file(base["nome"], local_path(url, **kwargs))
+            except IOError as e:
+                erro = e
+        raise erro
+
+    def view(self, nome, columns=None, bbox=None):
+        """
+        Visão da camada já carregada: sem cópia quando só há `columns`.
+
+        `bbox` (xmin, ymin, xmax, ymax, no CRS da camada) filtra pelas colunas
+        bbox_*; o filtro copia apenas as linhas selecionadas.
+        """
+        tabela = self._tabelas[nome][1]
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = bbox
+            mascara = pc.and_(
+                pc.and_(pc.less_equal(tabela["bbox_xmin"], xmax), pc.greater_equal(tabela["bbox_xmax"], xmin)),
+                pc.and_(pc.less_equal(tabela["bbox_ymin"], ymax), pc.greater_equal(tabela["bbox_ymax"], ymin)),
+            )
+            tabela = tabela.filter(mascara)
+        if columns is not None:
+            geometria = [c for c in tabela.column_names if c == "geometry"]
+            tabela = tabela.select(list(dict.fromkeys(list(columns) + geometria)))
+        return tabela
+
+    def geodataframe(self, nome, columns=None, bbox=None):
+        """GeoDataFrame (cópia) do recorte pedido; para a camada inteira prefira view()."""
+        return to_geodataframe(self.view(nome, columns, bbox))
+
+    def drop(self, nome):
+        with self._lock_da(nome):
+            self._tabelas.pop(nome, None)
+
+    def stats(self):
+        """{nome: {"linhas", "mb"}} e o total alocado pelo Arrow fora dos memory maps."""
+        camadas = {nome: {"linhas": t.num_rows, "mb": t.nbytes / 1e6} for nome, (_, t) in self._tabelas.items()}
+        return {"camadas": camadas, "alocado_mb": pa.total_allocated_bytes() / 1e6}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Armazém único do processo (todas as sessões do Streamlit usam o mesmo)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LayerStore()
+    return _store
+
+
+# --- 3. Benchmark ---
+# Mede a memória residente (RSS atual) de N "sessões" recebendo a mesma camada:
+# como @st.cache_data faz (pickle por sessão) e como visões do LayerStore. A conta
+# começa antes da carga: o que a variante guarda da camada também entra.
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def _medir(variante, caminho, sessoes):
+    import pickle
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        inicio = _rss_mb()
+        if variante == "cache_data":
+            gdf = read_geo_file(caminho)
+            carregada = _rss_mb()
+            copias = [pickle.loads(pickle.dumps(gdf)) for _ in range(sessoes)]
+        else:
+            store = LayerStore(diretorio, usar_mmap=(variante == "store_mmap"))
+            store.load_file("camada", caminho)
+            carregada = _rss_mb()
+            copias = [store.view("camada") for _ in range(sessoes)]
+        depois = _rss_mb()
+        print(f"{variante:12s} {len(copias)} sessões: +{depois - inicio:7.1f} MB no total "
+              f"(carga {carregada - inicio:6.1f} MB, {(depois - carregada) / sessoes:.2f} MB por sessão)")
+
+
+def bench(sessoes=8):
+    import subprocess
+    from base_readers import DIR_LOCAL
+
+    caminho = os.path.join(DIR_LOCAL, "MS_2022.geoparquet")
+    gdf = read_geo_file(caminho)
+    tabela = to_arrow(gdf)
+    dicionario = [c.name for c in tabela.schema if pa.types.is_dictionary(c.type)]
+    print(f"{os.path.basename(caminho)}: {len(gdf)} feições | GeoDataFrame {gdf.memory_usage(deep=True).sum() / 1e6:.1f} MB | "
+          f"Arrow {tabela.nbytes / 1e6:.1f} MB (dicionário: {', '.join(dicionario) or '-'})")
+    for variante in ("cache_data", "store", "store_mmap"):
+        subprocess.run([sys.executable, __file__, "_medir", variante, caminho, str(sessoes)], check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["_medir"]:
+        _medir(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    elif sys.argv[1:2] == ["bench"]:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 8)
+    else:
+        print("Uso: python layer_store.py bench [SESSOES]")
@@ -0,0 +1,320 @@
+# raster_tiles.py
+# Tiles XYZ das imagens ArcGIS (ImageServer/exportImage e MapServer/export) com cache MBTiles.
+#
+# Em vez de pedir um exportImage do tamanho da tela a cada visualização, a área
+# é dividida na grade XYZ (Web Mercator, 256 px) e cada tile é pedido à parte,
+# em paralelo (http_async.py, com o limite por domínio do pinms). Os tiles ficam
+# num arquivo MBTiles por camada (SQLite, no diretório do disk_cache) com
+# remoção LRU; assim revisitar a área ou comparar Landsat 2008 x Sentinel 2025
+# sai do disco.
+#
+# Uso: python raster_tiles.py prefetch NOME xmin ymin xmax ymax --zoom 12 14
+#      python raster_tiles.py demo   (exportImage local, sem rede)
+
+import argparse
+import math
+import os
+import re
+import sqlite3
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import http_async
+from config_bases import URL_DECLIVIDADE_EXPORT, URL_HIDRO_EXPORT, URL_LANDSAT_2008_EXPORT, URL_SENTINEL_2025_EXPORT
+from disk_cache import CACHE_DIR
+from host_breaker import StubServer
+
+SERVICOS = {
+    "landsat_2008": URL_LANDSAT_2008_EXPORT,
+    "sentinel_2025": URL_SENTINEL_2025_EXPORT,
+    "declividade": URL_DECLIVIDADE_EXPORT,
+    "hidrografia": URL_HIDRO_EXPORT,
+}
+
+TAMANHO_TILE = 256
+ORIGEM = 20037508.342789244  # meia circunferência da Terra em Web Mercator (m)
+DIR_TILES = os.path.join(CACHE_DIR, "tiles")
+TILES_MAX_MB = float(os.environ.get("BASES_TILES_MAX_MB", "300"))
+MAX_TILES_POR_PEDIDO = 1024
+
+_ASSINATURAS = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff")  # PNG, JPEG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+CREATE TABLE IF NOT EXISTS acessos (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER,
+    tamanho INTEGER NOT NULL, ultimo_acesso REAL NOT NULL,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+CREATE INDEX IF NOT EXISTS acessos_lru ON acessos (ultimo_acesso);
+"""
+
+
+# --- 1. Grade XYZ ---
+
+def tile_bounds(z, x, y):
+    """Limites (xmin, ymin, xmax, ymax) do tile em EPSG:3857."""
+    lado = 2 * ORIGEM / (2 ** z)
+    xmin = -ORIGEM + x * lado
+    ymax = ORIGEM - y * lado
+    return xmin, ymax - lado, xmin + lado, ymax
+
+
+def lonlat_to_tile(lon, lat, z):
+    """Tile XYZ que contém o ponto (graus)."""
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_for_bbox(limites, z):
+    """Lista de (z, x, y) cobrindo o retângulo (xmin, ymin, xmax, ymax) em graus."""
+    xmin, ymin, xmax, ymax = limites
+    x0, y0 = lonlat_to_tile(xmin, ymax, z)
+    x1, y1 = lonlat_to_tile(xmax, ymin, z)
+    return [(z, x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def export_params(z, x, y, formato="png", extras=None):
+    """Parâmetros de exportImage/export para um tile (mesmos nomes nos dois endpoints)."""
+    params = {
+        "bbox": ",".join(f"{v:.6f}" for v in tile_bounds(z, x, y)),
+        "bboxSR": 3857,
+        "imageSR": 3857,
+        "size": f"{TAMANHO_TILE},{TAMANHO_TILE}",
+        "format": formato,
+        "transparent": "true",
+        "f": "image",
+    }
+    params.update(extras or {})
+    return params
+
+
+# --- 2. Cache MBTiles ---
+
+class TileCache:
+    """Arquivo MBTiles (tile_row no esquema TMS) com tabela auxiliar de acessos para LRU."""
+
+    def __init__(self, caminho, max_mb=TILES_MAX_MB, metadados=None):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self.caminho = caminho
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        with self._conectar() as con:
+            con.executescript(_SCHEMA)
+            for nome, valor in (metadados or {}).items():
+                con.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?)", (nome, str(valor)))
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def _tms(z, x, y):
+        return z, x, (2 ** z) - 1 - y
+
+    def get_many(self, tiles):
+        """{(z, x, y): bytes} dos tiles presentes; atualiza o último acesso."""
+        encontrados = {}
+        agora = time.time()
+        with self._conectar() as con:
+            for z, x, y in tiles:
+                linha = con.execute(
+                    "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", self._tms(z, x, y)
+                ).fetchone()
+                if linha:
+                    encontrados[(z, x, y)] = linha[0]
+            if encontrados:
+                con.executemany(
+                    "UPDATE acessos SET ultimo_acesso = ? WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                    [(agora, *self._tms(*t)) for t in encontrados],
+                )
+        return encontrados
+
+    def put_many(self, tiles):
+        """Grava {(z, x, y): bytes} e aplica o limite de tamanho."""
+        agora = time.time()
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            con.executemany("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)",
+                            [(*self._tms(*t), sqlite3.Binary(dados)) for t, dados in tiles.items()])
+            con.executemany("INSERT OR REPLACE INTO acessos VALUES (?, ?, ?, ?, ?)",
+                            [(*self._tms(*t), len(dados), agora) for t, dados in tiles.items()])
+            con.execute("COMMIT")
+        self.evict()
+
+    def size(self):
+        with self._conectar() as con:
+            return con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM acessos").fetchone()[0]
+
+    def evict(self):
+        """Remove os tiles menos usados recentemente até caber em max_bytes. Retorna quantos saíram."""
+        removidos = 0
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            total = con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM acessos").fetchone()[0]
+            if total > self.max_bytes:
+                for z, x, y, tamanho in con.execute(
+                    "SELECT zoom_level, tile_column, tile_row, tamanho FROM acessos ORDER BY ultimo_acesso"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    con.execute("DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", (z, x, y))
+                    con.execute("DELETE FROM acessos WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", (z, x, y))
+                    total -= tamanho
+                    removidos += 1
+            con.execute("COMMIT")
+        return removidos
+
+
+# --- 3. Serviço de tiles ---
+
+def _nome_arquivo(nome):
+    return re.sub(r"[^\w.-]+", "_", nome).strip("_") + ".mbtiles"
+
+
+class TileService:
+    """Tiles de um endpoint exportImage/export, servidos do cache ou buscados em paralelo."""
+
+    def __init__(self, nome, url, formato="png", extras=None, diretorio=DIR_TILES, max_mb=TILES_MAX_MB):
+        self.nome = nome
+        self.url = url
+        self.formato = formato
+        self.extras = extras
+        self.cache = TileCache(
+            os.path.join(diretorio, _nome_arquivo(nome)), max_mb,
+            metadados={"name": nome, "format": formato, "type": "overlay", "version": "1.1", "description": url},
+        )
+
+    def fetch(self, tiles, timeout=http_async.TIMEOUT):
+        """
+        {(z, x, y): bytes ou None} para os tiles pedidos.
+
+        Os ausentes do cache são buscados juntos; respostas que não são imagem
+        (o ArcGIS devolve erro em JSON com status 200) ficam como None e não são gravadas.
+        """
+        tiles = list(dict.fromkeys(tiles))
+        if len(tiles) > MAX_TILES_POR_PEDIDO:
+            raise ValueError(f"{len(tiles)} tiles num pedido só (máximo {MAX_TILES_POR_PEDIDO}); reduza a área ou o zoom.")
+        resultado = self.cache.get_many(tiles)
+        faltantes = [t for t in tiles if t not in resultado]
+        if faltantes:
+            respostas = http_async.get_many(
+                [(self.url, export_params(*t, formato=self.formato, extras=self.extras)) for t in faltantes], timeout=timeout
+            )
+            novos = {}
+            for t, r in zip(faltantes, respostas):
+                if isinstance(r, Exception) or r.status != 200 or not r.corpo.startswith(_ASSINATURAS):
+                    resultado[t] = None
+                else:
+                    novos[t] = resultado[t] = r.corpo
+            if novos:
+                self.cache.put_many(novos)
+        return {t: resultado[t] for t in tiles}
+
+    def tile(self, z, x, y):
+        return self.fetch([(z, x, y)])[(z, x, y)]
+
+    def prefetch(self, limites, zooms):
+        """Garante no cache todos os tiles do retângulo nos níveis de zoom. Retorna (total, falhas)."""
+        total = falhas = 0
+        for z in zooms:
+            grade = tiles_for_bbox(limites, z)
+            for i in range(0, len(grade), MAX_TILES_POR_PEDIDO):
+                lote = self.fetch(grade[i:i + MAX_TILES_POR_PEDIDO])
+                total += len(lote)
+                falhas += sum(v is None for v in lote.values())
+        return total, falhas
+
+
+def compare(limites, z, antes="landsat_2008", depois="sentinel_2025"):
+    """Tiles das duas camadas na mesma grade (antes/depois), buscados ao mesmo tempo: {(z, x, y): (antes, depois)}."""
+    grade = tiles_for_bbox(limites, z)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        a, b = executor.map(lambda nome: TileService(nome, SERVICOS[nome]).fetch(grade), (antes, depois))
+    return {t: (a[t], b[t]) for t in grade}
+
+
+# --- 4. Demonstração ---
+# exportImage local (host_breaker.StubServer) que devolve um PNG por tile, com latência
+# fixa; alguns pedidos recebem o erro JSON com status 200, como o ArcGIS faz.
+
+class StubExportImage(StubServer):
+    """Responde a cada exportImage com um PNG de 1x1 px diferente por bbox; `erro_a_cada` N pedidos, com JSON de erro."""
+
+    def __init__(self, latencia=0.05, erro_a_cada=0):
+        super().__init__(latencia=latencia)
+        self.erro_a_cada = erro_a_cada
+
+    def responder(self, caminho):
+        self.requisicoes += 1
+        if self.erro_a_cada and self.requisicoes % self.erro_a_cada == 0:
+            return 200, "application/json", b'{"error": {"code": 500, "message": "Error exporting image"}}'
+        cor = zlib.crc32(caminho.encode()).to_bytes(4, "big")[:3]
+        return 200, "image/png", _png_1x1(cor)
+
+
+def _png_1x1(rgb):
+    def bloco(tipo, dados):
+        return struct.pack(">I", len(dados)) + tipo + dados + struct.pack(">I", zlib.crc32(tipo + dados))
+
+    return (_ASSINATURAS[0] + bloco(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + bloco(b"IDAT", zlib.compress(b"\x00" + rgb)) + bloco(b"IEND", b""))
+
+
+def demo(limites=(-54.80, -20.60, -54.40, -20.30), zooms=(12, 13)):
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as diretorio, StubExportImage(latencia=0.05, erro_a_cada=25) as stub:
+        servico = TileService("teste", f"{stub.url}/arcgis/rest/services/Teste/ImageServer/exportImage",
+                              diretorio=diretorio)
+        inicio = time.perf_counter()
+        total, falhas = servico.prefetch(limites, zooms)
+        print(f"1ª visita: {total} tiles ({falhas} com erro JSON, não gravados) em {time.perf_counter() - inicio:.2f} s, "
+              f"{stub.requisicoes} requisições (atraso de {stub.latencia * 1000:.0f} ms cada)")
+
+        antes = stub.requisicoes
+        inicio = time.perf_counter()
+        total, falhas = servico.prefetch(limites, zooms)
+        print(f"2ª visita: {total} tiles em {time.perf_counter() - inicio:.2f} s, "
+              f"{stub.requisicoes - antes} requisições (só as que falharam antes)")
+
+        tamanho = servico.cache.size()
+        servico.cache.max_bytes = tamanho // 2
+        removidos = servico.cache.evict()
+        print(f"LRU: limite de {servico.cache.max_bytes} bytes -> {removidos} tiles removidos, "
+              f"{servico.cache.size()} bytes no cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-carrega tiles XYZ das imagens ArcGIS no cache MBTiles.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    pre = sub.add_parser("prefetch")
+    pre.add_argument("nome", choices=sorted(SERVICOS))
+    pre.add_argument("limites", nargs=4, type=float, metavar=("XMIN", "YMIN", "XMAX", "YMAX"))
+    pre.add_argument("--zoom", nargs=2, type=int, default=[12, 14], metavar=("MIN", "MAX"))
+    sub.add_parser("demo", help="servidor exportImage local, sem rede")
+    args = parser.parse_args()
+
+    if args.comando == "demo":
+        return demo()
+    servico = TileService(args.nome, SERVICOS[args.nome])
+    total, falhas = servico.prefetch(args.limites, range(args.zoom[0], args.zoom[1] + 1))
+    print(f"✅ {total - falhas}/{total} tiles em {servico.cache.caminho} ({servico.cache.size() / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
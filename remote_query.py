@@ -0,0 +1,238 @@
+# remote_query.py
+# Consulta remota recortada por uma região de interesse (ROI), com o filtro
+# espacial executado no servidor.
+#
+# Em vez de baixar a camada inteira e filtrar localmente:
+#   ArcGIS REST -> geometry + geometryType + spatialRel, só os campos usados por
+#                  colunas_nome/mapeamento (outFields) e coordenadas com
+#                  geometryPrecision reduzida
+#   WFS         -> bbox da ROI + propertyName com os mesmos campos; o recorte
+#                  exato é refeito localmente (resultado já é pequeno)
+# Assim a checagem de um imóvel transfere KB em vez de MB.
+
+import json
+import threading
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+from shapely.geometry import box
+from shapely.geometry.polygon import orient
+
+import http_async
+from arcgis_extract import TIMEOUT, ArcGISError, esri_to_shapely, layer_info, layer_url
+from http_async import sync_session
+from url_probe import classify_url
+from wfs_client import describe_feature_type, iter_pages, sort_field
+
+SR_PADRAO = 4674           # SIRGAS 2000 (CRS das bases locais)
+PRECISAO_GEOMETRIA = 6     # casas decimais (~0,1 m em graus)
+MAX_VERTICES_ROI = 500     # ROIs maiores são simplificadas antes de ir na requisição
+
+
+# --- 1. Campos a pedir ---
+
+def fields_for_base(base):
+    """Todos os campos candidatos citados em colunas_nome e mapeamento (legenda + detalhes), sem repetir."""
+    mapeamento = base.get("mapeamento", {})
+    candidatos = list(base.get("colunas_nome", [])) + list(mapeamento.get("legenda", []))
+    for valores in mapeamento.get("detalhes", {}).values():
+        candidatos += [valores] if isinstance(valores, str) else list(valores)
+    return list(dict.fromkeys(candidatos))
+
+
+def _filtrar_existentes(candidatos, disponiveis):
+    """Mantém os candidatos que existem na camada, com a grafia do servidor (sem diferenciar maiúsculas)."""
+    por_nome = {d.lower(): d for d in disponiveis}
+    return list(dict.fromkeys(por_nome[c.lower()] for c in candidatos if c.lower() in por_nome))
+
+
+# --- 2. ROI ---
+
+def normalize_roi(roi, crs=None, sr=SR_PADRAO):
+    """Converte a ROI (geometria shapely, GeoSeries ou GeoDataFrame) numa geometria única no SR de consulta."""
+    if isinstance(roi, (gpd.GeoSeries, gpd.GeoDataFrame)):
+        serie = roi.geometry if isinstance(roi, gpd.GeoDataFrame) else roi
+        if serie.crs is not None:
+            serie = serie.to_crs(epsg=sr)
+        return serie.union_all()
+    if crs is not None:
+        return gpd.GeoSeries([roi], crs=crs).to_crs(epsg=sr).iloc[0]
+    return roi
+
+
+def _roi_enxuta(roi):
+    """Simplifica a ROI até caber em MAX_VERTICES_ROI (o recorte exato é feito localmente depois)."""
+    if shapely.get_num_coordinates(roi) <= MAX_VERTICES_ROI:
+        return roi
+
+    def enxugar(t):
+        # A simplificada se afasta até `t` da original: um buffer só, com cantos em esquadro
+        # (sem os vértices de arco do canto redondo), volta a cobrir a ROI inteira
+        return roi.simplify(t, preserve_topology=True).buffer(t, join_style="mitre")
+
+    def cabe(geometria):
+        return shapely.get_num_coordinates(geometria) <= MAX_VERTICES_ROI
+
+    tolerancia = 1e-5
+    enxuta = enxugar(tolerancia)
+    while not cabe(enxuta):
+        tolerancia *= 2
+        enxuta = enxugar(tolerancia)
+    # refina entre a última tolerância que não coube e a que coube: ROI enviada menor
+    abaixo = tolerancia / 2
+    for _ in range(4):
+        meio = (abaixo + tolerancia) / 2
+        candidata = enxugar(meio)
+        if cabe(candidata):
+            tolerancia, enxuta = meio, candidata
+        else:
+            abaixo = meio
+    return enxuta
+
+
+def esri_geometry(roi, sr=SR_PADRAO):
+    """Geometria Esri JSON (envelope se a ROI for um retângulo, senão polígono)."""
+    if roi.equals(box(*roi.bounds)):
+        xmin, ymin, xmax, ymax = roi.bounds
+        return "esriGeometryEnvelope", {"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax, "spatialReference": {"wkid": sr}}
+    aneis = []
+    for poligono in getattr(roi, "geoms", [roi]):
+        # Esri: anel externo horário, buracos anti-horários
+        poligono = orient(poligono, sign=-1.0)
+        aneis.append([list(c) for c in poligono.exterior.coords])
+        aneis += [[list(c) for c in anel.coords] for anel in poligono.interiors]
+    return "esriGeometryPolygon", {"rings": aneis, "spatialReference": {"wkid": sr}}
+
+
+# --- 3. ArcGIS REST ---
+
+_INFO_CAMADAS = {}
+_INFO_LOCK = threading.Lock()
+
+
+def _campos_arcgis(session, url, **kwargs):
+    """(nomes dos campos, campo OBJECTID) da camada, guardados por processo: metadados quase nunca mudam."""
+    with _INFO_LOCK:
+        if url in _INFO_CAMADAS:
+            return _INFO_CAMADAS[url]
+    info = layer_info(session, url, **kwargs)
+    resultado = ([c["name"] for c in info["fields"]], info["oid_field"])
+    with _INFO_LOCK:
+        _INFO_CAMADAS[url] = resultado
+    return resultado
+
+
+def arcgis_roi_params(roi, campos, sr=SR_PADRAO, precisao=PRECISAO_GEOMETRIA):
+    """Parâmetros de /query com o filtro espacial e a projeção de colunas."""
+    tipo, geometria = esri_geometry(_roi_enxuta(roi), sr)
+    return {
+        "where": "1=1",
+        "geometry": json.dumps(geometria),
+        "geometryType": tipo,
+        "spatialRel": "esriSpatialRelIntersects",
+        "inSR": sr,
+        "outSR": sr,
+        "outFields": ",".join(campos) or "*",
+        "returnGeometry": "true",
+        "geometryPrecision": precisao,
+        "f": "json",
+    }
+
+
+def query_arcgis_roi(base, roi, session=None, sr=SR_PADRAO, precisao=PRECISAO_GEOMETRIA, **kwargs):
+    """
+    Feições da camada ArcGIS que intersectam a ROI, só com os campos configurados.
+
+    `session` e kwargs (headers, verify, timeout...) valem para os metadados da camada;
+    a consulta em si é um POST por http_async (cabeçalhos e TLS dele), que só usa `timeout`.
+    """
+    session = session or sync_session()
+    disponiveis, oid = _campos_arcgis(session, layer_url(base["url"]), **kwargs)
+    campos = _filtrar_existentes(fields_for_base(base), disponiveis)
+    params = arcgis_roi_params(roi, campos, sr, precisao)
+    if oid:
+        params["orderByFields"] = oid
+    query = layer_url(base["url"]) + "/query"
+
+    features, offset = [], 0
+    while True:
+        # POST: a geometria da ROI pode não caber numa URL
+        dados = _post_json(query, {**params, "resultOffset": offset} if offset else params, kwargs.get("timeout", TIMEOUT))
+        pagina = dados.get("features", [])
+        features += pagina
+        if not dados.get("exceededTransferLimit") or not pagina:
+            break
+        offset += len(pagina)
+
+    gdf = gpd.GeoDataFrame(
+        pd.DataFrame([f.get("attributes") or {} for f in features]),
+        geometry=[esri_to_shapely(f.get("geometry")) for f in features],
+        crs=f"EPSG:{sr}",
+    )
+    # A ROI enviada pode ter sido simplificada: recorte exato local
+    return gdf[gdf.intersects(roi)].reset_index(drop=True)
+
+
+def _post_json(url, data, timeout=TIMEOUT):
+    # pela camada compartilhada (http_async): limite por domínio, novas tentativas e disjuntor do host
+    r = http_async.post(url, data={k: str(v) for k, v in data.items()}, timeout=timeout)
+    if not r.ok:
+        raise ArcGISError(f"Status {r.status} em {url}")
+    dados = r.json()
+    if "error" in dados:
+        raise ArcGISError(dados["error"].get("message", dados["error"]))
+    return dados
+
+
+# --- 4. WFS ---
+
+def wfs_roi_filters(roi, propriedades, geometria, srs=f"EPSG:{SR_PADRAO}", ordem=None):
+    """
+    Filtros GetFeature: bbox da ROI (ordem x/y com 'EPSG:'), propertyName com os campos
+    pedidos e, com `ordem`, sortBy nesse campo (que também entra no propertyName).
+    """
+    xmin, ymin, xmax, ymax = roi.bounds
+    filtros = {"bbox": f"{xmin},{ymin},{xmax},{ymax},{srs}"}
+    if ordem:
+        filtros["sortBy"] = ordem
+    if propriedades and geometria:
+        campos = list(propriedades) + ([ordem] if ordem and ordem not in propriedades else [])
+        filtros["propertyName"] = ",".join(campos + [geometria])
+    return filtros
+
+
+def query_wfs_roi(base, roi, session=None, srs=f"EPSG:{SR_PADRAO}", page_size=1000, **kwargs):
+    """Feições da camada WFS que intersectam a ROI (bbox no servidor, recorte exato local)."""
+    session = session or sync_session()
+    url, layer = base["url"], base["layer_name"]
+    disponiveis, geometria = describe_feature_type(session, url, layer, **kwargs)
+    campos = _filtrar_existentes(fields_for_base(base), [p["name"] for p in disponiveis or []])
+    filtros = wfs_roi_filters(roi, campos, geometria, srs, ordem=sort_field(disponiveis))
+
+    atributos, geometrias = [], []
+    for a, g, _ in iter_pages(session, url, layer, disponiveis, page_size, filtros=filtros, srs=srs, **kwargs):
+        atributos += a
+        geometrias += g
+
+    gdf = gpd.GeoDataFrame(pd.DataFrame(atributos), geometry=geometrias, crs=srs)
+    return gdf[gdf.intersects(roi)].reset_index(drop=True)
+
+
+# --- 5. Entrada única ---
+
+def query_roi(base, roi, crs=None, session=None, **kwargs):
+    """
+    Consulta uma base de config_bases.py recortada pela ROI, escolhendo o protocolo pela fonte.
+
+    `roi` pode ser geometria shapely (em EPSG:4674, ou no `crs` informado), GeoSeries
+    ou GeoDataFrame. kwargs vão para requests (headers, verify, timeout...), exceto na
+    consulta ArcGIS, que só usa `timeout` (ver query_arcgis_roi).
+    """
+    roi = normalize_roi(roi, crs)
+    tipo = classify_url(base["url"], base.get("layer_name"))
+    if tipo == "WFS":
+        return query_wfs_roi(base, roi, session=session, **kwargs)
+    if tipo == "ARCGIS":
+        return query_arcgis_roi(base, roi, session=session, **kwargs)
+    raise ValueError(f"Base '{base.get('nome')}' não é um serviço REST/WFS; use spatial_query.py para arquivos.")
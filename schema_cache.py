@@ -0,0 +1,229 @@
+# schema_cache.py
+# Cache local dos esquemas (campos, tipos, domínios) das camadas, para o config_wizard.py.
+#
+# Uma categoria inteira é inspecionada de uma vez, em paralelo (com limite por host):
+#   ArcGIS REST -> metadados da camada (?f=json): campos, tipos, domínios,
+#                  maxRecordCount, extensão, tipo de geometria
+#   WFS         -> DescribeFeatureType
+#   Parquet     -> rodapé do arquivo (também para ZIPs com gêmeo "url_parquet")
+# O resultado fica em SQLite (schemas.sqlite, no diretório do disk_cache) com um
+# carimbo de versão: schemaLastEditDate do ArcGIS quando existe, senão um hash dos
+# campos. Ao atualizar, só entradas vencidas (validade da camada em
+# layer_registry.py) são buscadas de novo, e só as que mudaram de versão são
+# marcadas como alteradas.
+# Ler o cache não importa nada de rede/geo: os clientes de cada tipo de fonte
+# só são importados quando uma inspeção acontece (o wizard abre mais rápido).
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from disk_cache import CACHE_DIR
+from layer_registry import layer_for, source_type
+
+VERSAO_FORMATO = 1          # muda quando o formato gravado muda (entradas antigas são refeitas)
+MAX_WORKERS = 8
+TIMEOUT = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS esquemas (
+    chave TEXT PRIMARY KEY,
+    nome TEXT,
+    tipo TEXT NOT NULL,
+    versao TEXT NOT NULL,
+    formato INTEGER NOT NULL,
+    campos TEXT NOT NULL,
+    info TEXT NOT NULL,
+    verificado_em REAL NOT NULL,
+    alterado_em REAL NOT NULL
+)
+"""
+
+
+def layer_key(layer):
+    """
+    Chave da camada no cache: nome da camada, URL consultada e layer_name (WFS).
+
+    O nome entra porque camadas diferentes podem ler o mesmo arquivo (ex.: as duas
+    entradas do Autex com o mesmo url_parquet) e get_many responde por nome.
+    """
+    url = (layer.get("url_parquet") or layer["url"]) if source_type(layer) in ("ZIP", "GEOJSON") else layer["url"]
+    return f"{layer['nome']}|{url}|{layer.get('layer_name') or ''}"
+
+
+def _hash(campos):
+    return hashlib.sha1(json.dumps(campos, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+# --- 1. Inspeção por tipo de fonte ---
+
+def _dominio(dominio):
+    if not dominio:
+        return None
+    if dominio.get("type") == "codedValue":
+        return {str(v["code"]): v["name"] for v in dominio.get("codedValues", [])}
+    if dominio.get("type") == "range":
+        return {"min": dominio["range"][0], "max": dominio["range"][1]}
+    return None
+
+
+def _inspecionar_arcgis(session, layer, **kwargs):
+    from arcgis_extract import get_json, layer_url
+    info = get_json(session, layer_url(layer["url"]), {"f": "json"}, tentativas=2, **kwargs)
+    campos = [
+        {"nome": c["name"], "tipo": c.get("type", "").replace("esriFieldType", ""), "alias": c.get("alias"),
+         "tamanho": c.get("length"), "dominio": _dominio(c.get("domain"))}
+        for c in info.get("fields") or []
+    ]
+    edicao = info.get("editingInfo") or {}
+    versao = str(edicao["schemaLastEditDate"]) if edicao.get("schemaLastEditDate") else _hash(campos)
+    extras = {
+        "max_record_count": info.get("maxRecordCount"),
+        "geometria": info.get("geometryType"),
+        "extensao": info.get("extent"),
+        "versao_servidor": info.get("currentVersion"),
+    }
+    return "ARCGIS", campos, extras, versao
+
+
+def _inspecionar_wfs(session, layer, **kwargs):
+    from wfs_client import describe_feature_type
+    propriedades, geometria = describe_feature_type(session, layer["url"], layer["layer_name"], **kwargs)
+    if propriedades is None:
+        raise IOError("DescribeFeatureType indisponível.")
+    campos = [{"nome": p["name"], "tipo": p.get("localType"), "nulo": p.get("nillable")} for p in propriedades]
+    return "WFS", campos, {"geometria": geometria}, _hash(campos)
+
+
+def _inspecionar_parquet(session, layer, **kwargs):
+    from base_readers import parquet_schema
+    url = layer.get("url_parquet") or layer["url"]
+    schema = parquet_schema(url, session=session, **kwargs)
+    campos = [{"nome": f.name, "tipo": str(f.type)} for f in schema]
+    return "PARQUET", campos, {}, _hash(campos)
+
+
+def inspectable(layer):
+    """ZIP/GeoJSON sem gêmeo GeoParquet não têm esquema sem baixar o arquivo (ficam com a amostra do wizard)."""
+    return not (source_type(layer) in ("ZIP", "GEOJSON") and not layer.get("url_parquet"))
+
+
+def introspect(session, layer, **kwargs):
+    """(tipo, campos, info, versao) de uma camada; levanta exceção se a fonte não puder ser inspecionada."""
+    fonte = source_type(layer)
+    if fonte == "PARQUET" or (fonte in ("ZIP", "GEOJSON") and layer.get("url_parquet")):
+        return _inspecionar_parquet(session, layer, **kwargs)
+    if fonte in ("ZIP", "GEOJSON"):
+        raise ValueError(f"{fonte} sem gêmeo GeoParquet: esquema só pela amostra.")
+    if fonte == "WFS":
+        return _inspecionar_wfs(session, layer, **kwargs)
+    return _inspecionar_arcgis(session, layer, **kwargs)
+
+
+# --- 2. Cache ---
+
+class SchemaCache:
+    """Esquemas das camadas em SQLite, com carimbo de versão."""
+
+    def __init__(self, diretorio=CACHE_DIR):
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, "schemas.sqlite")
+        with self._conectar() as con:
+            con.execute(_SCHEMA)
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            yield con
+        finally:
+            con.close()
+
+    def get_many(self, layers):
+        """{nome: registro} das camadas que estão no cache (uma consulta só)."""
+        chaves = {layer_key(l): l["nome"] for l in layers}
+        if not chaves:
+            return {}
+        with self._conectar() as con:
+            linhas = con.execute(
+                f"SELECT chave, tipo, versao, formato, campos, info, verificado_em, alterado_em FROM esquemas "
+                f"WHERE chave IN ({','.join('?' * len(chaves))})", list(chaves)
+            ).fetchall()
+        return {
+            chaves[chave]: {"tipo": tipo, "versao": versao, "formato": formato, "campos": json.loads(campos),
+                            "info": json.loads(info), "verificado_em": verificado, "alterado_em": alterado}
+            for chave, tipo, versao, formato, campos, info, verificado, alterado in linhas
+        }
+
+    def put(self, layer, tipo, campos, info, versao):
+        """Grava o esquema. Retorna "novo", "alterado" ou "igual" (comparando a versão)."""
+        agora = time.time()
+        chave = layer_key(layer)
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            anterior = con.execute("SELECT versao, formato, alterado_em FROM esquemas WHERE chave = ?", (chave,)).fetchone()
+            if anterior and anterior[0] == versao and anterior[1] == VERSAO_FORMATO:
+                con.execute("UPDATE esquemas SET verificado_em = ? WHERE chave = ?", (agora, chave))
+                con.execute("COMMIT")
+                return "igual"
+            con.execute(
+                "INSERT OR REPLACE INTO esquemas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (chave, layer["nome"], tipo, versao, VERSAO_FORMATO, json.dumps(campos, ensure_ascii=False),
+                 json.dumps(info, ensure_ascii=False), agora, agora),
+            )
+            con.execute("COMMIT")
+        return "alterado" if anterior else "novo"
+
+    def stale(self, layers, max_idade=None):
+        """Camadas ausentes, vencidas (`max_idade` ou a validade de cada camada) ou gravadas num formato antigo."""
+        registros = self.get_many(layers)
+        agora = time.time()
+        return [
+            l for l in layers
+            if l["nome"] not in registros
+            or registros[l["nome"]]["verificado_em"] < agora - (max_idade or layer_for(l).cache_ttl)
+            or registros[l["nome"]]["formato"] != VERSAO_FORMATO
+        ]
+
+    def refresh(self, layers, max_idade=None, forcar=False, max_workers=MAX_WORKERS, **kwargs):
+        """
+        Inspeciona em paralelo as camadas vencidas (ou todas, com `forcar`).
+
+        Retorna {nome: "novo" | "alterado" | "igual" | "erro: ..."} só das camadas
+        consultadas. kwargs vão para requests (headers, verify...).
+        """
+        from url_probe import HostPool
+
+        layers = [l for l in layers if inspectable(l)]
+        pendentes = layers if forcar else self.stale(layers, max_idade)
+        kwargs.setdefault("timeout", TIMEOUT)
+        resultado = {}
+        with HostPool() as pool:
+            def inspecionar(layer):
+                url = layer.get("url_parquet") or layer["url"]
+                with pool.limite(url):
+                    try:
+                        return layer, introspect(pool.session, layer, **kwargs), None
+                    except Exception as e:
+                        return layer, None, e
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for layer, inspecao, erro in executor.map(inspecionar, pendentes):
+                    resultado[layer["nome"]] = f"erro: {erro}" if erro else self.put(layer, *inspecao)
+        return resultado
+
+
+_cache_padrao = None
+
+
+def get_cache():
+    """Instância compartilhada do cache de esquemas no diretório padrão."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = SchemaCache()
+    return _cache_padrao
@@ -0,0 +1,312 @@
+# screen_car.py
+# Triagem em lote de imóveis do CAR contra as camadas de restrição de config_bases.py (sem Streamlit).
+#
+# Entrada: CSV ou Parquet com "cod_imovel" e/ou geometria (GeoParquet, ou coluna
+# WKT "geometry"/"wkt" no CSV). Imóveis só com código têm a geometria buscada na
+# camada "CAR - Limite da Propriedade": num GeoParquet local (--car, ex.: extraído
+# com arcgis_extract.py) ou direto no ArcGIS, em lotes de códigos.
+#
+# Camadas: as bases com arquivo (GeoParquet/GeoJSON/ZIP, local ou do disk_cache)
+# e as informadas em --camada NOME=arquivo (ex.: camadas REST/WFS extraídas com
+# arcgis_extract.py / wfs_client.py). São carregadas e indexadas uma vez, no
+# processo principal (spatial_query.SpatialQueryEngine); os workers nascem por
+# fork e herdam os índices sem copiar (copy-on-write). Sem fork (Windows), cada
+# worker carrega as camadas uma vez no inicializador.
+#
+# Os imóveis vão aos workers em blocos; a saída é um Parquet com uma linha por
+# (imóvel, camada, feição), ordenado por (posição na entrada, ordem da camada, feição)
+# independentemente do número de workers.
+#
+# Uso: python screen_car.py entrada.csv relatorio.parquet [--workers 4] [--bloco 200]
+#                           [--car car.parquet] [--camada NOME=arquivo.parquet]
+#      python screen_car.py bench [N_IMOVEIS]
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import requests
+import shapely
+
+from arcgis_extract import SR_SAIDA, ArcGISError, esri_to_shapely, get_json, layer_url
+from base_readers import read_base, read_geo_file
+from http_async import sync_session
+from layer_registry import get_registry, layer_for
+from spatial_query import SpatialQueryEngine
+
+CAMPO_CODIGO = "cod_imovel"
+BASE_LIMITE_CAR = get_registry()["CAR - Limite da Propriedade"].config
+CODIGOS_POR_CONSULTA = 100
+BLOCO_PADRAO = 200
+COLUNAS_RELATORIO = ["ordem", "imovel", "camada", "feicao", "nome", "legenda", "detalhes"]
+
+
+# --- 1. Camadas ---
+
+def all_bases():
+    """Todas as bases do registro de camadas, na ordem de config_bases.CATEGORIAS."""
+    return [c.config for c in get_registry()]
+
+
+def file_based(base):
+    """Bases que podem ser lidas inteiras de um arquivo (as REST/WFS precisam de extração antes)."""
+    return layer_for(base).arquivo
+
+
+def layer_specs(extras=None, apenas=None):
+    """
+    [(nome, base, arquivo ou None)] das camadas a carregar, na ordem de config_bases.py.
+
+    `extras` ({nome: arquivo}) substitui/acrescenta camadas; `apenas` filtra por nome.
+    """
+    extras = dict(extras or {})
+    especificacoes = []
+    for base in all_bases():
+        nome = base["nome"]
+        if nome in extras:
+            especificacoes.append((nome, base, extras.pop(nome)))
+        elif file_based(base):
+            especificacoes.append((nome, base, None))
+    especificacoes += [(nome, None, arquivo) for nome, arquivo in extras.items()]
+    if apenas:
+        especificacoes = [e for e in especificacoes if e[0] in apenas]
+    return especificacoes
+
+
+def build_engine(especificacoes, **kwargs):
+    """Carrega e indexa as camadas; as que falharem ficam de fora (com aviso)."""
+    motor = SpatialQueryEngine()
+    for nome, base, arquivo in especificacoes:
+        try:
+            gdf = read_geo_file(arquivo) if arquivo else read_base(base, **kwargs)
+        except (IOError, OSError, requests.exceptions.RequestException) as e:
+            print(f"⚠️ {nome}: não carregada ({e})", file=sys.stderr)
+            continue
+        motor.add_layer(nome, gdf, base)
+    return motor
+
+
+# --- 2. Imóveis de entrada ---
+
+def _coluna(df, *candidatos):
+    por_nome = {str(c).lower(): c for c in df.columns}
+    return next((por_nome[c] for c in candidatos if c in por_nome), None)
+
+
+def read_properties(caminho, crs="EPSG:4674"):
+    """
+    GeoDataFrame [imovel, geometry] na ordem do arquivo (geometria pode faltar).
+
+    `crs` vale para WKT em CSV; GeoParquet traz o próprio CRS.
+    """
+    with open(caminho, "rb") as f:
+        parquet = f.read(4) == b"PAR1"
+    if parquet:
+        try:
+            df = gpd.read_parquet(caminho)
+        except ValueError:  # Parquet comum, sem metadados "geo"
+            df = pd.read_parquet(caminho)
+    else:
+        df = pd.read_csv(caminho, dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+    codigo = _coluna(df, CAMPO_CODIGO, "codigo", "id")
+    imoveis = df[codigo].astype(str).to_numpy() if codigo else np.arange(len(df)).astype(str)
+    if isinstance(df, gpd.GeoDataFrame):
+        return gpd.GeoDataFrame({"imovel": imoveis}, geometry=df.geometry.values, crs=df.crs)
+    wkt = _coluna(df, "geometry", "wkt", "geom")
+    textos = [v if isinstance(v, str) and v.strip() else None for v in df[wkt]] if wkt else [None] * len(df)
+    geometrias = shapely.from_wkt(np.array(textos, dtype=object))
+    return gpd.GeoDataFrame({"imovel": imoveis}, geometry=geometrias, crs=crs)
+
+
+def car_geometries(codigos, arquivo_car=None, session=None, **kwargs):
+    """
+    {cod_imovel: geometria (EPSG:4674)} da camada de limites do CAR: GeoParquet local ou ArcGIS.
+
+    No ArcGIS, um lote que falhar (rede, erro do servidor, disjuntor aberto) só fica
+    de fora do resultado, com aviso: os códigos dele voltam como não encontrados.
+    """
+    codigos = list(dict.fromkeys(codigos))
+    if not codigos:
+        return {}
+    if arquivo_car:
+        gdf = gpd.read_parquet(arquivo_car, columns=[CAMPO_CODIGO, "geometry"], filters=[(CAMPO_CODIGO, "in", codigos)])
+        gdf = gdf.to_crs(f"EPSG:{SR_SAIDA}") if gdf.crs else gdf
+        return dict(zip(gdf[CAMPO_CODIGO].astype(str), gdf.geometry.values))
+
+    session = session or sync_session()
+    query = layer_url(BASE_LIMITE_CAR["url"]) + "/query"
+    geometrias = {}
+    for i in range(0, len(codigos), CODIGOS_POR_CONSULTA):
+        lote = codigos[i:i + CODIGOS_POR_CONSULTA]
+        lista = ",".join("'" + c.replace("'", "''") + "'" for c in lote)
+        params = {"where": f"{CAMPO_CODIGO} IN ({lista})", "outFields": CAMPO_CODIGO, "returnGeometry": "true",
+                  "outSR": SR_SAIDA, "f": "json"}
+        try:
+            features = get_json(session, query, params, **kwargs).get("features", [])
+        except (IOError, ArcGISError, ValueError) as e:  # IOError cobre requests e CircuitOpen
+            print(f"⚠️ CAR: {len(lote)} códigos sem consulta ({e})", file=sys.stderr)
+            continue
+        for f in features:
+            codigo = str((f.get("attributes") or {}).get(CAMPO_CODIGO))
+            geometrias[codigo] = esri_to_shapely(f.get("geometry"))
+    return geometrias
+
+
+def complete_geometries(imoveis, arquivo_car=None, **kwargs):
+    """Preenche as geometrias ausentes pelo código do CAR. Retorna (imóveis com geometria, códigos não encontrados)."""
+    faltando = imoveis.geometry.isna().to_numpy()
+    if faltando.any():
+        encontrados = car_geometries(imoveis["imovel"][faltando], arquivo_car, **kwargs)
+        if imoveis.crs is None:
+            imoveis = imoveis.set_crs(f"EPSG:{SR_SAIDA}")
+        novas = gpd.GeoSeries([encontrados.get(c) for c in imoveis["imovel"][faltando]], crs=f"EPSG:{SR_SAIDA}").to_crs(imoveis.crs)
+        geometrias = imoveis.geometry.values.copy()
+        geometrias[faltando] = novas.values
+        imoveis = imoveis.set_geometry(gpd.GeoSeries(geometrias, crs=imoveis.crs))
+    validos = imoveis.geometry.notna().to_numpy() & ~imoveis.geometry.is_empty.to_numpy()
+    ausentes = imoveis["imovel"][~validos].tolist()
+    return imoveis.assign(ordem=np.arange(len(imoveis)))[validos].reset_index(drop=True), ausentes
+
+
+# --- 3. Triagem em paralelo ---
+
+_MOTOR = None  # motor global do processo; herdado pelos workers no fork
+
+
+def _inicializar_worker(especificacoes, kwargs):
+    global _MOTOR
+    if _MOTOR is None:  # spawn: sem herança do processo principal
+        _MOTOR = build_engine(especificacoes, **kwargs)
+
+
+def _triar_bloco(bloco):
+    """Consulta um bloco (ordens, imóveis, WKB, crs) em todas as camadas do motor do processo."""
+    ordens, imoveis, wkb, crs = bloco
+    serie = gpd.GeoSeries(shapely.from_wkb(wkb), crs=crs)
+    partes = []
+    for posicao, (nome, df) in enumerate(_MOTOR.query(serie).items()):
+        rotulos = df.drop(columns=["entrada", "feicao", "nome", "legenda"], errors="ignore")
+        detalhes = [json.dumps({k: v for k, v in linha.items() if pd.notna(v)}, ensure_ascii=False, default=str)
+                    for linha in rotulos.to_dict("records")] if len(rotulos.columns) else ["{}"] * len(df)
+        partes.append(pd.DataFrame({
+            "ordem": ordens[df["entrada"].to_numpy()],
+            "imovel": imoveis[df["entrada"].to_numpy()],
+            "camada": nome,
+            "ordem_camada": posicao,
+            "feicao": df["feicao"].to_numpy(dtype=np.int64),
+            "nome": df["nome"].astype(object).where(df["nome"].notna(), None) if "nome" in df else None,
+            "legenda": df["legenda"].astype(object).where(df["legenda"].notna(), None) if "legenda" in df else None,
+            "detalhes": detalhes,
+        }))
+    return pd.concat(partes, ignore_index=True) if partes else None
+
+
+def _blocos(imoveis, tamanho):
+    crs = imoveis.crs.to_string() if imoveis.crs else None
+    wkb = shapely.to_wkb(imoveis.geometry.values)
+    ordens, codigos = imoveis["ordem"].to_numpy(), imoveis["imovel"].to_numpy()
+    for i in range(0, len(imoveis), tamanho):
+        yield ordens[i:i + tamanho], codigos[i:i + tamanho], wkb[i:i + tamanho], crs
+
+
+def screen(imoveis, especificacoes=None, motor=None, workers=None, bloco=BLOCO_PADRAO, **kwargs):
+    """
+    DataFrame [ordem, imovel, camada, feicao, nome, legenda, detalhes] de todos os pares imóvel x feição.
+
+    `imoveis` precisa da coluna "ordem" (ver complete_geometries). Com
+    workers > 1 os blocos vão para um pool de processos que compartilha o motor.
+    """
+    global _MOTOR
+    _MOTOR = motor or _MOTOR or build_engine(especificacoes, **kwargs)
+    blocos = _blocos(imoveis, bloco)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        resultados = list(map(_triar_bloco, blocos))
+    else:
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context("fork" if "fork" in metodos else None)
+        with contexto.Pool(workers, initializer=_inicializar_worker, initargs=(especificacoes, kwargs)) as pool:
+            resultados = list(pool.imap(_triar_bloco, blocos))
+    # a ordem das camadas vem da posição no motor (igual em todos os processos)
+    ordem_camadas = {nome: i for i, nome in enumerate(_MOTOR.camadas)}
+    resultados = [r for r in resultados if r is not None]
+    if not resultados:
+        return pd.DataFrame(columns=COLUNAS_RELATORIO)
+    relatorio = pd.concat(resultados, ignore_index=True)
+    relatorio["ordem_camada"] = relatorio["camada"].map(ordem_camadas)
+    relatorio = relatorio.sort_values(["ordem", "ordem_camada", "feicao"], kind="stable", ignore_index=True)
+    return relatorio[COLUNAS_RELATORIO]
+
+
+def write_report(relatorio, destino):
+    parcial = destino + ".part"
+    relatorio.to_parquet(parcial, index=False, compression="zstd")
+    os.replace(parcial, destino)
+
+
+# --- 4. Benchmark ---
+
+def bench(n=5000):
+    from base_readers import DIR_LOCAL
+    from spatial_query import _poligonos_aleatorios
+
+    arquivos = {"APP Topo de Morro": "app_topo_morro.parquet", "Focos MS 2022": "MS_2022.geoparquet",
+                "Autex Sinaflor (Base GeoJSON)": "Autex_Sinaflor.parquet"}
+    especificacoes = [(nome, None, os.path.join(DIR_LOCAL, a)) for nome, a in arquivos.items()]
+    inicio = time.perf_counter()
+    motor = build_engine(especificacoes)
+    print(f"{len(motor.camadas)} camadas carregadas e indexadas em {time.perf_counter() - inicio:.2f}s")
+
+    limites = motor.camadas["Focos MS 2022"].gdf.total_bounds
+    imoveis = gpd.GeoDataFrame({"imovel": [f"MS-{i:07d}" for i in range(n)], "ordem": np.arange(n)},
+                               geometry=_poligonos_aleatorios(limites, n, tamanho=0.03), crs="EPSG:4674")
+    referencia = None
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        inicio = time.perf_counter()
+        relatorio = screen(imoveis, especificacoes, motor=motor, workers=workers)
+        tempo = time.perf_counter() - inicio
+        referencia = relatorio if referencia is None else referencia
+        igual = relatorio.equals(referencia)
+        print(f"workers={workers}: {n / tempo:8.0f} imóveis/s ({tempo:.2f}s, {len(relatorio)} linhas, igual ao serial: {igual})")
+    print(f"(CPUs disponíveis: {os.cpu_count()})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Triagem em lote de imóveis do CAR contra as camadas de restrição.")
+    parser.add_argument("entrada", help="CSV ou Parquet com cod_imovel e/ou geometria")
+    parser.add_argument("destino", help="Relatório .parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--bloco", type=int, default=BLOCO_PADRAO, help="imóveis por tarefa")
+    parser.add_argument("--car", help="GeoParquet local da camada de limites do CAR (senão consulta o ArcGIS)")
+    parser.add_argument("--camada", action="append", default=[], metavar="NOME=ARQUIVO",
+                        help="arquivo local para uma camada (ex.: extração de uma base REST/WFS); pode repetir")
+    parser.add_argument("--apenas", action="append", metavar="NOME", help="consulta só estas camadas; pode repetir")
+    parser.add_argument("--crs", default="EPSG:4674", help="CRS do WKT em CSV")
+    args = parser.parse_args()
+
+    extras = dict(c.split("=", 1) for c in args.camada)
+    imoveis, ausentes = complete_geometries(read_properties(args.entrada, args.crs), args.car)
+    if ausentes:
+        print(f"⚠️ {len(ausentes)} imóveis sem geometria (ex.: {', '.join(ausentes[:5])})", file=sys.stderr)
+    especificacoes = layer_specs(extras, args.apenas)
+    inicio = time.perf_counter()
+    motor = build_engine(especificacoes)
+    print(f"{len(motor.camadas)} camadas em {time.perf_counter() - inicio:.1f}s; triando {len(imoveis)} imóveis...")
+    inicio = time.perf_counter()
+    relatorio = screen(imoveis, especificacoes, motor=motor, workers=args.workers, bloco=args.bloco)
+    write_report(relatorio, args.destino)
+    tempo = time.perf_counter() - inicio
+    print(f"✅ {len(relatorio)} ocorrências em {args.destino} ({len(imoveis) / tempo:.0f} imóveis/s)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    else:
+        main()
@@ -0,0 +1,322 @@
+# slope_overlay.py
+# Camada pré-processada de restrições de relevo (BASES_RELEVO) + índice em máscara de bits.
+#
+# As bases de declividade vêm de raster vetorizado: centenas de polígonos
+# pequenos em "escadinha". Aqui, uma vez só:
+#   1. cada classe é dissolvida, simplificada (tolerância em metros) e ajustada
+#      a uma grade de precisão (set_precision), em EPSG:5880
+#   2. a área é rasterizada numa grade fixa de células: para cada classe ficam
+#      as células inteiramente dentro ("cheias") e as que cortam a borda, com o
+#      recorte da classe em cada célula de borda (pecas_borda.parquet)
+# A pergunta "quanto do imóvel está acima de 25°?" vira: células cheias do
+# imóvel ∩ células cheias da classe (soma de máscara), áreas já recortadas das
+# células de borda da classe, e cálculo vetorial exato só onde a borda do
+# imóvel passa.
+#
+# Uso: python slope_overlay.py build [--celula 100] [--tolerancia 15]
+#      python slope_overlay.py bench
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from base_readers import read_base, read_geo_file
+from config_bases import BASES_RELEVO
+from disk_cache import CACHE_DIR
+
+CRS_METRICO = "EPSG:5880"
+DIR_RELEVO = os.path.join(CACHE_DIR, "relevo")
+CELULA_M = 100.0       # lado da célula da máscara
+TOLERANCIA_M = 15.0    # simplificação (meio pixel do raster de origem)
+PRECISAO_M = 1.0       # grade de ajuste das coordenadas
+MAX_CELULAS_LOTE = 250_000
+
+# Classe -> bases de origem (por trecho do nome em BASES_RELEVO); "acima_25" junta as duas faixas
+CLASSES = {
+    "declividade_25_45": ["25° a 45°"],
+    "declividade_acima_45": ["> 45°"],
+    "app_topo_morro": ["Topo de Morro"],
+}
+CLASSES_DERIVADAS = {"declividade_acima_25": ["declividade_25_45", "declividade_acima_45"]}
+
+
+# --- 1. Grade de células ---
+
+def cell_keys(linhas, colunas):
+    """Chave int64 de cada célula (linha nos 32 bits altos, coluna nos baixos)."""
+    return (np.asarray(linhas, dtype=np.int64) << 32) | np.asarray(colunas, dtype=np.int64)
+
+
+def cell_boxes(chaves, celula=CELULA_M):
+    """Polígonos das células (em EPSG:5880) a partir das chaves."""
+    linhas, colunas = np.asarray(chaves) >> 32, np.asarray(chaves) & 0xFFFFFFFF
+    return shapely.box(colunas * celula, linhas * celula, (colunas + 1) * celula, (linhas + 1) * celula)
+
+
+def _celulas_do_contorno(contorno, celula):
+    """Chaves das células que o contorno corta (exato: candidatas vizinhas dos vértices adensados, depois intersects)."""
+    pontos = shapely.get_coordinates(shapely.segmentize(contorno, celula / 2))
+    colunas = np.floor(pontos[:, 0] / celula).astype(np.int64)
+    linhas = np.floor(pontos[:, 1] / celula).astype(np.int64)
+    # Um trecho de até meia célula só alcança a célula do vértice ou uma das 8 vizinhas
+    deslocamentos = np.array([(dl, dc) for dl in (-1, 0, 1) for dc in (-1, 0, 1)])
+    candidatas = np.unique(cell_keys((linhas[:, None] + deslocamentos[:, 0]).ravel(), (colunas[:, None] + deslocamentos[:, 1]).ravel()))
+    return candidatas[shapely.intersects(contorno, cell_boxes(candidatas, celula))]
+
+
+def rasterize(geometria, celula=CELULA_M):
+    """
+    Classifica as células que a geometria toca: (cheias, borda), arrays ordenados de chaves.
+
+    A borda sai do contorno (custo proporcional ao perímetro); as cheias são as
+    demais células do retângulo de cada parte com o centro dentro (contains_xy,
+    sem criar polígonos). A grade é percorrida parte a parte e em lotes.
+    """
+    cheias = []
+    contorno = shapely.boundary(geometria)
+    shapely.prepare(contorno)
+    borda = _celulas_do_contorno(contorno, celula) if not contorno.is_empty else np.empty(0, np.int64)
+    for parte in shapely.get_parts(geometria):
+        if parte.is_empty:
+            continue
+        shapely.prepare(parte)
+        xmin, ymin, xmax, ymax = parte.bounds
+        c0, c1 = int(xmin // celula), int(xmax // celula)
+        l0, l1 = int(ymin // celula), int(ymax // celula)
+        ncol = c1 - c0 + 1
+        passo = max(1, MAX_CELULAS_LOTE // ncol)
+        for inicio in range(l0, l1 + 1, passo):
+            linhas, colunas = np.meshgrid(np.arange(inicio, min(inicio + passo, l1 + 1)), np.arange(c0, c1 + 1), indexing="ij")
+            linhas, colunas = linhas.ravel(), colunas.ravel()
+            dentro = shapely.contains_xy(parte, (colunas + 0.5) * celula, (linhas + 0.5) * celula)
+            cheias.append(cell_keys(linhas[dentro], colunas[dentro]))
+    cheias = np.unique(np.concatenate(cheias)) if cheias else np.empty(0, np.int64)
+    return np.setdiff1d(cheias, borda, assume_unique=True), borda
+
+
+# --- 2. Pré-processamento ---
+
+def prepare_class(gdfs, tolerancia=TOLERANCIA_M, precisao=PRECISAO_M):
+    """Dissolve, simplifica e ajusta à grade as geometrias da classe (em EPSG:5880)."""
+    geometrias = [g.to_crs(CRS_METRICO).geometry.values for g in gdfs]
+    unida = shapely.union_all(np.concatenate(geometrias))
+    simples = shapely.simplify(unida, tolerancia, preserve_topology=True)
+    ajustada = shapely.set_precision(simples, precisao)
+    return shapely.make_valid(ajustada) if not shapely.is_valid(ajustada) else ajustada
+
+
+def _bases_da_classe(trechos):
+    return [b for b in BASES_RELEVO if any(t in b["nome"] for t in trechos)]
+
+
+def build_overlay(diretorio=DIR_RELEVO, celula=CELULA_M, tolerancia=TOLERANCIA_M, precisao=PRECISAO_M, fontes=None, **kwargs):
+    """
+    Gera <diretorio>/classes.parquet (partes simplificadas por classe) e <diretorio>/mascara.npz.
+
+    `fontes` permite passar {classe: [GeoDataFrame, ...]} já carregados; senão as
+    bases de BASES_RELEVO são lidas (gêmeo GeoParquet primeiro). Classes cujas
+    bases não puderem ser lidas ficam de fora (com aviso). Retorna o resumo por classe.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    geometrias, resumo = {}, {}
+    for classe, trechos in CLASSES.items():
+        if fontes is not None and classe not in fontes:
+            continue
+        try:
+            gdfs = fontes[classe] if fontes is not None else [read_base(b, **kwargs) for b in _bases_da_classe(trechos)]
+        except (IOError, OSError) as e:
+            print(f"⚠️ {classe}: base indisponível ({e})", file=sys.stderr)
+            continue
+        if not gdfs:
+            continue
+        geometrias[classe] = prepare_class(gdfs, tolerancia, precisao)
+        resumo[classe] = {"feicoes_origem": int(sum(len(g) for g in gdfs))}
+    for classe, componentes in CLASSES_DERIVADAS.items():
+        if all(c in geometrias for c in componentes):
+            geometrias[classe] = shapely.union_all([geometrias[c] for c in componentes])
+            resumo[classe] = {"feicoes_origem": sum(resumo[c]["feicoes_origem"] for c in componentes)}
+
+    linhas, pecas, mascaras = [], [], {}
+    for classe, geometria in geometrias.items():
+        partes = shapely.get_parts(geometria)
+        linhas += [{"classe": classe, "geometry": p} for p in partes]
+        cheias, borda = rasterize(geometria, celula)
+        chaves, recortes = border_pieces(partes, borda, celula)
+        pecas.append(pd.DataFrame({"classe": classe, "celula": chaves, "geometry": recortes}))
+        mascaras[f"cheias__{classe}"] = cheias
+        mascaras[f"borda__{classe}"] = borda
+        # área da classe em cada célula de borda (alinhada com `borda`)
+        mascaras[f"area_borda__{classe}"] = np.bincount(np.searchsorted(borda, chaves), shapely.area(recortes), len(borda))
+        resumo[classe].update({"partes": int(len(partes)), "vertices": int(shapely.get_num_coordinates(geometria)),
+                               "celulas_cheias": int(len(cheias)), "celulas_borda": int(len(borda))})
+
+    camadas = gpd.GeoDataFrame(pd.DataFrame(linhas, columns=["classe", "geometry"]), geometry="geometry", crs=CRS_METRICO)
+    camadas.to_parquet(os.path.join(diretorio, "classes.parquet"), compression="zstd")
+    pecas = pd.concat(pecas, ignore_index=True) if pecas else pd.DataFrame(columns=["classe", "celula", "geometry"])
+    gpd.GeoDataFrame(pecas, geometry="geometry", crs=CRS_METRICO).to_parquet(os.path.join(diretorio, "pecas_borda.parquet"), compression="zstd")
+    parametros = {"celula": celula, "tolerancia": tolerancia, "precisao": precisao, "classes": list(geometrias)}
+    np.savez(os.path.join(diretorio, "mascara.npz"), parametros=np.array(json.dumps(parametros)), **mascaras)
+    return resumo
+
+
+def border_pieces(partes, borda, celula=CELULA_M):
+    """Recortes das partes da classe em cada célula de borda: (chaves, geometrias), ordenados por chave."""
+    caixas = cell_boxes(borda, celula)
+    i_celula, i_parte = shapely.STRtree(partes).query(caixas, predicate="intersects")
+    recortes = shapely.intersection(caixas[i_celula], partes[i_parte])
+    validos = ~shapely.is_empty(recortes) & (shapely.area(recortes) > 0)
+    ordem = np.argsort(borda[i_celula][validos], kind="stable")
+    return borda[i_celula][validos][ordem], recortes[validos][ordem]
+
+
+# --- 3. Consulta ---
+
+class SlopeOverlay:
+    """Percentual/área de cada classe de relevo dentro de um polígono (imóvel)."""
+
+    def __init__(self, diretorio=DIR_RELEVO):
+        with np.load(os.path.join(diretorio, "mascara.npz")) as dados:
+            parametros = json.loads(str(dados["parametros"]))
+            self.celula = parametros["celula"]
+            self.classes = parametros["classes"]
+            self.cheias = {c: dados[f"cheias__{c}"] for c in self.classes}
+            self.borda = {c: dados[f"borda__{c}"] for c in self.classes}
+            self.area_borda = {c: dados[f"area_borda__{c}"] for c in self.classes}
+        pecas = read_geo_file(os.path.join(diretorio, "pecas_borda.parquet"))
+        self.pecas = {c: (g["celula"].to_numpy(), np.asarray(g.geometry.values)) for c, g in pecas.groupby("classe")}
+
+    def query(self, geometria, crs="EPSG:4674", classes=None):
+        """
+        {classe: {"area_ha", "percentual"}} para o polígono `geometria` (no `crs` informado).
+
+        Por célula: cheia no imóvel e na classe -> área da célula; cheia no
+        imóvel e borda da classe -> área pré-calculada do recorte; borda do
+        imóvel e cheia na classe -> célula ∩ imóvel; borda nos dois -> recortes ∩ imóvel.
+        """
+        imovel = gpd.GeoSeries([geometria], crs=crs).to_crs(CRS_METRICO).iloc[0]
+        area_imovel = imovel.area
+        cheias_p, borda_p = rasterize(imovel, self.celula)
+        shapely.prepare(imovel)
+        area_celula = self.celula ** 2
+        resultado = {}
+        for classe in classes or self.classes:
+            cheias_c, borda_c = self.cheias[classe], self.borda[classe]
+            area = len(np.intersect1d(cheias_p, cheias_c, assume_unique=True)) * area_celula
+            area += self.area_borda[classe][np.searchsorted(borda_c, np.intersect1d(cheias_p, borda_c, assume_unique=True))].sum()
+            so_imovel = cell_boxes(np.intersect1d(borda_p, cheias_c, assume_unique=True), self.celula)
+            area += shapely.area(shapely.intersection(so_imovel, imovel)).sum()
+            chaves, recortes = self.pecas.get(classe, (np.empty(0, np.int64), np.empty(0, object)))
+            nos_dois = recortes[np.isin(chaves, np.intersect1d(borda_p, borda_c, assume_unique=True))]
+            area += shapely.area(shapely.intersection(nos_dois, imovel)).sum()
+            area = float(area)
+            resultado[classe] = {"area_ha": area / 10_000, "percentual": 100 * area / area_imovel if area_imovel else 0.0}
+        return resultado
+
+    def percent_above_25(self, geometria, crs="EPSG:4674"):
+        """Atalho para a pergunta mais comum: % do imóvel com declividade acima de 25°."""
+        return self.query(geometria, crs, ["declividade_acima_25"])["declividade_acima_25"]["percentual"]
+
+
+# --- 4. Benchmark ---
+
+def _classe_sintetica(origem, lado_m=20_000, pixel=30, rng=None):
+    """Polígonos em "escadinha" como os de um raster de declividade vetorizado (GeoDataFrame em EPSG:5880)."""
+    rng = rng or np.random.default_rng(0)
+    n = int(lado_m // pixel)
+    centros = rng.uniform(0, lado_m, (60, 2))
+    yy, xx = np.mgrid[0:n, 0:n] * pixel
+    campo = np.zeros((n, n))
+    for cx, cy in centros:
+        campo += np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * rng.uniform(300, 1500) ** 2))
+    mascara = (campo + rng.normal(0, 0.08, campo.shape)) > 0.6
+    # cada sequência de pixels numa linha vira um retângulo; a união dá os polígonos de borda serrilhada
+    diff = np.diff(np.pad(mascara.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+    linhas_i, inicios = np.nonzero(diff == 1)
+    _, fins = np.nonzero(diff == -1)
+    x0, y0 = origem
+    caixas = shapely.box(x0 + inicios * pixel, y0 + linhas_i * pixel, x0 + fins * pixel, y0 + (linhas_i + 1) * pixel)
+    partes = shapely.get_parts(shapely.union_all(caixas))
+    return gpd.GeoDataFrame(geometry=partes, crs=CRS_METRICO)
+
+
+def _comparar(nome, original, classe, n, raio, rng):
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        inicio = time.perf_counter()
+        resumo = build_overlay(diretorio, fontes={classe: [original]})[classe]
+        print(f"[{nome}] pré-processamento em {time.perf_counter() - inicio:.2f}s | "
+              f"{len(original)} feições, {shapely.get_num_coordinates(original.geometry.values).sum()} vértices -> "
+              f"{resumo['partes']} partes, {resumo['vertices']} vértices | células cheias {resumo['celulas_cheias']}, borda {resumo['celulas_borda']}")
+        overlay = SlopeOverlay(diretorio)
+        simplificada = read_geo_file(os.path.join(diretorio, "classes.parquet")).geometry.values
+
+    metrico = original.to_crs(CRS_METRICO)
+    centros = metrico.geometry.sample(n, replace=True, random_state=42).centroid.values
+    imoveis = shapely.buffer(shapely.points(shapely.get_x(centros) + rng.normal(0, 500, n), shapely.get_y(centros) + rng.normal(0, 500, n)), rng.uniform(*raio, n))
+    imoveis_4674 = gpd.GeoSeries(imoveis, crs=CRS_METRICO).to_crs("EPSG:4674").values
+
+    inicio = time.perf_counter()
+    rapidos = np.array([overlay.query(p, classes=[classe])[classe]["percentual"] for p in imoveis_4674])
+    t_indice = (time.perf_counter() - inicio) / n
+
+    def exato(geometrias, p):
+        tocados = geometrias[shapely.STRtree(geometrias).query(p, predicate="intersects")]
+        return 100 * shapely.union_all(shapely.intersection(tocados, p)).area / p.area if len(tocados) else 0.0
+
+    originais = np.asarray(metrico.geometry.values)
+    arvore = shapely.STRtree(originais)
+    inicio = time.perf_counter()
+    ingenuos = []
+    for p in imoveis_4674:
+        p = gpd.GeoSeries([p], crs="EPSG:4674").to_crs(CRS_METRICO).iloc[0]
+        tocados = originais[arvore.query(p, predicate="intersects")]
+        ingenuos.append(100 * shapely.union_all(shapely.intersection(tocados, p)).area / p.area if len(tocados) else 0.0)
+    t_ingenuo = (time.perf_counter() - inicio) / n
+
+    projetados = gpd.GeoSeries(imoveis_4674, crs="EPSG:4674").to_crs(CRS_METRICO).values
+    refinamento = np.abs(rapidos - np.array([exato(simplificada, p) for p in projetados])).max()
+    simplificacao = np.abs(rapidos - np.array(ingenuos))
+    print(f"[{nome}] máscara + refinamento: {t_indice * 1000:.2f} ms/imóvel | polígonos originais: {t_ingenuo * 1000:.2f} ms/imóvel "
+          f"({t_ingenuo / t_indice:.1f}x)")
+    print(f"[{nome}] diferença para a geometria simplificada: {refinamento:.2e} p.p. | efeito da simplificação: "
+          f"média {simplificacao.mean():.3f} p.p., máx {simplificacao.max():.3f} p.p.")
+
+
+def bench(n=200):
+    from base_readers import DIR_LOCAL
+
+    rng = np.random.default_rng(42)
+    topo = read_geo_file(os.path.join(DIR_LOCAL, "app_topo_morro.geojson"))
+    _comparar("app_topo_morro", topo, "app_topo_morro", n, (1000, 4000), rng)
+    x, y = shapely.get_coordinates(topo.to_crs(CRS_METRICO).geometry.values[0])[0]
+    _comparar("declividade sintética 30 m", _classe_sintetica((x, y)), "declividade_acima_45", n, (1000, 4000), rng)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Camada pré-processada de restrições de relevo.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    gerar = sub.add_parser("build")
+    gerar.add_argument("--destino", default=DIR_RELEVO)
+    gerar.add_argument("--celula", type=float, default=CELULA_M)
+    gerar.add_argument("--tolerancia", type=float, default=TOLERANCIA_M)
+    sub.add_parser("bench")
+    args = parser.parse_args()
+
+    if args.comando == "build":
+        resumo = build_overlay(args.destino, celula=args.celula, tolerancia=args.tolerancia)
+        for classe, info in resumo.items():
+            print(f"✅ {classe}: {info}")
+    else:
+        bench()
+
+
+if __name__ == "__main__":
+    main()
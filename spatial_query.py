@@ -0,0 +1,148 @@
+# spatial_query.py
+# Consulta espacial em lote: "quais restrições tocam estes imóveis?"
+#
+# Cada camada é carregada uma vez e ganha um índice STRtree sobre as geometrias.
+# Muitas geometrias de entrada são consultadas de uma só vez (intersects ou
+# distância máxima) e os resultados saem agrupados por camada, rotulados com
+# "colunas_nome", "mapeamento" e "dicionario" de config_bases.py.
+#
+# Benchmark: python spatial_query.py bench [N_POLIGONOS]
+
+import sys
+import time
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from attribute_resolver import AttributeResolver
+from base_readers import read_base, read_geo_file
+
+CRS_METRICO = "EPSG:5880"  # SIRGAS 2000 / Brazil Polyconic, para distâncias em metros
+
+
+# --- 1. Índice por camada ---
+
+class LayerIndex:
+    """Camada carregada com seu STRtree (e uma versão métrica, criada só se houver consulta por distância)."""
+
+    def __init__(self, nome, gdf, base=None):
+        self.nome = nome
+        self.gdf = gdf.reset_index(drop=True)
+        self.base = base
+        self.geometrias = self.gdf.geometry.values
+        self.tree = shapely.STRtree(np.asarray(self.geometrias))
+        self.rotulos = AttributeResolver(base).compile(list(self.gdf.columns))
+        self._tree_metrico = None
+
+    def tree_metrico(self):
+        if self._tree_metrico is None:
+            self._tree_metrico = shapely.STRtree(np.asarray(self.gdf.geometry.to_crs(CRS_METRICO).values))
+        return self._tree_metrico
+
+    def query(self, geometrias, predicate="intersects", distancia_m=None):
+        """Pares (índice da entrada, índice da feição) que satisfazem o predicado."""
+        if distancia_m is not None:
+            geoms = np.asarray(gpd.GeoSeries(geometrias, crs=self.gdf.crs).to_crs(CRS_METRICO).values)
+            return self.tree_metrico().query(geoms, predicate="dwithin", distance=distancia_m)
+        return self.tree.query(np.asarray(geometrias), predicate=predicate)
+
+    def labels(self, feicoes):
+        """DataFrame de rótulos para as feições indicadas (resolução vetorizada, ver attribute_resolver.py)."""
+        selecao = self.gdf[self.rotulos.columns()].take(feicoes).reset_index(drop=True)
+        return self.rotulos.resolve(selecao)
+
+
+# --- 2. Motor de consulta ---
+
+class SpatialQueryEngine:
+    """Conjunto de camadas indexadas, consultadas em lote."""
+
+    def __init__(self):
+        self.camadas = {}
+
+    def add_layer(self, nome, gdf, base=None):
+        self.camadas[nome] = LayerIndex(nome, gdf, base)
+        return self.camadas[nome]
+
+    def add_base(self, base, **kwargs):
+        """Carrega uma base de config_bases.py (GeoParquet/GeoJSON/ZIP, local ou do cache)."""
+        return self.add_layer(base["nome"], read_base(base, **kwargs), base)
+
+    def add_file(self, nome, caminho, base=None):
+        """Carrega um arquivo local (ex.: GeoParquet gerado por arcgis_extract.py / wfs_client.py)."""
+        return self.add_layer(nome, read_geo_file(caminho), base)
+
+    def query(self, geometrias, predicate="intersects", distancia_m=None, crs=None, camadas=None):
+        """
+        Consulta todas as camadas (ou só `camadas`) de uma vez.
+
+        `geometrias` é uma sequência/GeoSeries; se `crs` for informado (ou vier na
+        GeoSeries), as entradas são reprojetadas para o CRS de cada camada.
+        `distancia_m` troca o predicado por "a até N metros". Retorna
+        {camada: DataFrame[entrada, feicao, nome, legenda, ...detalhes]} só com camadas que tiveram resultado.
+        """
+        serie = geometrias if isinstance(geometrias, gpd.GeoSeries) else gpd.GeoSeries(list(geometrias), crs=crs)
+        resultados = {}
+        for nome in camadas or self.camadas:
+            camada = self.camadas[nome]
+            entrada = serie.to_crs(camada.gdf.crs) if serie.crs and camada.gdf.crs and serie.crs != camada.gdf.crs else serie
+            pares = camada.query(entrada.values, predicate=predicate, distancia_m=distancia_m)
+            if pares.shape[1] == 0:
+                continue
+            ordem = np.lexsort((pares[1], pares[0]))
+            entradas, feicoes = pares[0][ordem], pares[1][ordem]
+            df = camada.labels(feicoes)
+            df.insert(0, "feicao", feicoes)
+            df.insert(0, "entrada", entradas)
+            resultados[nome] = df
+        return resultados
+
+
+# --- 3. Benchmark ---
+
+def _poligonos_aleatorios(limites, n, tamanho=0.01, semente=42):
+    rng = np.random.default_rng(semente)
+    xmin, ymin, xmax, ymax = limites
+    x = rng.uniform(xmin, xmax, n)
+    y = rng.uniform(ymin, ymax, n)
+    return shapely.box(x, y, x + tamanho, y + tamanho)
+
+
+def bench(n=10_000):
+    import os
+    from base_readers import DIR_LOCAL
+
+    motor = SpatialQueryEngine()
+    for nome, arquivo in [("APP Topo de Morro", "app_topo_morro.geojson"), ("Focos MS 2022", "MS_2022.geoparquet")]:
+        inicio = time.perf_counter()
+        camada = motor.add_file(nome, os.path.join(DIR_LOCAL, arquivo))
+        print(f"{nome}: {len(camada.gdf)} feições, carga + índice em {time.perf_counter() - inicio:.2f}s")
+
+    for nome, camada in motor.camadas.items():
+        poligonos = _poligonos_aleatorios(camada.gdf.total_bounds, n)
+        inicio = time.perf_counter()
+        res = motor.query(poligonos, crs=camada.gdf.crs, camadas=[nome])
+        tempo = time.perf_counter() - inicio
+        hits = len(res.get(nome, []))
+        print(f"{nome}: {n} polígonos intersects em {tempo * 1000:.0f} ms ({n / tempo:,.0f}/s), {hits} pares")
+
+        inicio = time.perf_counter()
+        res = motor.query(poligonos, crs=camada.gdf.crs, camadas=[nome], distancia_m=1000)
+        tempo = time.perf_counter() - inicio
+        print(f"{nome}: {n} polígonos a até 1 km em {tempo * 1000:.0f} ms ({n / tempo:,.0f}/s), {len(res.get(nome, []))} pares")
+
+        # Referência: laço ingênuo (uma geometria por vez, sem índice), numa amostra
+        amostra = poligonos[:200]
+        inicio = time.perf_counter()
+        for p in amostra:
+            shapely.intersects(p, camada.geometrias).nonzero()
+        tempo = (time.perf_counter() - inicio) / len(amostra) * n
+        print(f"{nome}: laço sem índice estimado para {n}: {tempo * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 10_000)
+    else:
+        print("Uso: python spatial_query.py bench [N_POLIGONOS]")
@@ -0,0 +1,92 @@
+# startup_bench.py
+# Tempo até a primeira tela e latência por interação dos apps Streamlit (config_wizard.py, base_check.py).
+#
+# Cada app roda num processo novo (imports frios) pelo AppTest do Streamlit:
+#   - primeira execução do script = primeira tela (inclui os imports do app)
+#   - reexecuções sem mudança = custo fixo de cada interação
+#   - no wizard, troca de categoria (cada uma monta só a sua aba)
+# e lista quais bibliotecas pesadas já estavam carregadas depois da primeira tela.
+# Nenhuma requisição é feita: as amostras só são buscadas ao clicar.
+#
+# Uso: python startup_bench.py [--reruns 10] [--ref REV]
+#      --ref compara com uma revisão do git (extraída com git archive num diretório temporário)
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APPS = ("config_wizard.py", "base_check.py")
+PESADAS = ("pandas", "geopandas", "pyogrio", "fiona", "shapely", "pyarrow", "requests", "urllib3")
+
+
+def _medir(diretorio, app, reruns):
+    sys.path.insert(0, diretorio)
+    inicio = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    t_streamlit = time.perf_counter() - inicio
+
+    at = AppTest.from_file(os.path.join(diretorio, app), default_timeout=120)
+    inicio = time.perf_counter()
+    at.run()
+    primeira = time.perf_counter() - inicio
+    carregadas = [m for m in PESADAS if m in sys.modules]
+
+    tempos = []
+    for _ in range(reruns):
+        inicio = time.perf_counter()
+        at.run()
+        tempos.append(time.perf_counter() - inicio)
+
+    trocas = []
+    if at.button_group:  # wizard: percorre as categorias
+        # `options` vem sem o ícone (ex.: "💾 ..."); o valor aceito é o rótulo completo
+        rotulos = [" ".join(filter(None, (o.content_icon, o.content))) for o in at.button_group[0].proto.options]
+        for rotulo in rotulos[1:]:
+            anterior = at.header[0].value if at.header else None
+            inicio = time.perf_counter()
+            at.button_group[0].set_value(rotulo).run()
+            trocas.append(time.perf_counter() - inicio)
+            atual = at.header[0].value if at.header else None
+            assert at.button_group[0].value == rotulo and atual != anterior, f"a aba '{rotulo}' não foi montada"
+    elif at.tabs:  # versão com st.tabs: não há troca no servidor, toda reexecução monta todas as abas
+        trocas = tempos
+
+    linha = (f"{app:18s} import streamlit {t_streamlit * 1000:5.0f} ms | primeira tela {primeira * 1000:6.0f} ms | "
+             f"reexecução mediana {statistics.median(tempos) * 1000:5.0f} ms")
+    if trocas:
+        linha += f" | troca de aba mediana {statistics.median(trocas) * 1000:5.0f} ms"
+    print(linha)
+    print(f"{'':18s} carregadas na primeira tela: {', '.join(carregadas) or '-'}")
+
+
+def _rodar(diretorio, reruns, rotulo):
+    print(f"--- {rotulo} ---")
+    for app in APPS:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "_medir", diretorio, app, str(reruns)],
+                       check=True, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo até a primeira tela e por interação dos apps Streamlit.")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--ref", help="revisão do git para comparar (ex.: HEAD~1)")
+    args = parser.parse_args()
+
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    if args.ref:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            arquivo = subprocess.run(["git", "-C", diretorio, "archive", args.ref], check=True, capture_output=True).stdout
+            subprocess.run(["tar", "-x", "-C", temp_dir], input=arquivo, check=True)
+            _rodar(temp_dir, args.reruns, args.ref)
+    _rodar(diretorio, args.reruns, "árvore atual")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["_medir"]:
+        _medir(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
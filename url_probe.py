@@ -0,0 +1,243 @@
+# url_probe.py
+# Verificação concorrente das URLs de config_bases.py (usado pelo health_monitor.py).
+
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+
+from host_breaker import CircuitOpen, get_board
+from http_async import domain_limit, sync_session
+
+# --- PARÂMETROS PADRÃO ---
+MAX_WORKERS = 16      # Threads simultâneas no total
+MAX_POR_HOST = 4      # Conexões simultâneas por host (pinms.ms.gov.br limita bastante)
+TIMEOUT = 10          # Teto em segundos por requisição (host_breaker reduz pela latência recente do host)
+LIMITE_LEITURA = 16 * 1024  # Máximo de bytes lidos do corpo numa sondagem (GetCapabilities pode ser enorme)
+
+
+# --- 1. Pool de Conexões por Host ---
+
+class HostPool:
+    """Sessão HTTP compartilhada com limite de conexões simultâneas por host."""
+
+    def __init__(self, max_por_host=MAX_POR_HOST):
+        self.max_por_host = max_por_host
+        self.session = sync_session(max_por_host)
+        self._lock = threading.Lock()
+        self._semaforos = {}
+
+    def limite(self, url):
+        """Retorna o semáforo do host da URL (criado sob demanda; domínios em LIMITES_POR_DOMINIO podem ter limite menor)."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaforos:
+                self._semaforos[host] = threading.BoundedSemaphore(min(self.max_por_host, domain_limit(url, self.max_por_host)))
+            return self._semaforos[host]
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- 2. Sondagem por Tipo de Fonte ---
+# Em vez de baixar a URL inteira, cada tipo de fonte usa a requisição mais leve que prova que ela responde:
+#   ESTATICO -> HEAD (ou GET de 1 byte via Range, se o servidor recusar HEAD)
+#   ARCGIS   -> metadados da camada/serviço com ?f=json (sem /query, /exportImage, /export)
+#   WFS      -> GetCapabilities (lido apenas até LIMITE_LEITURA)
+
+SUFIXOS_ARCGIS = ("/query", "/exportImage", "/export")
+
+
+def classify_url(url, layer_name=None):
+    """Define o tipo de sondagem para a URL: 'WFS', 'ARCGIS' ou 'ESTATICO'."""
+    if layer_name:
+        return "WFS"
+    if "/rest/services/" in url:
+        return "ARCGIS"
+    return "ESTATICO"
+
+
+def _ler_parcial(response, limite=LIMITE_LEITURA):
+    """Lê no máximo `limite` bytes do corpo e fecha a conexão. Retorna os bytes lidos."""
+    dados = b""
+    try:
+        for chunk in response.iter_content(chunk_size=4096):
+            dados += chunk
+            if len(dados) >= limite:
+                break
+    finally:
+        response.close()
+    return dados[:limite]
+
+
+def _status_http(codigo):
+    """Traduz o código HTTP na mensagem exibida pelo verificador."""
+    # Códigos 2xx (Sucesso) indicam que a URL está OK (206 = resposta parcial do Range)
+    if 200 <= codigo < 300:
+        return f"🟢 ONLINE ({codigo})"
+    # Códigos 3xx (Redirecionamento) também podem ser considerados OK
+    elif 300 <= codigo < 400:
+        return f"🟡 REDIRECIONAMENTO ({codigo})"
+    # Códigos 4xx (Erro do Cliente) e 5xx (Erro do Servidor) indicam problemas
+    return f"🔴 ERRO HTTP ({codigo})"
+
+
+def _sondar_estatico(session, url, timeout):
+    r = session.head(url, timeout=timeout, allow_redirects=True)
+    if r.status_code < 400:
+        return "HEAD", r.status_code, 0, None
+    # Alguns servidores não aceitam HEAD: pede só o primeiro byte
+    r = session.get(url, timeout=timeout, headers={"Range": "bytes=0-0"}, stream=True)
+    dados = _ler_parcial(r, limite=1)
+    return "GET Range", r.status_code, len(dados), None
+
+
+def _sondar_arcgis(session, url, timeout):
+    base = url.rstrip("/")
+    for sufixo in SUFIXOS_ARCGIS:
+        if base.endswith(sufixo):
+            base = base[: -len(sufixo)]
+            break
+    r = session.get(base, params={"f": "json"}, timeout=timeout, stream=True)
+    dados = _ler_parcial(r)
+    erro = None
+    # O ArcGIS responde 200 mesmo quando o serviço falha; o erro vem no JSON
+    if r.status_code == 200 and b'"error"' in dados[:200]:
+        erro = "🔴 ERRO ARCGIS"
+    return "GET ?f=json", r.status_code, len(dados), erro
+
+
+def _sondar_wfs(session, url, timeout):
+    params = {"service": "WFS", "request": "GetCapabilities"}
+    r = session.get(url, params=params, timeout=timeout, stream=True)
+    dados = _ler_parcial(r)
+    erro = None
+    if r.status_code == 200 and b"ExceptionReport" in dados:
+        erro = "🔴 ERRO WFS"
+    return "GetCapabilities", r.status_code, len(dados), erro
+
+
+SONDAS = {"ESTATICO": _sondar_estatico, "ARCGIS": _sondar_arcgis, "WFS": _sondar_wfs}
+
+
+def probe_url(session, url, layer_name=None, timeout=TIMEOUT):
+    """
+    Sonda a URL com o método adequado ao tipo de fonte.
+
+    Retorna um dicionário com Status, Cód., Método, Bytes (corpo transferido)
+    e Latência (ms).
+    """
+    tipo = classify_url(url, layer_name)
+    inicio = time.perf_counter()
+    try:
+        # timeout adaptativo pela latência recente do host; `timeout` é só o teto
+        with get_board().guard(url, timeout) as chamada:
+            metodo, codigo, n_bytes, erro = SONDAS[tipo](session, url, chamada.timeout)
+            chamada.done(codigo)
+        status = erro or _status_http(codigo)
+    except CircuitOpen as e:
+        # Host com falhas seguidas: nem tenta (não segura a thread até o timeout)
+        metodo, codigo, n_bytes, status = tipo, f"nova tentativa em {e.reabre_em:.0f} s", 0, "⛔ DISJUNTOR ABERTO"
+    except requests.exceptions.RequestException as e:
+        # Captura erros de conexão, timeout, SSL, etc.
+        metodo, codigo, n_bytes, status = tipo, str(e), 0, "❌ ERRO DE CONEXÃO"
+    return {
+        "Status": status,
+        "Cód.": codigo,
+        "Método": metodo,
+        "Bytes": n_bytes,
+        "Latência (ms)": round((time.perf_counter() - inicio) * 1000),
+    }
+
+
+# --- 3. Checagem Concorrente ---
+
+def _intercalar_por_host(items):
+    """Ordena os índices em rodízio entre hosts, para não ocupar todas as threads com um só servidor."""
+    filas = defaultdict(deque)
+    for i, item in enumerate(items):
+        filas[urlsplit(item["URL"]).netloc].append(i)
+    ordem = []
+    while filas:
+        for host in list(filas):
+            ordem.append(filas[host].popleft())
+            if not filas[host]:
+                del filas[host]
+    return ordem
+
+
+def check_urls(items, on_result=None, max_workers=MAX_WORKERS, max_por_host=MAX_POR_HOST, timeout=TIMEOUT):
+    """
+    Sonda uma lista de itens ({"URL": ..., "layer_name": opcional}) em paralelo.
+
+    `on_result(concluidos, total, indice, resultado)` é chamado na thread de quem
+    chamou a função (seguro para atualizar a UI do Streamlit) à medida que cada
+    checagem termina. Retorna os resultados na mesma ordem de `items`.
+    """
+    total = len(items)
+    resultados = [None] * total
+    if not total:
+        return resultados
+
+    with HostPool(max_por_host) as pool:
+
+        def tarefa(i):
+            url = items[i]["URL"]
+            with pool.limite(url):
+                return probe_url(pool.session, url, items[i].get("layer_name"), timeout)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futuros = {executor.submit(tarefa, i): i for i in _intercalar_por_host(items)}
+            for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+                i = futuros[futuro]
+                resultados[i] = futuro.result()
+                if on_result:
+                    on_result(concluidos, total, i, resultados[i])
+
+    return resultados
+
+
+# --- 4. Demonstração ---
+# Hosts locais (host_breaker.StubServer) com atrasos fixos diferentes: em sequência o
+# tempo é a soma de todas as sondagens; com check_urls, fica perto do host mais lento.
+
+def demo(latencias=(0.1, 0.2, 0.3, 0.8), urls_por_host=4):
+    from contextlib import ExitStack
+
+    from host_breaker import StubServer
+
+    with ExitStack() as pilha:
+        stubs = [pilha.enter_context(StubServer(latencia=s)) for s in latencias]
+        items = [{"URL": f"{stub.url}/camada/{i}"} for stub in stubs for i in range(urls_por_host)]
+
+        inicio = time.perf_counter()
+        with HostPool() as pool:
+            sequencial = [probe_url(pool.session, item["URL"]) for item in items]
+        t_sequencial = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        concorrente = check_urls(items, max_por_host=urls_por_host)
+        t_concorrente = time.perf_counter() - inicio
+
+    assert all(r["Status"].startswith("🟢") for r in sequencial + concorrente)
+    print(f"{len(items)} URLs em {len(stubs)} hosts (atrasos {', '.join(f'{s:.1f}' for s in latencias)} s)")
+    print(f"  em sequência: {t_sequencial:5.2f} s (soma dos atrasos: {sum(latencias) * urls_por_host:.1f} s)")
+    print(f"  check_urls:   {t_concorrente:5.2f} s (host mais lento: {max(latencias):.1f} s)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:2] == ["demo"]:
+        demo()
+    else:
+        print("Uso: python url_probe.py demo")
@@ -0,0 +1,411 @@
+# vector_tiles.py
+# Tiles vetoriais (Mapbox Vector Tiles) pré-gerados das camadas grandes de polígonos,
+# gravados em MBTiles e servidos por um endpoint HTTP local.
+#
+# Vegetação, Solos e Geologia 1:250k (BASES_CLASSIFICACAO) e o MS_2022.geoparquet
+# cobrem o estado inteiro: mandar o GeoJSON cru para o navegador são vários MB a
+# cada visualização. Aqui, para cada nível de zoom:
+#   - a camada (em EPSG:3857) é simplificada com tolerância de TOLERANCIA_PX
+#     pixel de tela daquele zoom. Se os polígonos formam uma cobertura válida
+#     (vizinhos dividem a mesma borda, sem sobreposição), usa
+#     shapely.coverage_simplify, que simplifica cada borda compartilhada uma
+#     vez só (sem frestas nem sobreposições entre vizinhos); senão, cada feição
+#     é simplificada preservando a topologia dela
+#   - feições menores que um pixel somem daquele zoom
+#   - a grade XYZ (a mesma de raster_tiles.py) é recortada com margem de
+#     BUFFER unidades, codificada em MVT (extensão 4096) e gravada com gzip
+# Só as colunas de nome/legenda da camada vão para os tiles. O arquivo é montado
+# como .part e trocado no fim: o servidor nunca lê um MBTiles pela metade.
+#
+# O servidor responde TileJSON em /NOME.json e os tiles em /NOME/{z}/{x}/{y}.pbf
+# (Content-Encoding: gzip; 204 para tile vazio), com CORS liberado para o mapa
+# do navegador.
+#
+# Requer mapbox-vector-tile (só para gerar; o servidor não precisa).
+#
+# Uso: python vector_tiles.py build [NOME ...] [--zoom 4 12]
+#      python vector_tiles.py serve [--porta 8765]
+
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from config_bases import BASES_CLASSIFICACAO
+from disk_cache import CACHE_DIR
+from raster_tiles import ORIGEM, TAMANHO_TILE, tiles_for_bbox
+
+DIR_VETORES = os.path.join(CACHE_DIR, "vector_tiles")
+CAMADAS_PADRAO = tuple(b["nome"] for b in BASES_CLASSIFICACAO) + ("MS_2022.geoparquet",)
+
+EXTENSAO = 4096        # unidades por tile no MVT
+BUFFER = 64            # margem do recorte (unidades), evita costuras entre tiles
+TOLERANCIA_PX = 0.5    # erro máximo da simplificação, em pixels de tela (tile de 256 px)
+ZOOM_PADRAO = (4, 12)  # 1:250k não tem detalhe além do z12; o mapa amplia o z12 daí em diante
+TILES_POR_LOTE = 512
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+"""
+
+
+def _nome_arquivo(nome):
+    return re.sub(r"[^\w.-]+", "_", nome).strip("_")
+
+
+def resolution(z):
+    """Metros (EPSG:3857) por pixel de tela no zoom z."""
+    return 2 * ORIGEM / (2 ** z) / TAMANHO_TILE
+
+
+# --- 1. Leitura e simplificação ---
+
+def load_layer(nome, colunas=None):
+    """
+    (GeoDataFrame em EPSG:3857, colunas mantidas, estilo, id) de uma camada do
+    registro (pelo nome) ou de um arquivo local (caminho ou nome no diretório do projeto).
+    O id (nome do arquivo de origem, sem extensão) nomeia o MBTiles e a camada dentro dos tiles.
+    `colunas` substitui as colunas de nome/legenda do registro (arquivos locais não têm nenhuma).
+    """
+    from base_readers import DIR_LOCAL, read_base, read_geo_file
+    from layer_registry import get_registry
+
+    camada = get_registry().get(nome)
+    if camada is not None:
+        gdf = read_base(camada.config)
+        colunas = colunas or list(camada.colunas_nome) + list(camada.mapeamento.get("legenda", []))
+        estilo = camada.estilo
+        origem = urlsplit(camada.url).path
+    else:
+        caminho = nome if os.path.exists(nome) else os.path.join(DIR_LOCAL, nome)
+        if not os.path.exists(caminho):
+            raise ValueError("não é uma camada do registro nem um arquivo local")
+        gdf = read_geo_file(caminho)
+        colunas, estilo, origem = colunas or [], None, caminho
+    if gdf.crs is None:
+        gdf = gdf.set_crs(4326)
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty].to_crs(3857)
+    colunas = [c for c in dict.fromkeys(colunas) if c in gdf.columns]
+    id_camada = _nome_arquivo(os.path.splitext(os.path.basename(origem))[0])
+    return gdf, colunas, estilo, id_camada
+
+
+def is_coverage(geometrias):
+    """Polígonos que formam uma cobertura válida (bordas compartilhadas exatamente, sem sobreposição)."""
+    import shapely
+
+    tipos = set(shapely.get_type_id(geometrias))
+    return tipos <= {3, 6} and bool(shapely.coverage_is_valid(geometrias))
+
+
+def simplify(geometrias, z, cobertura):
+    """Geometrias simplificadas para o zoom z (array na mesma ordem; vazias onde a feição some)."""
+    import shapely
+
+    tolerancia = TOLERANCIA_PX * resolution(z)
+    if cobertura:
+        simplificadas = shapely.coverage_simplify(geometrias, tolerancia)
+    else:
+        simplificadas = shapely.simplify(geometrias, tolerancia, preserve_topology=True)
+    # feições de menos de um pixel nas duas direções não aparecem nesse zoom
+    xmin, ymin, xmax, ymax = shapely.bounds(geometrias).T
+    pixel = resolution(z)
+    pontual = shapely.get_type_id(geometrias) == 0
+    some = ~pontual & (xmax - xmin < pixel) & (ymax - ymin < pixel)
+    simplificadas[some] = shapely.from_wkt("POLYGON EMPTY")
+    return simplificadas
+
+
+def _propriedades(registros):
+    # MVT aceita texto, número e booleano; nulos ficam de fora
+    propriedades = []
+    for registro in registros:
+        p = {}
+        for coluna, valor in registro.items():
+            if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+                continue
+            if hasattr(valor, "item"):  # escalares numpy
+                valor = valor.item()
+            p[coluna] = valor if isinstance(valor, (str, int, float, bool)) else str(valor)
+        propriedades.append(p)
+    return propriedades
+
+
+# --- 2. Geração dos tiles ---
+
+def _tile_bounds_buffer(z, x, y):
+    lado = 2 * ORIGEM / (2 ** z)
+    xmin, ymax = -ORIGEM + x * lado, ORIGEM - y * lado
+    margem = lado * BUFFER / EXTENSAO
+    return (xmin, ymax - lado, xmin + lado, ymax), margem
+
+
+def _codificador():
+    """Módulo mapbox_vector_tile (opcional; só quem gera tiles precisa dele)."""
+    try:
+        import mapbox_vector_tile
+        import mapbox_vector_tile.encoder
+    except ImportError:
+        raise ImportError("Biblioteca 'mapbox-vector-tile' não instalada. Instale com pip install mapbox-vector-tile")
+    return mapbox_vector_tile
+
+
+def encode_tile(id_camada, geometrias, propriedades, limites):
+    """MVT (bytes, sem gzip) de uma camada só; `geometrias` já recortadas em EPSG:3857."""
+    mapbox_vector_tile = _codificador()
+    on_invalid_geometry_make_valid = mapbox_vector_tile.encoder.on_invalid_geometry_make_valid
+    return mapbox_vector_tile.encode(
+        [{"name": id_camada, "features": [{"geometry": g, "properties": p} for g, p in zip(geometrias, propriedades)]}],
+        default_options={"quantize_bounds": limites, "extents": EXTENSAO, "on_invalid_geometry": on_invalid_geometry_make_valid},
+    )
+
+
+def iter_tiles(id_camada, geometrias, propriedades, limites_lonlat, z):
+    """(z, x, y, bytes com gzip) dos tiles não vazios do zoom z."""
+    import shapely
+
+    arvore = shapely.STRtree(geometrias)
+    for _, x, y in tiles_for_bbox(limites_lonlat, z):
+        limites, margem = _tile_bounds_buffer(z, x, y)
+        xmin, ymin, xmax, ymax = limites
+        candidatos = arvore.query(shapely.box(xmin - margem, ymin - margem, xmax + margem, ymax + margem))
+        if not len(candidatos):
+            continue
+        candidatos.sort()
+        recortes = shapely.clip_by_rect(geometrias[candidatos], xmin - margem, ymin - margem, xmax + margem, ymax + margem)
+        manter = ~shapely.is_empty(recortes)
+        if not manter.any():
+            continue
+        dados = encode_tile(id_camada, recortes[manter], [propriedades[i] for i in candidatos[manter]], limites)
+        yield z, x, y, gzip.compress(dados, 6)
+
+
+def build(nome, zooms=ZOOM_PADRAO, diretorio=DIR_VETORES, colunas=None):
+    """Gera o MBTiles da camada para os zooms [min, max]. Retorna o caminho e estatísticas por zoom."""
+    import shapely
+
+    _codificador()  # falha antes de ler a camada, não no primeiro tile
+    inicio = time.perf_counter()
+    gdf, colunas, estilo, id_camada = load_layer(nome, colunas)
+    geometrias = gdf.geometry.to_numpy()
+    invalidas = ~shapely.is_valid(geometrias)
+    geometrias[invalidas] = shapely.make_valid(geometrias[invalidas])
+    propriedades = _propriedades(gdf[colunas].to_dict("records")) if colunas else [{}] * len(gdf)
+    limites_lonlat = tuple(gdf.geometry.to_crs(4326).total_bounds)
+    cobertura = is_coverage(geometrias)
+
+    os.makedirs(diretorio, exist_ok=True)
+    destino = os.path.join(diretorio, id_camada + ".mbtiles")
+    temp = destino + ".part"
+    if os.path.exists(temp):
+        os.remove(temp)
+    estatisticas = []
+    con = sqlite3.connect(temp)
+    try:  # qualquer falha (inclusive Ctrl+C) remove o .part
+        con.executescript(_SCHEMA)
+        for z in range(zooms[0], zooms[1] + 1):
+            simplificadas = simplify(geometrias, z, cobertura)
+            vivas = ~shapely.is_empty(simplificadas)
+            lote, n, total, maior = [], 0, 0, 0
+            for z_, x, y, dados in iter_tiles(id_camada, simplificadas[vivas],
+                                              [p for p, v in zip(propriedades, vivas) if v], limites_lonlat, z):
+                lote.append((z_, x, (2 ** z_) - 1 - y, sqlite3.Binary(dados)))  # tile_row no esquema TMS
+                n, total, maior = n + 1, total + len(dados), max(maior, len(dados))
+                if len(lote) >= TILES_POR_LOTE:
+                    con.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", lote)
+                    lote = []
+            con.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", lote)
+            con.commit()
+            estatisticas.append({"zoom": z, "tiles": n, "feicoes": int(vivas.sum()),
+                                 "media_kb": total / n / 1024 if n else 0, "maior_kb": maior / 1024})
+        xmin, ymin, xmax, ymax = limites_lonlat
+        campos = {c: "Number" if gdf[c].dtype.kind in "iuf" else "String" for c in colunas}
+        metadados = {
+            "name": id_camada if os.path.exists(nome) else nome,
+            "format": "pbf",
+            "type": "overlay",
+            "version": "1.1",
+            "minzoom": zooms[0],
+            "maxzoom": zooms[1],
+            "bounds": f"{xmin},{ymin},{xmax},{ymax}",
+            "center": f"{(xmin + xmax) / 2},{(ymin + ymax) / 2},{zooms[0]}",
+            "description": "simplificação " + ("de cobertura" if cobertura else "por feição"),
+            "json": json.dumps({"vector_layers": [{"id": id_camada, "fields": campos,
+                                                   "minzoom": zooms[0], "maxzoom": zooms[1]}]}),
+        }
+        if estilo:
+            metadados["style"] = json.dumps(estilo)
+        con.executemany("INSERT INTO metadata VALUES (?, ?)", [(k, str(v)) for k, v in metadados.items()])
+        con.commit()
+        con.close()
+        os.replace(temp, destino)
+    except BaseException:
+        con.close()
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return destino, {"cobertura": cobertura, "segundos": time.perf_counter() - inicio, "zooms": estatisticas}
+
+
+# --- 3. Leitura do MBTiles ---
+
+class VectorTileSet:
+    """Um MBTiles gerado por build(), aberto só para leitura."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.id = os.path.splitext(os.path.basename(caminho))[0]
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+        try:
+            yield con
+        finally:
+            con.close()
+
+    def metadata(self):
+        with self._conectar() as con:
+            return dict(con.execute("SELECT name, value FROM metadata"))
+
+    def tile(self, z, x, y):
+        """Bytes (gzip) do tile XYZ, ou None se não houver nada nele."""
+        with self._conectar() as con:
+            linha = con.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, (2 ** z) - 1 - y),
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def tilejson(self, base_url):
+        m = self.metadata()
+        tilejson = {
+            "tilejson": "3.0.0",
+            "name": m.get("name", self.id),
+            "tiles": [f"{base_url}/{self.id}/{{z}}/{{x}}/{{y}}.pbf"],
+            "minzoom": int(m["minzoom"]),
+            "maxzoom": int(m["maxzoom"]),
+            "bounds": [float(v) for v in m["bounds"].split(",")],
+            "vector_layers": json.loads(m["json"])["vector_layers"],
+        }
+        if "style" in m:
+            tilejson["style"] = json.loads(m["style"])
+        return tilejson
+
+
+def tilesets(diretorio=DIR_VETORES):
+    """{id: VectorTileSet} dos MBTiles prontos no diretório."""
+    if not os.path.isdir(diretorio):
+        return {}
+    return {
+        os.path.splitext(arquivo)[0]: VectorTileSet(os.path.join(diretorio, arquivo))
+        for arquivo in sorted(os.listdir(diretorio)) if arquivo.endswith(".mbtiles")
+    }
+
+
+# --- 4. Endpoint local ---
+
+_TILE = re.compile(r"^/([\w.-]+)/(\d+)/(\d+)/(\d+)\.pbf$")
+
+
+def make_server(porta=8765, diretorio=DIR_VETORES, host="127.0.0.1"):
+    """Servidor HTTP dos tiles (ThreadingHTTPServer); chame serve_forever()."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _responder(self, status, corpo=b"", tipo="application/json", extras=None):
+            self.send_response(status)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if corpo:
+                self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(corpo)))
+            for nome, valor in (extras or {}).items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(corpo)
+
+        def do_GET(self):
+            caminho = urlsplit(self.path).path
+            conjuntos = tilesets(diretorio)  # relido a cada pedido: um build novo aparece sem reiniciar
+            base_url = f"http://{self.headers.get('Host') or f'{host}:{porta}'}"
+            achado = _TILE.match(caminho)
+            if achado:
+                conjunto = conjuntos.get(achado.group(1))
+                if conjunto is None:
+                    return self._responder(404, b'{"erro": "camada desconhecida"}')
+                dados = conjunto.tile(*map(int, achado.groups()[1:]))
+                if dados is None:
+                    return self._responder(204)
+                return self._responder(200, dados, "application/x-protobuf",
+                                       {"Content-Encoding": "gzip", "Cache-Control": "public, max-age=86400"})
+            if caminho.endswith(".json") and caminho[1:-5] in conjuntos:
+                return self._responder(200, json.dumps(conjuntos[caminho[1:-5]].tilejson(base_url)).encode())
+            if caminho in ("/", "/index.json"):
+                indice = {id_: f"{base_url}/{id_}.json" for id_ in conjuntos}
+                return self._responder(200, json.dumps(indice, ensure_ascii=False).encode())
+            self._responder(404, b'{"erro": "caminho desconhecido"}')
+
+        do_HEAD = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Handler)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera e serve tiles vetoriais (MVT em MBTiles) das camadas grandes.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    gerar = sub.add_parser("build")
+    gerar.add_argument("nomes", nargs="*", default=list(CAMADAS_PADRAO),
+                       help="camadas do registro ou arquivos locais (padrão: classificação + MS_2022.geoparquet)")
+    gerar.add_argument("--zoom", nargs=2, type=int, default=list(ZOOM_PADRAO), metavar=("MIN", "MAX"))
+    gerar.add_argument("--colunas", nargs="+", help="atributos levados aos tiles (padrão: colunas de nome/legenda da camada)")
+    gerar.add_argument("--saida", default=DIR_VETORES)
+    servir = sub.add_parser("serve")
+    servir.add_argument("--porta", type=int, default=8765)
+    servir.add_argument("--dir", default=DIR_VETORES)
+    args = parser.parse_args()
+
+    if args.comando == "serve":
+        servidor = make_server(args.porta, args.dir)
+        print(f"Tiles em http://127.0.0.1:{args.porta}/ ({', '.join(tilesets(args.dir)) or 'nenhum MBTiles ainda'})")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            servidor.server_close()
+        return
+
+    try:
+        _codificador()
+    except ImportError as e:
+        parser.exit(1, f"❌ {e}\n")
+    for nome in args.nomes:
+        try:
+            destino, resumo = build(nome, args.zoom, args.saida, args.colunas)
+        except (IOError, ValueError, ImportError) as e:
+            print(f"❌ {nome}: {e}")
+            continue
+        modo = "cobertura" if resumo["cobertura"] else "por feição"
+        print(f"✅ {nome} -> {destino} ({os.path.getsize(destino) / 1e6:.1f} MB, simplificação {modo}, "
+              f"{resumo['segundos']:.0f} s)")
+        for e in resumo["zooms"]:
+            print(f"   z{e['zoom']:<2d} {e['tiles']:6d} tiles  {e['feicoes']:7d} feições  "
+                  f"média {e['media_kb']:6.1f} KB  maior {e['maior_kb']:6.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+# wfs_client.py
+# Cliente WFS 2.0 com paginação (startIndex/count) para as camadas OGC
+# (ICMBio:embargos_icmbio, mapbiomas-alertas:alert_report, ...).
+#
+# - resultType=hits descobre o total e permite buscar páginas em paralelo
+# - cada página é lida em streaming: as feições do GeoJSON são decodificadas
+#   uma a uma, sem montar a resposta inteira na memória
+# - as páginas são gravadas em lotes num GeoParquet, então o pico de memória
+#   depende do tamanho da página, não do tamanho da camada
+#
+# Uso: python wfs_client.py URL LAYER_NAME destino.parquet [--pagina 1000] [--workers 4]
+#      python wfs_client.py "MapBiomas Alerta" destino.parquet   (URL, typeName e workers do registro)
+#      python wfs_client.py demo   (WFS local, sem rede)
+
+import argparse
+import codecs
+import json
+import operator
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import pyarrow as pa
+import requests
+from shapely.geometry import shape
+
+from arcgis_extract import map_in_order
+from geoparquet_writer import GeoParquetStreamWriter
+from host_breaker import StubServer
+from http_async import sync_session
+
+TAMANHO_PAGINA = 1000
+MAX_WORKERS = 4
+TENTATIVAS = 4
+TIMEOUT = 120
+SRS_SAIDA = "EPSG:4674"
+
+# Campos usados no sortBy das páginas paralelas (sem ordem fixa, páginas startIndex
+# podem repetir ou pular feições); sem nenhum deles, o primeiro campo inteiro
+CAMPOS_CHAVE = ("id", "fid", "gid", "objectid", "ogc_fid", "cod_id", "codigo")
+
+TIPOS_ARROW = {
+    "int": pa.int64(), "integer": pa.int64(), "long": pa.int64(), "short": pa.int64(),
+    "number": pa.float64(), "double": pa.float64(), "float": pa.float64(), "decimal": pa.float64(),
+    "boolean": pa.bool_(),
+}
+
+
+# --- 1. Leitura incremental de GeoJSON ---
+
+_INICIO_FEATURES = re.compile(r'"features"\s*:\s*\[')
+
+
+def iter_geojson_features(chunks):
+    """
+    Gera as feições de um FeatureCollection GeoJSON a partir de pedaços de bytes.
+
+    Só o trecho ainda não decodificado fica em memória. Assume que "features" é
+    a primeira chave com esse nome no documento (caso do GeoServer); o que vem
+    depois do array (totalFeatures, crs...) é ignorado.
+    """
+    decodificador = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    pos = None  # posição de leitura dentro do array "features" (None = ainda não achado)
+    minimo = 0  # caracteres pendentes necessários antes de tentar decodificar de novo
+    chunks = iter(chunks)
+    fim_dados = False
+
+    while True:
+        if pos is None:
+            m = _INICIO_FEATURES.search(buffer)
+            if m:
+                pos = m.end()
+                continue
+        else:
+            # Pula espaços e vírgulas entre feições
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            if pos < len(buffer) and (len(buffer) - pos >= minimo or fim_dados):
+                try:
+                    feicao, pos = json_decoder.raw_decode(buffer, pos)
+                    minimo = 0
+                    yield feicao
+                    continue
+                except json.JSONDecodeError:
+                    if fim_dados:
+                        raise
+                    # Feição incompleta: espera o trecho pendente dobrar antes de tentar de novo
+                    minimo = 2 * (len(buffer) - pos)
+        if fim_dados:
+            if pos is None:
+                raise ValueError("Resposta sem 'features' (não é um FeatureCollection GeoJSON).")
+            return
+        # Descarta o que já foi decodificado e lê o próximo pedaço
+        if pos:
+            buffer, pos = buffer[pos:], 0
+        try:
+            buffer += decodificador.decode(next(chunks))
+        except StopIteration:
+            buffer += decodificador.decode(b"", final=True)
+            fim_dados = True
+
+
+# --- 2. Requisições WFS ---
+
+def _temporario(erro):
+    # 4xx (exceto 429) é erro do pedido: repetir não adianta
+    resposta = getattr(erro, "response", None)
+    return resposta is None or resposta.status_code == 429 or resposta.status_code >= 500
+
+
+def _com_tentativas(funcao, tentativas=TENTATIVAS):
+    """
+    Executa `funcao()` repetindo com espera exponencial (com jitter) em falhas temporárias.
+
+    `funcao` deve chamar raise_for_status(): 429/5xx e falhas de conexão (ou JSON cortado) são repetidos.
+    """
+    for tentativa in range(tentativas):
+        try:
+            return funcao()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if tentativa == tentativas - 1 or not _temporario(e):
+                raise
+            time.sleep((2 ** tentativa) * (0.5 + random.random()))
+
+
+def _params_base(layer_name, filtros=None):
+    params = {"service": "WFS", "version": "2.0.0", "request": "GetFeature", "typeNames": layer_name}
+    params.update(filtros or {})
+    return params
+
+
+def count_features(session, url, layer_name, filtros=None, **kwargs):
+    """Total de feições (resultType=hits). Retorna None se o servidor não informar."""
+    params = {**_params_base(layer_name, filtros), "resultType": "hits"}
+
+    def pedir():
+        r = session.get(url, params=params, **kwargs)
+        r.raise_for_status()
+        return r
+
+    r = _com_tentativas(pedir)
+    m = re.search(r'numberMatched="(\d+)"', r.text)
+    return int(m.group(1)) if m else None
+
+
+def describe_feature_type(session, url, layer_name, **kwargs):
+    """
+    Propriedades da camada via DescribeFeatureType (JSON).
+
+    Retorna (propriedades, nome_da_geometria), onde propriedades é a lista de
+    dicts {name, localType, type} sem a geometria, ou (None, None) se indisponível.
+    """
+    params = {"service": "WFS", "version": "2.0.0", "request": "DescribeFeatureType",
+              "typeNames": layer_name, "outputFormat": "application/json"}
+    def pedir():
+        r = session.get(url, params=params, **kwargs)
+        r.raise_for_status()
+        return r.json()
+
+    try:
+        propriedades = _com_tentativas(pedir)["featureTypes"][0]["properties"]
+    except (requests.exceptions.RequestException, ValueError, KeyError, IndexError):
+        return None, None
+    geometria = next((p["name"] for p in propriedades if p.get("type", "").startswith("gml:")), None)
+    return [p for p in propriedades if not p.get("type", "").startswith("gml:")], geometria
+
+
+def describe_schema(session, url, layer_name, **kwargs):
+    """Schema pyarrow dos atributos via DescribeFeatureType (JSON). Retorna None se não disponível."""
+    propriedades, _ = describe_feature_type(session, url, layer_name, **kwargs)
+    return _schema(propriedades)
+
+
+def sort_field(propriedades):
+    """Campo para o sortBy da paginação: um nome de CAMPOS_CHAVE ou o primeiro inteiro (None se não houver)."""
+    nomes = {p["name"].lower(): p["name"] for p in propriedades or []}
+    chave = next((nomes[c] for c in CAMPOS_CHAVE if c in nomes), None)
+    return chave or next((p["name"] for p in propriedades or [] if p.get("localType") in ("int", "integer", "long")), None)
+
+
+def _schema(propriedades):
+    if propriedades is None:
+        return None
+    return pa.schema([pa.field(p["name"], TIPOS_ARROW.get(p.get("localType", ""), pa.string())) for p in propriedades])
+
+
+def fetch_page(session, url, layer_name, inicio, quantidade, filtros=None, srs=SRS_SAIDA, **kwargs):
+    """Busca uma página e devolve (atributos, geometrias), lendo o corpo em streaming."""
+    params = {**_params_base(layer_name, filtros), "outputFormat": "application/json",
+              "srsName": srs, "startIndex": inicio, "count": quantidade}
+
+    def ler():
+        with session.get(url, params=params, stream=True, **kwargs) as r:
+            r.raise_for_status()
+            atributos, geometrias = [], []
+            for f in iter_geojson_features(r.iter_content(chunk_size=64 * 1024)):
+                atributos.append(f.get("properties") or {})
+                geometrias.append(shape(f["geometry"]) if f.get("geometry") else None)
+            return atributos, geometrias
+
+    return _com_tentativas(ler)
+
+
+# --- 3. Extração da camada ---
+
+def iter_pages(session, url, layer_name, propriedades=None, page_size=TAMANHO_PAGINA, max_workers=MAX_WORKERS,
+               filtros=None, srs=SRS_SAIDA, **kwargs):
+    """
+    Gera (atributos, geometrias, total_de_paginas) de cada página do GetFeature, em ordem.
+
+    Com o total conhecido (resultType=hits), as páginas são buscadas em paralelo; sem ele,
+    em sequência até vir uma página incompleta (total_de_paginas None). Sem "sortBy" em
+    `filtros`, as páginas são ordenadas pelo sort_field() de `propriedades` (as do
+    DescribeFeatureType): sem ordem fixa, páginas startIndex podem repetir ou pular feições.
+    """
+    campo = sort_field(propriedades)
+    if campo and "sortBy" not in (filtros or {}):
+        filtros = {**(filtros or {}), "sortBy": campo}
+    total = count_features(session, url, layer_name, filtros, **kwargs)
+
+    def buscar(inicio):
+        return fetch_page(session, url, layer_name, inicio, page_size, filtros, srs, **kwargs)
+
+    if total is not None:
+        inicios = range(0, total, page_size)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for atributos, geometrias in map_in_order(executor, buscar, inicios, 2 * max_workers):
+                yield atributos, geometrias, len(inicios)
+        return
+    inicio = 0
+    while True:
+        atributos, geometrias = buscar(inicio)
+        yield atributos, geometrias, None
+        if len(atributos) < page_size:
+            return
+        inicio += page_size
+
+
+def extract_wfs_layer(url, layer_name, destino, page_size=TAMANHO_PAGINA, max_workers=MAX_WORKERS,
+                      filtros=None, srs=SRS_SAIDA, session=None, on_page=None, **kwargs):
+    """
+    Baixa a camada WFS inteira para `destino` (GeoParquet). Retorna o número de feições.
+
+    `filtros` entra nos parâmetros do GetFeature (ex.: {"bbox": ...} ou {"CQL_FILTER": ...});
+    a paginação (paralela, ordenada) é a de iter_pages().
+    """
+    session = session or sync_session(max_workers)
+    kwargs.setdefault("timeout", TIMEOUT)
+    propriedades, _ = describe_feature_type(session, url, layer_name, **kwargs)
+    paginas = iter_pages(session, url, layer_name, propriedades, page_size, max_workers, filtros, srs, **kwargs)
+    with GeoParquetStreamWriter(destino, _schema(propriedades), crs=srs) as writer:
+        for n, (atributos, geometrias, total) in enumerate(paginas, start=1):
+            writer.write(atributos, geometrias)
+            if on_page:
+                on_page(n, total)
+    return writer.linhas
+
+
+# --- 4. Servidor de teste ---
+# WFS 2.0 mínimo, em memória, para exercitar a paginação e a ingestão sem depender
+# dos serviços reais (sobre host_breaker.StubServer).
+
+_COMPARACAO = re.compile(r"(\w+)\s*(>=|<=|<>|=|>|<)\s*'([^']*)'")
+_OPERADORES = {">=": operator.ge, "<=": operator.le, "<>": operator.ne, "=": operator.eq, ">": operator.gt, "<": operator.lt}
+
+
+def _condicoes_cql(cql):
+    """Comparações `campo op 'valor'` unidas por AND (o suficiente para os filtros deste projeto)."""
+    partes = re.split(r"\s+AND\s+", cql or "", flags=re.IGNORECASE)
+    return [m.groups() for m in map(_COMPARACAO.search, partes) if m]
+
+
+class FakeWFS(StubServer):
+    """
+    `with FakeWFS(features) as wfs: ... wfs.url ...`: GetFeature (GeoJSON, startIndex/count,
+    sortBy, CQL_FILTER simples, resultType=hits) e DescribeFeatureType (JSON).
+
+    Sem sortBy (ou entre empates dele) a ordem muda a cada pedido, como num servidor sem ordem estável.
+    `falhas` são status HTTP devolvidos, um por pedido, antes das respostas normais.
+    """
+
+    def __init__(self, features=(), falhas=()):
+        super().__init__()
+        self.features = list(features)
+        self.falhas = list(falhas)
+        self.requisicoes = []
+
+    def _selecionar(self, params):
+        condicoes = _condicoes_cql(params.get("CQL_FILTER"))
+        selecionadas = [
+            f for f in self.features
+            if all(_OPERADORES[op](str(f["properties"].get(campo, "")), valor) for campo, op, valor in condicoes)
+        ]
+        # empates no sortBy também saem em ordem variável (como num servidor real)
+        random.shuffle(selecionadas)
+        for campo in reversed([c.split() for c in (params.get("sortBy") or "").split(",") if c.strip()]):
+            selecionadas.sort(key=lambda f: f["properties"].get(campo[0]), reverse=campo[1:2] in (["DESC"], ["D"]))
+        return selecionadas
+
+    def responder(self, caminho):
+        params = dict(parse_qsl(urlsplit(caminho).query))
+        self.requisicoes.append(params)
+        if self.falhas:
+            return self.falhas.pop(0), "text/plain", b"falha simulada"
+        if params.get("request") == "DescribeFeatureType":
+            exemplo = self.features[0]["properties"] if self.features else {}
+            tipos = {int: "int", float: "number", bool: "boolean"}
+            propriedades = [{"name": k, "localType": tipos.get(type(v), "string"), "type": "xsd:" + tipos.get(type(v), "string")}
+                            for k, v in exemplo.items()]
+            propriedades.append({"name": "geom", "localType": "Point", "type": "gml:Point"})
+            return 200, "application/json", json.dumps({"featureTypes": [{"properties": propriedades}]}).encode()
+        selecionadas = self._selecionar(params)
+        if params.get("resultType") == "hits":
+            return 200, "text/xml", f'<wfs:FeatureCollection numberMatched="{len(selecionadas)}" numberReturned="0"/>'.encode()
+        inicio = int(params.get("startIndex", 0))
+        pagina = selecionadas[inicio:inicio + int(params.get("count", len(selecionadas)))]
+        corpo = {"type": "FeatureCollection", "features": pagina,
+                 "numberMatched": len(selecionadas), "numberReturned": len(pagina)}
+        return 200, "application/json", json.dumps(corpo).encode()
+
+    def __enter__(self):
+        super().__enter__()
+        self.url += "/geoserver/wfs"
+        return self
+
+
+def demo(n=2350, page_size=200):
+    import tempfile
+
+    import geopandas as gpd
+
+    features = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [-54 + i * 1e-4, -20]},
+                 "properties": {"id": i, "nome": f"feição {i}"}} for i in range(n)]
+    session = sync_session()
+    with FakeWFS(features) as wfs:
+        # como antes: páginas em paralelo sem sortBy, num servidor sem ordem estável
+        vistos = set()
+        for inicio in range(0, n, page_size):
+            atributos, _ = fetch_page(session, wfs.url, "teste", inicio, page_size)
+            vistos.update(a["id"] for a in atributos)
+        print(f"sem sortBy:  {len(vistos)} feições distintas de {n}")
+
+        wfs.requisicoes.clear()
+        wfs.falhas = [503, 502]  # os primeiros pedidos falham antes de o servidor responder
+        with tempfile.TemporaryDirectory() as pasta:
+            destino = os.path.join(pasta, "camada.parquet")
+            total = extract_wfs_layer(wfs.url, "teste", destino, page_size=page_size, session=session)
+            ids = gpd.read_parquet(destino)["id"]
+        ordem = {r.get("sortBy") for r in wfs.requisicoes if r.get("request") == "GetFeature" and "startIndex" in r}
+        assert total == n and ids.is_unique
+        print(f"com sortBy={', '.join(ordem)}: {ids.nunique()} feições distintas de {n} (503/502 repetidos)")
+
+        wfs.falhas = [400]
+        antes = len(wfs.requisicoes)
+        try:
+            count_features(session, wfs.url, "teste")
+        except requests.exceptions.HTTPError:
+            print(f"400 sobe sem nova tentativa: {len(wfs.requisicoes) - antes} requisição")
+
+
+def main():
+    if sys.argv[1:2] == ["demo"]:
+        return demo()
+    parser = argparse.ArgumentParser(description="Extrai uma camada WFS inteira para GeoParquet.")
+    parser.add_argument("url", help="URL do serviço ou nome da camada no registro de camadas")
+    parser.add_argument("layer_name", nargs="?", help="typeName (dispensado quando `url` é um nome do registro)")
+    parser.add_argument("destino")
+    parser.add_argument("--pagina", type=int, default=TAMANHO_PAGINA)
+    parser.add_argument("--workers", type=int, help=f"padrão: concorrência da camada no registro, ou {MAX_WORKERS}")
+    args = parser.parse_args()
+
+    from layer_registry import get_registry
+    camada = get_registry().get(args.url)
+    url, layer_name = (camada.url, camada.layer_id) if camada else (args.url, args.layer_name)
+    if not layer_name:
+        parser.error("informe layer_name (ou o nome de uma camada WFS do registro)")
+    workers = args.workers or (camada.concorrencia if camada else MAX_WORKERS)
+
+    total = extract_wfs_layer(
+        url, layer_name, args.destino, page_size=args.pagina, max_workers=workers,
+        on_page=lambda n, t: print(f"Página {n}/{t or '?'}", end="\r"),
+    )
+    print(f"\n✅ {total} feições gravadas em {args.destino}")
+
+
+if __name__ == "__main__":
+    main()